@@ -1,10 +1,53 @@
 # app.py
-from flask import Flask, render_template, request, jsonify
-from src.prediction import predict_risk
-from src.recommendations import get_recommendations
-# from src.explainer import get_shap_explanation
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, g, render_template, request, jsonify
+from src import metrics
+from src.api import EXPLAIN_ALWAYS, handle_batch, handle_predict, is_true
+from src.model_registry import get_registry
+from src.startup import report as startup_report, warm_up
 
 app = Flask(__name__)
+# Artifacts are loaded once per process (and hot-reloaded when MODEL_RELOAD_INTERVAL is set)
+registry = get_registry()
+
+
+def _flag(name):
+    return is_true(request.args.get(name))
+
+
+def _explain_requested():
+    return EXPLAIN_ALWAYS or _flag('explain')
+
+
+def _json_response(body, status, started):
+    """jsonify + the ``serialize`` stage timing."""
+    response = jsonify(body)
+    metrics.observe_stage('serialize', registry.get().backend, started)
+    return response, status
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route)
+    metrics.REQUESTS.inc(route, request.method, str(response.status_code))
+    return response
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of this worker's request, stage and model metrics."""
+    return app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 
 @app.route('/')
 def index():
@@ -12,54 +55,24 @@ def index():
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    try:
-        data = request.json
-        app.logger.info('Incoming /predict JSON: %s', data)
-        # Basic validation: ensure JSON payload and required fields exist
-        if not data or not isinstance(data, dict):
-            return jsonify({'error': 'Request must be JSON with form fields'}), 400
-        required = ['age','gender','glucose','hba1c','systolic','diastolic','bmi','cholesterol','triglycerides','smoking','alcohol','activity','diet_score','family_history','sleep','stress']
-        missing = [k for k in required if k not in data or data.get(k) in (None, '')]
-        if missing:
-            return jsonify({'error': 'Missing required fields', 'missing': missing}), 400
-        # Map form data
-        # Pass categorical strings so the preprocessor's OneHotEncoder can match categories
-        input_data = {
-            'Age': int(data['age']),
-            'Gender': data['gender'],
-            'Glucose': float(data['glucose']),
-            'HbA1c': float(data['hba1c']),
-            'Systolic': int(data['systolic']),
-            'Diastolic': int(data['diastolic']),
-            'BMI': float(data['bmi']),
-            'Cholesterol': float(data['cholesterol']),
-            'Triglycerides': float(data['triglycerides']),
-            'Smoking': data['smoking'],
-            'Alcohol': data['alcohol'],
-            'Physical_Activity': data['activity'],
-            'Diet_Score': int(data['diet_score']),
-            'Family_History': data['family_history'],
-            'Sleep_Hours': float(data['sleep']),
-            'Stress_Level': data['stress'],
-            'TC_HDL_Ratio': 0  # placeholder
-        }
-
-        risks = predict_risk(input_data)
-        recs = get_recommendations(risks, input_data)
-        app.logger.info('Predicted risks: %s, recommendations: %s', risks, recs)
-
-        return jsonify({
-            'risks': risks,
-            'recommendations': recs
-            # 'shap_plot': get_shap_explanation(input_data)
-        })
-    except Exception as e:
-        # Provide detailed error information in debug mode so the front-end can show it
-        import traceback
-        tb = traceback.format_exc()
-        app.logger.exception('Error in /predict')
-        return jsonify({'error': str(e), 'traceback': tb}), 500
+    started = time.perf_counter()
+    data = request.get_json(silent=True)
+    body, status = handle_predict(data, registry, explain=_explain_requested(), plot=_flag('plot'),
+                                  started=started)
+    return _json_response(body, status, time.perf_counter())
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score a JSON array (or NDJSON stream) of form records in one model call (see ``src/api.py``)."""
+    started = time.perf_counter()
+    body, status = handle_batch(request.get_data(cache=False, as_text=True), request.mimetype, registry,
+                                explain=_explain_requested(), started=started)
+    return _json_response(body, status, time.perf_counter())
+
+# Model loading is deferred to warm_up() (gunicorn.conf.py runs it in every worker)
+startup_report.record('app_import', time.perf_counter() - _import_started)
 
 if __name__ == '__main__':
+    warm_up(registry, explain=EXPLAIN_ALWAYS).log(app.logger)
     # Disable the auto-reloader/watchdog to avoid intermittent restarts while loading model artifacts
-    app.run(debug=True, use_reloader=False)
\ No newline at end of file
+    app.run(debug=True, use_reloader=False)
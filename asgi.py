@@ -0,0 +1,293 @@
+# asgi.py
+"""ASGI entry point with the same routes and responses as ``app.py``.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 2
+
+Request bodies are read on the event loop, so slow clients cost no thread.
+Parsing, scoring and serialization run in a bounded :class:`InferencePool`.
+It is a thread pool by default, or a process pool with
+``ASGI_EXECUTOR=process``. The pool holds at most ``ASGI_MAX_PENDING``
+requests, queued or running; beyond that requests are rejected with 429.
+A request that has not finished after ``ASGI_REQUEST_TIMEOUT`` seconds gets
+504. On shutdown (lifespan), new requests get 503 while the in-flight ones
+finish, for up to ``ASGI_SHUTDOWN_TIMEOUT`` seconds.
+
+No web framework is needed: the app is a plain ASGI callable. Any ASGI
+server can host it; ``requirements.txt`` pins uvicorn.
+"""
+import asyncio
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from src import metrics
+from src.api import EXPLAIN_ALWAYS, handle_batch, handle_predict, is_true
+from src.model_registry import get_registry
+from src.startup import warm_up
+
+logger = logging.getLogger('app')
+
+ROOT = Path(__file__).resolve().parent
+STATIC_DIR = ROOT / 'static'
+TEMPLATES_DIR = ROOT / 'templates'
+
+EXECUTOR = os.environ.get('ASGI_EXECUTOR', 'thread')
+WORKERS = int(os.environ.get('ASGI_WORKERS', str(min(4, os.cpu_count() or 1))))
+MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', str(4 * WORKERS)))
+REQUEST_TIMEOUT = float(os.environ.get('ASGI_REQUEST_TIMEOUT', '10'))
+SHUTDOWN_TIMEOUT = float(os.environ.get('ASGI_SHUTDOWN_TIMEOUT', '30'))
+MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', str(16 * 1024 * 1024)))
+
+
+class ServerBusy(Exception):
+    """The inference pool already holds ``max_pending`` requests."""
+
+
+def _warm_process():
+    warm_up(explain=EXPLAIN_ALWAYS)
+
+
+class InferencePool:
+    """Executor that accepts at most ``max_pending`` jobs (queued + running) at a time.
+
+    A job whose caller timed out still holds its slot until it actually
+    finishes, so the limit bounds the real load on the workers.
+    """
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, kind=EXECUTOR):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"ASGI_EXECUTOR must be 'thread' or 'process', got {kind!r}")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.kind = kind
+        self.pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def start(self):
+        if self.kind == 'process':
+            self._executor = ProcessPoolExecutor(self.workers, initializer=_warm_process)
+        else:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='inference')
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+            if not self.pending:
+                self._idle.set()
+
+    async def run(self, fn, *args, timeout=None):
+        """Run ``fn(*args)`` in the pool; raises :class:`ServerBusy` or ``asyncio.TimeoutError``."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise ServerBusy()
+            self.pending += 1
+            self._idle.clear()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        # On timeout wait_for cancels the job if it has not started yet
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    async def drain(self, timeout):
+        """Wait until no job is queued or running; returns False if ``timeout`` expired first."""
+        return await asyncio.to_thread(self._idle.wait, timeout)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Jobs run in the pool (module-level so a process pool can pickle them). They return the
+# response body already serialized, exactly as Flask's jsonify writes it.
+
+def _dumps(body):
+    return (json.dumps(body, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def _serialized(body, status, registry):
+    started = time.perf_counter()
+    payload = _dumps(body)
+    metrics.observe_stage('serialize', registry.get().backend, started)
+    return status, payload
+
+
+def predict_job(raw_body, explain, plot):
+    started = time.perf_counter()
+    registry = get_registry()
+    try:
+        data = json.loads(raw_body)
+    except ValueError:
+        data = None
+    return _serialized(*handle_predict(data, registry, explain=explain, plot=plot, started=started), registry)
+
+
+def batch_job(raw_body, mimetype, explain):
+    started = time.perf_counter()
+    registry = get_registry()
+    return _serialized(*handle_batch(raw_body.decode('utf-8', 'replace'), mimetype, registry, explain=explain,
+                                     started=started), registry)
+
+
+def _render_index():
+    from jinja2 import Environment, FileSystemLoader
+    env = Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)), autoescape=True)
+    url_for = lambda endpoint, filename: f'/{endpoint}/{filename}'  # only url_for('static', ...) is used
+    return env.get_template('index.html').render(url_for=url_for).encode()
+
+
+class HealthRiskASGI:
+    """The ASGI application; see the module docstring."""
+
+    def __init__(self, pool=None, request_timeout=REQUEST_TIMEOUT, shutdown_timeout=SHUTDOWN_TIMEOUT,
+                 warm=True):
+        self.pool = pool or InferencePool()
+        self.request_timeout = request_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.warm = warm
+        self.accepting = False
+        self._index = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def startup(self):
+        self.pool.start()
+        if self.warm:
+            # Thread pool: one load serves every thread. Process pool: the initializer warms each
+            # process; one job per worker makes them all start now instead of on first use.
+            jobs = 1 if self.pool.kind == 'thread' else self.pool.workers
+            await asyncio.gather(*(self.pool.run(_warm_process) for _ in range(jobs)))
+        self.accepting = True
+
+    async def shutdown(self):
+        self.accepting = False
+        if not await self.pool.drain(self.shutdown_timeout):
+            logger.warning('Shutting down with %d requests still running', self.pool.pending)
+        self.pool.shutdown()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.exception('ASGI startup failed')
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        started = time.perf_counter()
+        method, path = scope['method'], scope['path']
+        route, status = 'unmatched', 500
+        try:
+            if path == '/predict' or path == '/predict/batch':
+                route = path
+                status = await self._predict(scope, receive, send, batch=path == '/predict/batch')
+            elif path == '/':
+                route = path
+                if self._index is None:
+                    self._index = await asyncio.to_thread(_render_index)
+                status = await self._respond(send, 200, self._index, 'text/html; charset=utf-8', method)
+            elif path == '/metrics':
+                route = path
+                status = await self._respond(send, 200, metrics.render().encode(), metrics.CONTENT_TYPE, method)
+            elif path.startswith('/static/'):
+                route = '/static/<path:filename>'
+                status = await self._static(path[len('/static/'):], send, method)
+            else:
+                status = await self._respond(send, 404, b'Not Found', 'text/plain')
+        finally:
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route)
+            metrics.REQUESTS.inc(route, method, str(status))
+
+    async def _predict(self, scope, receive, send, batch):
+        if scope['method'] != 'POST':
+            return await self._respond(send, 405, b'Method Not Allowed', 'text/plain', headers=[(b'allow', b'POST')])
+        if not self.accepting:
+            return await self._json(send, 503, {'error': 'Server is shutting down'})
+        body = await _read_body(receive)
+        if body is None:
+            return await self._json(send, 413, {'error': f'Request body larger than {MAX_BODY_BYTES} bytes'})
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        explain = EXPLAIN_ALWAYS or is_true(query.get('explain', [''])[-1])
+        if batch:
+            job = (batch_job, body, _mimetype(scope), explain)
+        else:
+            job = (predict_job, body, explain, is_true(query.get('plot', [''])[-1]))
+        try:
+            status, payload = await self.pool.run(*job, timeout=self.request_timeout)
+        except ServerBusy:
+            return await self._json(send, 429, {'error': 'Server busy, retry later'},
+                                    headers=[(b'retry-after', b'1')])
+        except asyncio.TimeoutError:
+            return await self._json(send, 504, {'error': f'Prediction timed out after {self.request_timeout}s'})
+        return await self._respond(send, status, payload, 'application/json')
+
+    async def _static(self, relative, send, method):
+        path = (STATIC_DIR / relative).resolve()
+        if not path.is_relative_to(STATIC_DIR) or not path.is_file():
+            return await self._respond(send, 404, b'Not Found', 'text/plain')
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type.endswith('javascript'):
+            content_type += '; charset=utf-8'
+        return await self._respond(send, 200, await asyncio.to_thread(path.read_bytes), content_type, method)
+
+    async def _json(self, send, status, body, headers=()):
+        return await self._respond(send, status, _dumps(body), 'application/json', headers=headers)
+
+    @staticmethod
+    async def _respond(send, status, payload, content_type, method='GET', headers=()):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', content_type.encode()),
+                                (b'content-length', str(len(payload)).encode()), *headers]})
+        await send({'type': 'http.response.body', 'body': b'' if method == 'HEAD' else payload})
+        return status
+
+
+async def _read_body(receive):
+    """The request body, or None once it exceeds MAX_BODY_BYTES."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+
+def _mimetype(scope):
+    for name, value in scope.get('headers', ()):
+        if name.lower() == b'content-type':
+            return value.decode('latin-1').split(';')[0].strip().lower()
+    return ''
+
+
+app = HealthRiskASGI()
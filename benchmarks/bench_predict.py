@@ -0,0 +1,311 @@
+# benchmarks/bench_predict.py
+"""Latency/throughput benchmarks of the prediction hot path and the /predict route.
+
+    python benchmarks/bench_predict.py run [--quick] [--out benchmarks/results/<commit>.json]
+    python benchmarks/bench_predict.py compare OLD.json NEW.json
+
+Runs offline against the bundled ``artifacts/``. The lean export and a
+small set of per-disease models (trained from ``Data/``) are built in a
+temporary directory, so every backend is measured. The cases are:
+
+    cold/<backend>               fresh interpreter: import, load, first predict_risk
+    warm/<backend>               predict_risk on a loaded model, one record per call
+    batch/<backend>/<n>          predict_risk_batch with n records per call
+    http/<backend>/c<k>          POST /predict via Flask's test client from k threads
+
+Each case reports p50/p95/p99/mean latency in ms, throughput and peak RSS.
+For in-process cases the RSS is the process peak so far. The prediction
+cache and the micro-batcher are disabled, so every call reaches the model.
+Results are written as JSON with sorted keys, so two runs diff cleanly.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+os.environ.setdefault('PREDICT_CACHE_SIZE', '0')  # also inherited by the cold-start subprocesses
+
+BACKENDS = ('multi_output', 'lean', 'per_disease')
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+CONCURRENCY = (1, 4, 16)
+
+_COLD_SCRIPT = '''
+import resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from src.model_registry import ModelRegistry
+from src.prediction import predict_risk
+imported = time.perf_counter()
+registry = ModelRegistry(search_dirs=[sys.argv[2]], backend=sys.argv[3])
+registry.get()
+loaded = time.perf_counter()
+predict_risk({"Age": 50, "Gender": "Male", "Glucose": 120, "BMI": 28}, registry=registry)
+done = time.perf_counter()
+try:  # ru_maxrss would include the parent's peak from before the exec
+    peak = next(int(line.split()[1]) for line in open("/proc/self/status") if line.startswith("VmHWM"))
+except OSError:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(imported - start, loaded - imported, done - loaded, peak)
+'''
+
+
+def _peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KiB on Linux
+
+
+def summarize(latencies, rows_per_call=1):
+    """Latency percentiles (ms) and throughput (rows/s) of a list of per-call durations in seconds."""
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'calls': len(ms), 'rows_per_call': rows_per_call, 'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3),
+            'mean_ms': round(float(ms.mean()), 3),
+            'throughput_rows_s': round(rows_per_call * len(ms) / (ms.sum() / 1000), 1)}
+
+
+def _clip_to_form_ranges(record):
+    """Clip the numeric fields to the ranges /predict accepts (``validation.FIELDS``)."""
+    from src.validation import FIELDS
+
+    for _, column, kind, minimum, maximum in FIELDS:
+        if kind in ('int', 'float'):
+            record[column] = type(record[column])(min(max(record[column], minimum), maximum))
+    return record
+
+
+def make_records(n, seed=0):
+    """Plausible request dicts (the ``predict_risk`` input shape), all valid /predict forms."""
+    rng = np.random.default_rng(seed)
+    genders = np.array(['Male', 'Female'])
+    levels = np.array(['Low', 'Moderate', 'High'])
+    yes_no = np.array(['Yes', 'No'])
+    return [_clip_to_form_ranges({
+        'Age': int(rng.integers(18, 90)), 'Gender': str(rng.choice(genders)),
+        'Glucose': round(float(rng.normal(110, 30)), 1), 'HbA1c': round(float(rng.normal(5.9, 1.0)), 1),
+        'Systolic': int(rng.normal(130, 18)), 'Diastolic': int(rng.normal(82, 10)),
+        'BMI': round(float(rng.normal(28, 5)), 1), 'Cholesterol': round(float(rng.normal(205, 35)), 1),
+        'Triglycerides': round(float(rng.normal(160, 45)), 1), 'Smoking': str(rng.choice(yes_no)),
+        'Alcohol': str(rng.choice(yes_no)), 'Physical_Activity': str(rng.choice(levels)),
+        'Diet_Score': int(rng.integers(0, 100)), 'Family_History': str(rng.choice(yes_no)),
+        'Sleep_Hours': round(float(rng.normal(7, 1.2)), 1), 'Stress_Level': str(rng.choice(levels)),
+        'TC_HDL_Ratio': 0,
+    }) for _ in range(n)]
+
+
+def to_form(record):
+    """The /predict form payload for a request dict."""
+    keys = {'Age': 'age', 'Gender': 'gender', 'Glucose': 'glucose', 'HbA1c': 'hba1c', 'Systolic': 'systolic',
+            'Diastolic': 'diastolic', 'BMI': 'bmi', 'Cholesterol': 'cholesterol',
+            'Triglycerides': 'triglycerides', 'Smoking': 'smoking', 'Alcohol': 'alcohol',
+            'Physical_Activity': 'activity', 'Diet_Score': 'diet_score', 'Family_History': 'family_history',
+            'Sleep_Hours': 'sleep', 'Stress_Level': 'stress'}
+    return {form: record[key] for key, form in keys.items()}
+
+
+def prepare_backends(workdir, backends=BACKENDS):
+    """Return {backend: artifact directory}; builds the lean export and per-disease models under ``workdir``."""
+    import shutil
+
+    dirs = {}
+    for backend in backends:
+        if backend == 'multi_output':
+            dirs[backend] = REPO_ROOT / 'artifacts'
+        elif backend == 'lean':
+            from src.lean_model import export_lean_model
+            target = Path(workdir) / 'lean_backend'
+            target.mkdir(exist_ok=True)
+            for name in ('chronic_disease_model.pkl', 'preprocessor.pkl'):
+                shutil.copy(REPO_ROOT / 'artifacts' / name, target / name)
+            export_lean_model(target / 'chronic_disease_model.pkl', target / 'preprocessor.pkl', target / 'lean')
+            dirs[backend] = target
+        elif backend == 'per_disease':
+            from src.model_training import load_training_frame, train_models
+            frame = load_training_frame(str(REPO_ROOT / 'Data' / 'dirty_v3_path.csv'),
+                                        str(Path(workdir) / 'clean.arrow'))
+            target = Path(workdir) / 'per_disease_backend'
+            train_models(frame.head(6000), str(target), num_boost_round=200, early_stopping_rounds=20)
+            dirs[backend] = target
+        else:
+            raise ValueError(f'unknown backend {backend!r}; expected one of {BACKENDS}')
+    return dirs
+
+
+def bench_cold(directory, backend, repeats):
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, '-c', _COLD_SCRIPT, str(REPO_ROOT), str(directory), backend],
+                             capture_output=True, text=True, check=True)
+        runs.append([float(v) for v in out.stdout.split()])
+    runs = np.asarray(runs)
+    result = summarize(runs[:, :3].sum(axis=1))
+    result.update(import_ms=round(float(np.median(runs[:, 0])) * 1000, 1),
+                  load_ms=round(float(np.median(runs[:, 1])) * 1000, 1),
+                  first_predict_ms=round(float(np.median(runs[:, 2])) * 1000, 1),
+                  peak_rss_mb=round(float(runs[:, 3].max()) / 1024, 1))
+    return result
+
+
+def bench_warm(registry, records, calls):
+    from src.prediction import predict_risk
+    predict_risk(records[0], registry=registry)
+    latencies = []
+    for i in range(calls):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        predict_risk(record, registry=registry)
+        latencies.append(time.perf_counter() - start)
+    return dict(summarize(latencies), peak_rss_mb=_peak_rss_mb())
+
+
+def bench_batch(registry, records, size, max_rows):
+    from src.prediction import predict_risk_batch
+    batch = (records * (size // len(records) + 1))[:size]
+    predict_risk_batch(batch, registry=registry)
+    latencies = []
+    for _ in range(max(3, min(200, max_rows // size))):
+        start = time.perf_counter()
+        predict_risk_batch(batch, registry=registry)
+        latencies.append(time.perf_counter() - start)
+    return dict(summarize(latencies, size), peak_rss_mb=_peak_rss_mb())
+
+
+def bench_http(registry, records, concurrency, requests_total):
+    import app as app_module
+    previous, app_module.registry = app_module.registry, registry  # the route scores through this global
+    payloads = [to_form(r) for r in records]
+    local = threading.local()
+
+    def call(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app_module.app.test_client()
+        start = time.perf_counter()
+        resp = client.post('/predict', json=payloads[i % len(payloads)])
+        elapsed = time.perf_counter() - start
+        if resp.status_code != 200:
+            raise RuntimeError(f'/predict returned {resp.status_code}: {resp.get_data(as_text=True)[:200]}')
+        return elapsed
+
+    try:
+        call(0)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(call, range(requests_total)))
+        wall = time.perf_counter() - start
+    finally:
+        app_module.registry = previous
+    result = summarize(latencies)
+    # Under concurrency calls overlap: throughput is requests over wall-clock time
+    result.update(throughput_rows_s=round(requests_total / wall, 1), concurrency=concurrency,
+                  peak_rss_mb=_peak_rss_mb())
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _environment():
+    import sklearn
+    import xgboost
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'sklearn': sklearn.__version__,
+            'xgboost': xgboost.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def run_suite(backends=BACKENDS, quick=False, batch_sizes=BATCH_SIZES, concurrency=CONCURRENCY, suites=None):
+    """Run the selected suites (cold, warm, batch, http) and return the results document."""
+    import logging
+
+    from src.model_registry import ModelRegistry
+    from src.prediction import configure_coalescer, configure_prediction_cache
+
+    logging.getLogger('app').setLevel(logging.WARNING)  # /predict logs every request at INFO
+    suites = set(suites or ('cold', 'warm', 'batch', 'http'))
+    configure_prediction_cache(0)
+    configure_coalescer(False)
+    records = make_records(1000)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        dirs = prepare_backends(workdir, backends)
+        for backend, directory in dirs.items():
+            if 'cold' in suites:
+                results[f'cold/{backend}'] = bench_cold(directory, backend, 1 if quick else 5)
+            registry = ModelRegistry(search_dirs=[directory], backend=backend)
+            registry.get()
+            if 'warm' in suites:
+                results[f'warm/{backend}'] = bench_warm(registry, records, 200 if quick else 3000)
+            if 'batch' in suites:
+                for size in batch_sizes:
+                    results[f'batch/{backend}/{size}'] = bench_batch(registry, records, size,
+                                                                     2000 if quick else 50000)
+            if 'http' in suites:
+                for k in concurrency:
+                    results[f'http/{backend}/c{k}'] = bench_http(registry, records, k, 100 if quick else 1000)
+    return {'commit': _git_commit(), 'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'quick': quick, 'environment': _environment(), 'results': results}
+
+
+def compare(old, new, metric='p50_ms'):
+    """Rows of (case, old, new, change %) for the cases present in both result documents."""
+    rows = []
+    for case in sorted(set(old['results']) & set(new['results'])):
+        a, b = old['results'][case].get(metric), new['results'][case].get(metric)
+        if a is None or b is None:
+            continue
+        rows.append((case, a, b, round((b - a) / a * 100, 1) if a else None))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark predict_risk and the /predict route.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help='run the benchmarks and write a JSON result file')
+    run.add_argument('--out', help='result file (default: benchmarks/results/<commit>.json)')
+    run.add_argument('--quick', action='store_true', help='fewer repetitions, for a smoke test')
+    run.add_argument('--backend', action='append', choices=BACKENDS, help='repeatable (default: all)')
+    run.add_argument('--suite', action='append', choices=('cold', 'warm', 'batch', 'http'),
+                     help='repeatable (default: all)')
+    diff = sub.add_parser('compare', help='print the change of one metric between two result files')
+    diff.add_argument('old')
+    diff.add_argument('new')
+    diff.add_argument('--metric', default='p50_ms', help='e.g. p95_ms, throughput_rows_s (default: p50_ms)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        old, new = (json.loads(Path(p).read_text()) for p in (args.old, args.new))
+        print(f"{'case':32} {old['commit']:>12} {new['commit']:>12} {'change':>8}")
+        for case, a, b, change in compare(old, new, args.metric):
+            print(f"{case:32} {a:>12} {b:>12} {'' if change is None else f'{change:+.1f}%':>8}")
+        return 0
+
+    doc = run_suite(args.backend or BACKENDS, quick=args.quick, suites=args.suite)
+    out = Path(args.out) if args.out else REPO_ROOT / 'benchmarks' / 'results' / f"{doc['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, indent=2, sort_keys=True) + '\n')
+    for case, r in doc['results'].items():
+        print(f"{case:32} p50={r['p50_ms']}ms p95={r['p95_ms']}ms p99={r['p99_ms']}ms "
+              f"{r['throughput_rows_s']} rows/s rss={r['peak_rss_mb']}MB")
+    print(f'Wrote {out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
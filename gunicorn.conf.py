@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn app:app` when run from the repository root.
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+# Import the app and load the model once in the master; workers inherit it copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app import EXPLAIN_ALWAYS
+    from src.startup import warm_up
+    warm_up(explain=EXPLAIN_ALWAYS).log(server.log)
+    # Move everything loaded so far out of the collector's reach: a collection in a worker
+    # would otherwise write to the objects' headers and un-share their pages.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # The app is imported at this point but the worker is not accepting connections yet:
+    # load and test-score the model now so the first request does not pay for it
+    # (with GUNICORN_PRELOAD the master already loaded it and model_load is ~0ms).
+    from app import EXPLAIN_ALWAYS
+    from src.startup import warm_up
+    warm_up(explain=EXPLAIN_ALWAYS).log(worker.log)
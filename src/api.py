@@ -0,0 +1,165 @@
+# src/api.py
+"""Request handling shared by the Flask app (``app.py``) and the ASGI app (``asgi.py``).
+
+The handlers take the decoded request and return ``(body, status)``, where
+``body`` is a JSON-serializable dict. Both front ends send the same
+responses; they only differ in how requests are read and where the work
+runs.
+"""
+import json
+import logging
+import os
+import time
+import traceback
+
+try:
+    from src import metrics
+    from src.audit_log import audit
+    from src.explainer import explain_batch, get_explanation_service
+    from src.prediction import predict_risk, predict_risk_batch
+    from src.recommendations import get_recommendations, get_recommendations_batch
+    from src.validation import ValidationError, get_schema
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    import metrics
+    from audit_log import audit
+    from explainer import explain_batch, get_explanation_service
+    from prediction import predict_risk, predict_risk_batch
+    from recommendations import get_recommendations, get_recommendations_batch
+    from validation import ValidationError, get_schema
+
+logger = logging.getLogger('app')
+
+MAX_BATCH_RECORDS = int(os.environ.get('MAX_BATCH_RECORDS', '10000'))
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+# Attach SHAP explanations to every prediction; otherwise only when a request asks with ?explain=1
+EXPLAIN_ALWAYS = os.environ.get('PREDICT_EXPLAIN', '').lower() in TRUE_VALUES
+
+
+def is_true(value):
+    return (value or '').lower() in TRUE_VALUES
+
+
+def parse_batch_body(body, mimetype):
+    """Return the list of records from a JSON array or NDJSON body.
+
+    NDJSON lines that are not valid JSON are kept as per-record errors.
+    """
+    if mimetype in ('application/json', 'text/json') or body.lstrip().startswith('['):
+        records = json.loads(body)
+        if not isinstance(records, list):
+            raise ValueError('Request body must be a JSON array of records')
+        return records, {}
+    records, parse_errors = [], {}
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError as e:
+            parse_errors[len(records)] = f'invalid JSON: {e}'
+            records.append(None)
+    return records, parse_errors
+
+
+def handle_predict(data, registry, explain=False, plot=False, started=None):
+    """``/predict``: score one form record. ``started`` is when reading the request began."""
+    started = started or time.perf_counter()
+    body, status = _predict(data, registry, explain, plot, started)
+    # The rendered SHAP plots are left out of the audit log
+    audit('/predict', status, started, request=data,
+          response={k: v for k, v in body.items() if k != 'shap_plots'} if 'shap_plots' in body else body)
+    return body, status
+
+
+def _predict(data, registry, explain, plot, started):
+    try:
+        artifacts = registry.get()
+        backend = artifacts.backend
+        if not data or not isinstance(data, dict):
+            return {'error': 'Request must be JSON with form fields'}, 400
+        # Types, ranges and allowed answers of every field (src/validation.py), checked in one pass
+        try:
+            input_data = get_schema(artifacts).validate(data)
+        except ValidationError as e:
+            return e.to_dict(), 400
+        metrics.observe_stage('parse', backend, started)
+
+        risks = predict_risk(input_data, registry=registry)
+        started = time.perf_counter()
+        recs = get_recommendations(risks, input_data)
+        started = metrics.observe_stage('recommendations', backend, started)
+        if metrics.should_trace(logger):
+            logger.info('/predict input: %s risks: %s recommendations: %s', data, risks, recs)
+
+        response = {'risks': risks, 'recommendations': recs}
+        if explain:
+            service = get_explanation_service(registry)
+            response['explanations'] = service.explain(input_data)
+            if plot:
+                response['shap_plots'] = {name: service.plot(input_data, name) for name in risks}
+            metrics.observe_stage('explain', backend, started)
+        return response, 200
+    except Exception as e:
+        # Provide detailed error information in debug mode so the front-end can show it
+        tb = traceback.format_exc()
+        logger.exception('Error in /predict')
+        return {'error': str(e), 'traceback': tb}, 500
+
+
+def handle_batch(body, mimetype, registry, explain=False, started=None):
+    """``/predict/batch``: score a JSON array (or NDJSON stream) of form records in one model call.
+
+    Every record gets its own entry in ``results``; invalid records carry an
+    ``error`` (and the ``fields`` at fault) instead of failing the whole batch.
+    """
+    started = started or time.perf_counter()
+    response, status = _predict_batch(body, mimetype, registry, explain, started)
+    audit('/predict/batch', status, started, mimetype=mimetype, body=body, response=response)
+    return response, status
+
+
+def _predict_batch(body, mimetype, registry, explain, started):
+    try:
+        records, parse_errors = parse_batch_body(body, mimetype)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if len(records) > MAX_BATCH_RECORDS:
+        return {'error': f'Batch too large: {len(records)} records (max {MAX_BATCH_RECORDS})'}, 413
+
+    try:
+        artifacts = registry.get()
+        backend = artifacts.backend
+        results = [None] * len(records)
+        # The valid records come back with their model input matrix already built
+        inputs, positions, invalid = get_schema(artifacts).validate_many(records)
+        for i, error in invalid.items():
+            results[i] = ({'index': i, 'error': parse_errors[i]} if i in parse_errors
+                          else {'index': i, **error.to_dict()})
+        metrics.observe_stage('parse', backend, started)
+
+        scored = predict_risk_batch(inputs, registry=registry)
+        explanations = [None] * len(inputs)
+        ok = [j for j, outcome in enumerate(scored) if 'error' not in outcome]
+        started = time.perf_counter()
+        if explain:
+            for j, explanation in zip(ok, explain_batch([inputs[j] for j in ok], registry=registry)):
+                explanations[j] = explanation
+            started = metrics.observe_stage('explain', backend, started)
+        recommendations = dict(zip(ok, get_recommendations_batch([scored[j]['risks'] for j in ok],
+                                                                 [inputs[j] for j in ok])))
+        for j, (i, outcome) in enumerate(zip(positions, scored)):
+            if 'error' in outcome:
+                results[i] = {'index': i, 'error': outcome['error']}
+            else:
+                results[i] = {'index': i, 'risks': outcome['risks'], 'recommendations': recommendations[j]}
+                if explanations[j] is not None:
+                    results[i]['explanations'] = explanations[j]
+        metrics.observe_stage('recommendations', backend, started)
+    except Exception as e:
+        # A model load failure or a scoring bug fails the batch as a JSON 500, like /predict
+        logger.exception('Error in /predict/batch')
+        return {'error': str(e)}, 500
+
+    errors = sum(1 for r in results if 'error' in r)
+    logger.info('Scored batch of %d records (%d errors)', len(results), errors)
+    return {'count': len(results), 'errors': errors, 'results': results}, 200
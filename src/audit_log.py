@@ -0,0 +1,217 @@
+# src/audit_log.py
+"""Buffered NDJSON audit log of the ``/predict`` traffic, written off the request path.
+
+Enabled with ``AUDIT_LOG=logs/audit.ndjson``. A request only appends its
+event to a bounded in-memory queue. A background thread serializes the
+events and writes them to the file. When the queue is full
+(``AUDIT_LOG_QUEUE`` events), the event is dropped and counted in
+``health_audit_events_total{result="dropped"}``; the request never waits.
+
+Every process writes its own file, with its pid inserted before the suffix
+(``logs/audit.12345.ndjson``). Gunicorn workers therefore never interleave
+lines or race on rotation. Once a file reaches ``AUDIT_LOG_MAX_MB``, it is
+renamed to ``.1`` (older files shift to ``.2`` ... ``.AUDIT_LOG_BACKUPS``,
+and the oldest is deleted). With ``AUDIT_LOG_COMPRESS=1`` the rotated files
+are gzipped. ``src/replay.py`` reads all of these forms back.
+
+One event per line::
+
+    {"ts": 1760000000.123, "route": "/predict", "status": 200, "latency_ms": 2.1,
+     "request": {...form fields...}, "response": {"risks": {...}, "recommendations": [...]}}
+
+For ``/predict/batch`` the event holds the raw request ``body`` and its
+``mimetype`` instead of ``request``.
+"""
+import atexit
+import contextlib
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+try:
+    from src.metrics import AUDIT_EVENTS
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from metrics import AUDIT_EVENTS
+
+logger = logging.getLogger('app')
+
+_STOP = object()
+
+
+def process_path(path, pid=None):
+    """``path`` with the pid of this process inserted before the suffix: ``audit.ndjson`` -> ``audit.<pid>.ndjson``."""
+    path = Path(path)
+    return path.with_name(f'{path.stem}.{pid or os.getpid()}{path.suffix}')
+
+
+class AuditLog:
+    """Appends events to an NDJSON file from a background thread; see the module docstring."""
+
+    def __init__(self, path, max_bytes=100 * 1024 * 1024, backups=5, compress=False, queue_size=10000,
+                 flush_interval=1.0):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(queue_size)
+        self._file = None
+        self._size = 0
+        self._thread = threading.Thread(target=self._run, name='audit-log', daemon=True)
+        self._thread.start()
+
+    def record(self, event):
+        """Queue ``event`` (a JSON-serializable dict) for writing; returns False if it was dropped."""
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            AUDIT_EVENTS.inc('dropped')
+            return False
+        return True
+
+    def close(self, timeout=5.0):
+        """Write out the queued events and stop the writer thread."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning('Audit log queue still full at shutdown; dropping the queued events')
+            return
+        self._thread.join(timeout)
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'ab')
+        self._size = self._file.tell()
+
+    def _rotated(self, i):
+        return self.path.with_name(f'{self.path.name}.{i}' + ('.gz' if self.compress else ''))
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        if self.backups <= 0:
+            self.path.unlink()
+            return
+        self._rotated(self.backups).unlink(missing_ok=True)
+        for i in range(self.backups - 1, 0, -1):
+            if self._rotated(i).exists():
+                self._rotated(i).replace(self._rotated(i + 1))
+        if self.compress:
+            # compressed under a temporary name, so replay never reads a partial .gz
+            tmp = self.path.with_name(f'{self.path.name}.1.tmp')
+            with open(self.path, 'rb') as src, gzip.open(tmp, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            tmp.replace(self._rotated(1))
+            self.path.unlink()
+        else:
+            self.path.replace(self._rotated(1))
+
+    def _write(self, event):
+        try:
+            line = (json.dumps(event, separators=(',', ':'), default=str) + '\n').encode()
+        except (TypeError, ValueError):
+            logger.exception('Could not serialize audit event')
+            AUDIT_EVENTS.inc('failed')
+            return
+        if self._file is None:
+            self._open()
+        if self._size and self._size + len(line) > self.max_bytes:
+            self._rotate()
+            self._open()
+        self._file.write(line)
+        self._size += len(line)
+        AUDIT_EVENTS.inc('written')
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                event = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                event = None
+            try:
+                if event is _STOP:
+                    break
+                if event is not None:
+                    self._write(event)
+                # Flush when the queue runs dry, and at least every flush_interval under load
+                if self._file is not None and (self._queue.empty()
+                                               or time.monotonic() - last_flush >= self.flush_interval):
+                    self._file.flush()
+                    last_flush = time.monotonic()
+            except OSError:
+                logger.exception('Audit log write to %s failed', self.path)
+                AUDIT_EVENTS.inc('failed')
+                if self._file is not None:
+                    with contextlib.suppress(OSError):
+                        self._file.close()
+                    self._file = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def audit_log_from_env():
+    """Build the audit log from ``AUDIT_LOG`` (unset disables it) and the ``AUDIT_LOG_*`` settings."""
+    path = os.environ.get('AUDIT_LOG', '').strip()
+    if not path:
+        return None
+    log = AuditLog(
+        process_path(path),
+        max_bytes=int(float(os.environ.get('AUDIT_LOG_MAX_MB', '100')) * 1024 * 1024),
+        backups=int(os.environ.get('AUDIT_LOG_BACKUPS', '5')),
+        compress=os.environ.get('AUDIT_LOG_COMPRESS', '').lower() in ('1', 'true', 'yes', 'on'),
+        queue_size=int(os.environ.get('AUDIT_LOG_QUEUE', '10000')),
+    )
+    logger.info('Audit log enabled (%s)', log.path)
+    return log
+
+
+_audit_log = None
+_audit_pid = None
+_audit_lock = threading.Lock()
+
+
+def get_audit_log():
+    """This process's audit log, or None when ``AUDIT_LOG`` is unset.
+
+    Created on first use in every process: a writer thread started in the
+    gunicorn master before the fork does not exist in the workers.
+    """
+    global _audit_log, _audit_pid
+    if _audit_pid != os.getpid():
+        with _audit_lock:
+            if _audit_pid != os.getpid():
+                _audit_log = audit_log_from_env()
+                _audit_pid = os.getpid()
+                if _audit_log is not None:
+                    atexit.register(_audit_log.close)
+    return _audit_log
+
+
+def configure_audit_log(path=None, **options):
+    """Replace this process's audit log; ``path=None`` turns it off. ``options`` go to :class:`AuditLog`."""
+    global _audit_log, _audit_pid
+    with _audit_lock:
+        previous = _audit_log
+        _audit_log = AuditLog(path, **options) if path is not None else None
+        _audit_pid = os.getpid()
+    if previous is not None:
+        previous.close()
+    return _audit_log
+
+
+def audit(route, status, started, **fields):
+    """Queue one event for ``route`` if the audit log is enabled; ``started`` is a ``perf_counter`` value."""
+    log = get_audit_log()
+    if log is not None:
+        log.record({'ts': time.time(), 'route': route, 'status': status,
+                    'latency_ms': round((time.perf_counter() - started) * 1000, 3), **fields})
@@ -0,0 +1,189 @@
+# src/bulk_score.py
+"""Stream a CSV/Parquet population extract through the prediction pipeline.
+
+    python src/bulk_score.py Data/dirty_v3_path.csv scores.parquet --chunksize 50000 --workers 4
+
+The input is read in fixed-size chunks, every chunk is aligned and encoded
+exactly like ``predict_risk`` (column-wise, through the same alignment plan)
+and scored with one model call, and the risks are appended to the output
+as they come in, so memory stays bounded by ``chunksize * (workers + 1)`` rows
+whatever the size of the input.
+"""
+import argparse
+import logging
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    from src.feature_pipeline import INPUT_COLUMNS
+    from src.model_registry import get_registry
+    from src.prediction import predict_risk_columns
+    from src.recommendations import get_rule_set
+except ImportError:  # run as `python src/bulk_score.py`
+    from feature_pipeline import INPUT_COLUMNS
+    from model_registry import get_registry
+    from prediction import predict_risk_columns
+    from recommendations import get_rule_set
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_SEPARATOR = ' | '
+
+
+def normalize_columns(df):
+    """Rename raw extract headers ('Physical Activity', 'Blood Pressure', ...) to predict_risk's input keys."""
+    df = df.rename(columns=lambda c: str(c).strip().replace(' ', '_'))
+    if 'Blood_Pressure' in df.columns and 'Systolic' not in df.columns:
+        bp = df['Blood_Pressure']
+        if bp.dtype == object:
+            # 'systolic/diastolic' strings; a bare number is the systolic reading
+            parts = bp.astype(str).str.split('/', n=1, expand=True)
+            df['Systolic'] = pd.to_numeric(parts[0], errors='coerce')
+            if parts.shape[1] > 1:
+                df['Diastolic'] = pd.to_numeric(parts[1], errors='coerce')
+        else:
+            df['Systolic'] = bp
+    return df
+
+
+def score_chunk(chunk, id_column=None, recommendations=False):
+    """Return a DataFrame of risks (and optionally recommendations) for one input chunk."""
+    chunk = normalize_columns(chunk)
+    columns = {c: chunk[c].to_numpy() for c in INPUT_COLUMNS if c in chunk.columns}
+    risks = predict_risk_columns(columns, len(chunk))
+    out = pd.DataFrame(risks, index=chunk.index)
+    if id_column:
+        out.insert(0, id_column, chunk[id_column.replace(' ', '_')].to_numpy())
+    if recommendations:
+        # Every rule is evaluated on whole columns; no per-row dicts
+        out['recommendations'] = get_rule_set().recommend_many(risks, columns, len(chunk))
+    return out
+
+
+def iter_chunks(path, chunksize):
+    path = Path(path)
+    if path.suffix.lower() in ('.parquet', '.pq'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, df):
+        if 'recommendations' in df.columns:
+            df = df.assign(recommendations=df['recommendations'].map(RECOMMENDATION_SEPARATOR.join))
+        df.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        if self.header:  # empty input: still leave a valid (empty) file behind
+            Path(self.path).write_text('')
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa, self._pq = pa, pq
+        self.path = path
+        self.writer = None
+
+    def write(self, df):
+        pa = self._pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            # The file schema comes from the first chunk, except for types that chunk cannot show:
+            # recommendations are lists of strings even when no rule fired in it (list<null>),
+            # and an all-missing column is written as strings
+            schema = table.schema
+            for i, field in enumerate(schema):
+                if field.name == 'recommendations':
+                    schema = schema.set(i, field.with_type(pa.list_(pa.string())))
+                elif pa.types.is_null(field.type):
+                    schema = schema.set(i, field.with_type(pa.string()))
+            self.writer = self._pq.ParquetWriter(self.path, schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _open_sink(path, fmt=None):
+    fmt = fmt or ('parquet' if Path(path).suffix.lower() in ('.parquet', '.pq') else 'csv')
+    return _ParquetSink(path) if fmt == 'parquet' else _CsvSink(path)
+
+
+def _init_worker():
+    # Load the model once per worker process; every chunk it scores reuses it
+    get_registry().get()
+
+
+def bulk_score(input_path, output_path, chunksize=10000, workers=1, id_column=None,
+               recommendations=False, fmt=None):
+    """Score ``input_path`` into ``output_path`` chunk by chunk. Returns a summary dict."""
+    start = time.perf_counter()
+    sink = _open_sink(output_path, fmt)
+    rows = chunks = 0
+
+    def _write(out):
+        nonlocal rows, chunks
+        sink.write(out)
+        rows += len(out)
+        chunks += 1
+        logger.info('scored %d rows (%.0f rows/s)', rows, rows / (time.perf_counter() - start))
+
+    try:
+        if workers <= 1:
+            _init_worker()
+            for chunk in iter_chunks(input_path, chunksize):
+                _write(score_chunk(chunk, id_column, recommendations))
+        else:
+            # Keep at most 2 chunks per worker in flight and write results in input order
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                pending = deque()
+                for chunk in iter_chunks(input_path, chunksize):
+                    pending.append(pool.submit(score_chunk, chunk, id_column, recommendations))
+                    if len(pending) >= 2 * workers:
+                        _write(pending.popleft().result())
+                while pending:
+                    _write(pending.popleft().result())
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - start
+    return {'rows': rows, 'chunks': chunks, 'seconds': round(elapsed, 3),
+            'rows_per_second': round(rows / elapsed, 1) if elapsed else float('nan')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-score a CSV/Parquet extract with the health risk model.')
+    parser.add_argument('input', help='CSV or Parquet file shaped like Data/dirty_v3_path.csv')
+    parser.add_argument('output', help='CSV or Parquet file to write (format from the extension)')
+    parser.add_argument('--chunksize', type=int, default=10000, help='rows per chunk (default: 10000)')
+    parser.add_argument('--workers', type=int, default=1, help='score chunks in N processes (default: 1)')
+    parser.add_argument('--id-column', help='input column to copy to the output as a row identifier')
+    parser.add_argument('--recommendations', action='store_true', help='also write get_recommendations output')
+    parser.add_argument('--format', choices=['csv', 'parquet'], help='override the output format')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    summary = bulk_score(args.input, args.output, chunksize=args.chunksize, workers=args.workers,
+                         id_column=args.id_column, recommendations=args.recommendations, fmt=args.format)
+    print(summary)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# src/coalescer.py
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger('app')
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one batched model call.
+
+    Request threads call :meth:`submit` with an already-aligned (1, n_features)
+    row and block on the returned future. A background thread flushes the
+    queue as soon as ``max_batch`` rows are waiting or the oldest row has waited
+    ``max_wait`` seconds, stacks the rows into one matrix per artifacts
+    snapshot, calls ``score_fn(artifacts, X)`` once and hands every future its
+    own row of the result (a ``{target: probability}`` dict).
+    """
+
+    def __init__(self, score_fn, max_batch=32, max_wait=0.002):
+        if max_batch < 1:
+            raise ValueError('max_batch must be >= 1')
+        self.score_fn = score_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._pending = []
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.batches = 0
+        self.rows = 0
+
+    def submit(self, artifacts, X) -> Future:
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('MicroBatcher is closed')
+            self._ensure_started()
+            self._pending.append((time.monotonic(), artifacts, X, future))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return future
+
+    def close(self):
+        """Flush what is queued and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            thread.join()
+
+    def stats(self):
+        return {'batches': self.batches, 'rows': self.rows,
+                'mean_batch_size': self.rows / self.batches if self.batches else 0.0}
+
+    def _ensure_started(self):
+        # A thread started before a gunicorn fork does not exist in the worker
+        if self._thread is None or self._pid != os.getpid():
+            self._pending = []
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='predict-coalescer', daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            deadline = self._pending[0][0] + self.max_wait
+            while len(self._pending) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            # Rows aligned against different artifacts (a hot reload landed mid-batch)
+            # must be scored by the model they were aligned for.
+            groups = {}
+            for _, artifacts, X, future in batch:
+                groups.setdefault(id(artifacts), (artifacts, []))[1].append((X, future))
+            for artifacts, items in groups.values():
+                self._flush(artifacts, items)
+
+    def _flush(self, artifacts, items):
+        live = [(X, f) for X, f in items if f.set_running_or_notify_cancel()]
+        if not live:
+            return
+        try:
+            scores = self.score_fn(artifacts, np.vstack([X for X, _ in live]))
+        except BaseException as e:
+            for _, f in live:
+                f.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += len(live)
+        for i, (_, f) in enumerate(live):
+            f.set_result({name: p[i:i + 1] for name, p in scores.items()})
+
+
+def coalescer_from_env(score_fn):
+    """Build a MicroBatcher from ``PREDICT_COALESCE*`` environment variables, or None when disabled."""
+    if os.environ.get('PREDICT_COALESCE', '').lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    max_batch = int(os.environ.get('PREDICT_COALESCE_MAX_BATCH', '32'))
+    max_wait_ms = float(os.environ.get('PREDICT_COALESCE_MAX_WAIT_MS', '2'))
+    logger.info('Prediction coalescing enabled (max_batch=%s, max_wait=%sms)', max_batch, max_wait_ms)
+    return MicroBatcher(score_fn, max_batch=max_batch, max_wait=max_wait_ms / 1000.0)
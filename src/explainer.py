@@ -1,26 +1,227 @@
-import pandas as pd
-import shap
-import joblib
-import matplotlib.pyplot as plt
-import io
+# src/explainer.py
+"""Per-feature explanations (SHAP values) of the risk predictions.
+
+An :class:`ExplanationService` is built once per loaded model: one tree
+explainer per target, fed with the same aligned rows ``predict_risk`` scores.
+XGBoost models are explained with the booster's own exact TreeSHAP
+(``pred_contribs``, what ``shap.TreeExplainer`` computes for them); other
+tree models fall back to ``shap.TreeExplainer``. Contributions are in
+log-odds and, for one-hot encoded columns, summed back to the input column.
+"""
 import base64
+import io
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from src.feature_pipeline import INPUT_COLUMNS
+    from src.lean_model import META_FILE as LEAN_META_FILE
+    from src.model_registry import BACKEND_LEAN, get_registry
+    from src.prediction import TARGET_NAMES, _align, _input_frame
+    from src.prediction_cache import PredictionCache
+    from src.validation import prealigned
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from feature_pipeline import INPUT_COLUMNS
+    from lean_model import META_FILE as LEAN_META_FILE
+    from model_registry import BACKEND_LEAN, get_registry
+    from prediction import TARGET_NAMES, _align, _input_frame
+    from prediction_cache import PredictionCache
+    from validation import prealigned
+
+logger = logging.getLogger('app')
+
+DEFAULT_TOP_K = int(os.environ.get('EXPLAIN_TOP_K', '5'))
+
+
+class _BoosterExplainer:
+    """Exact TreeSHAP of an XGBoost booster via ``Booster.predict(pred_contribs=True)``."""
+
+    def __init__(self, booster, iteration_range=(0, 0)):
+        self.booster = booster
+        self.iteration_range = iteration_range
+
+    def __call__(self, X):
+        import xgboost as xgb
+        return self.booster.predict(xgb.DMatrix(X, missing=np.nan), pred_contribs=True,
+                                    iteration_range=self.iteration_range)
+
+
+class _ShapExplainer:
+    """``shap.TreeExplainer`` for tree models that are not XGBoost boosters."""
+
+    def __init__(self, model):
+        import shap
+        self.explainer = shap.TreeExplainer(model)
+
+    def __call__(self, X):
+        values = self.explainer.shap_values(X)
+        expected = np.ravel(self.explainer.expected_value)
+        if isinstance(values, list):  # one array per class: explain the positive class
+            values, expected = values[-1], expected[-1:]
+        values = np.asarray(values)
+        if values.ndim == 3:
+            values = values[..., -1]
+            expected = expected[-1:]
+        bias = np.full((values.shape[0], 1), expected[0])
+        return np.hstack([values, bias])
+
+
+def _explainer_for(model):
+    if hasattr(model, 'get_booster'):
+        best = getattr(model, 'best_iteration', None)
+        return _BoosterExplainer(model.get_booster(), (0, best + 1) if best is not None else (0, 0))
+    return _ShapExplainer(model)
+
+
+def _build_explainers(artifacts):
+    """Return {target: explainer} for the loaded artifacts."""
+    if artifacts.backend == BACKEND_LEAN:
+        # The lean export keeps the XGBoost JSON models; load them back only for explanations
+        import json
+        import xgboost as xgb
+        directory = Path(artifacts.paths['lean']).parent
+        meta = json.loads((directory / LEAN_META_FILE).read_text())
+        return {TARGET_NAMES[i]: _BoosterExplainer(xgb.Booster(model_file=str(directory / name)))
+                for i, name in enumerate(meta['boosters'])}
+    if artifacts.chronic_model is not None:
+        return {TARGET_NAMES[i]: _explainer_for(est) for i, est in enumerate(artifacts.chronic_model.estimators_)}
+    return {name: _explainer_for(model) for name, model in artifacts.models.items()}
+
+
+class ExplanationService:
+    """Top-k feature contributions for one :class:`LoadedArtifacts` snapshot."""
 
-def get_shap_explanation(input_dict, disease='diabetes'):
-    model = joblib.load(f'models/{disease}_model.pkl')
-    scaler = joblib.load('models/scaler.pkl')
-    
-    df = pd.DataFrame([input_dict])
-    df = df.reindex(columns=[...], fill_value=0)  # same as prediction.py
-    X = scaler.transform(df)
-    
-    explainer = shap.TreeExplainer(model)
-    shap_values = explainer.shap_values(X)
-    
-    plt.figure(figsize=(8, 6))
-    shap.force_plot(explainer.expected_value, shap_values[0], df.iloc[0], matplotlib=True, show=False)
+    def __init__(self, artifacts, plot_cache_size=128):
+        self.artifacts = artifacts
+        self.explainers = _build_explainers(artifacts)
+        plan = artifacts.plan
+        if plan is not None:
+            self.features = [rule.column for rule in plan.rules]
+            groups = plan.feature_groups
+        else:
+            self.features = list(INPUT_COLUMNS)
+            groups = np.arange(len(INPUT_COLUMNS))
+        # (n_model_columns, n_features) 0/1 matrix summing one-hot contributions per input column
+        self._grouping = np.zeros((len(groups), len(self.features)))
+        self._grouping[np.arange(len(groups)), groups] = 1.0
+        self._plots = PredictionCache(maxsize=plot_cache_size) if plot_cache_size > 0 else None
+
+    def _raw_values(self, records):
+        plan = self.artifacts.plan
+        if plan is not None:
+            return [plan.align_one(r) for r in records]
+        return _input_frame(records)[self.features].values.tolist()
+
+    def _matrix(self, records):
+        """The model rows of ``records``; records checked by src/validation.py bring theirs along."""
+        X = prealigned(self.artifacts, records)
+        if X is not None:
+            return X
+        rows = [prealigned(self.artifacts, record) for record in records]
+        if all(row is not None for row in rows):
+            return np.vstack(rows)
+        return _align(self.artifacts, records)
+
+    def explain_batch(self, records, top_k=DEFAULT_TOP_K):
+        """Return one ``{target: {'base_value', 'contributions'}}`` dict per record."""
+        if not records:
+            return []
+        X = self._matrix(records)
+        return self._explain_matrix(X, self._raw_values(records), top_k)
+
+    def explain(self, record, top_k=DEFAULT_TOP_K):
+        return self.explain_batch([record], top_k)[0]
+
+    def _explain_matrix(self, X, raw_values, top_k):
+        results = [{} for _ in range(len(X))]
+        for target, explainer in self.explainers.items():
+            contribs = np.asarray(explainer(X), dtype=np.float64)
+            per_feature = contribs[:, :-1] @ self._grouping
+            order = np.argsort(-np.abs(per_feature), axis=1, kind='stable')[:, :top_k]
+            for i, result in enumerate(results):
+                result[target] = {
+                    'base_value': round(float(contribs[i, -1]), 4),
+                    'contributions': [
+                        {'feature': self.features[j], 'value': _jsonable(raw_values[i][j]),
+                         'contribution': round(float(per_feature[i, j]), 4)}
+                        for j in order[i]
+                    ],
+                }
+        return results
+
+    def plot(self, record, target, top_k=DEFAULT_TOP_K):
+        """PNG bar chart (data URI) of one target's contributions; cached per aligned row."""
+        X = self._matrix([record])
+        key = None
+        if self._plots is not None:
+            key = self._plots.key(self.artifacts, X) + f'{target}:{top_k}'.encode()
+            cached = self._plots.get(key)
+            if cached is not None:
+                return cached
+        explanation = self._explain_matrix(X, self._raw_values([record]), top_k)[0][target]
+        uri = _render_png(explanation, target)
+        if key is not None:
+            self._plots.put(key, uri)
+        return uri
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _render_png(explanation, target):
+    # A standalone Figure on its own Agg canvas: pyplot's global figure state is not thread-safe,
+    # and plots are rendered concurrently by the request threads
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    items = explanation['contributions'][::-1]
+    fig = Figure(figsize=(6, 0.4 * len(items) + 1))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.barh([f"{c['feature']} = {c['value']}" for c in items], [c['contribution'] for c in items],
+            color=['#d9534f' if c['contribution'] > 0 else '#5cb85c' for c in items])
+    ax.axvline(0, color='black', linewidth=0.8)
+    ax.set_xlabel('contribution to log-odds')
+    ax.set_title(f"{target.replace('_', ' ').title()} risk drivers")
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode()
-    plt.close()
-    return f"data:image/png;base64,{img_base64}"
\ No newline at end of file
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    return 'data:image/png;base64,' + base64.b64encode(buf.getvalue()).decode()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_explanation_service(registry=None):
+    """The explanation service for the registry's current snapshot (rebuilt after a reload)."""
+    global _service
+    artifacts = (registry or get_registry()).get()
+    service = _service
+    if service is None or service.artifacts is not artifacts:
+        with _service_lock:
+            if _service is None or _service.artifacts is not artifacts:
+                _service = ExplanationService(artifacts)
+            service = _service
+    return service
+
+
+def explain(input_dict, top_k=DEFAULT_TOP_K, registry=None):
+    return get_explanation_service(registry).explain(input_dict, top_k)
+
+
+def explain_batch(records, top_k=DEFAULT_TOP_K, registry=None):
+    return get_explanation_service(registry).explain_batch(records, top_k)
+
+
+def get_shap_explanation(input_dict, disease='diabetes', registry=None):
+    """PNG data URI of the SHAP contributions for one disease (kept for the original front-end hook)."""
+    return get_explanation_service(registry).plot(input_dict, disease)
@@ -0,0 +1,411 @@
+# src/feature_pipeline.py
+import math
+from bisect import bisect_left
+
+import numpy as np
+
+# Request keys predict_risk understands; anything else in the input dict is ignored
+INPUT_COLUMNS = [
+    'Age', 'Gender', 'Glucose', 'HbA1c', 'Systolic', 'Diastolic', 'BMI', 'Cholesterol',
+    'Triglycerides', 'Smoking', 'Alcohol', 'Physical_Activity', 'Diet_Score',
+    'Family_History', 'Sleep_Hours', 'Stress_Level', 'TC_HDL_Ratio'
+]
+# Inputs coerced to numbers (invalid/missing -> 0); Gender is passed through as a category
+NUMERIC_INPUTS = [c for c in INPUT_COLUMNS if c != 'Gender']
+
+# Text codes of the raw extract (and of the web form's answers); numeric codes are kept as they are
+CATEGORY_MAPS = {
+    'Gender': {'Male': 1, 'Female': 0},
+    'Smoking': {'Yes': 1, 'No': 0, 'Former': 1},
+    'Alcohol': {'Yes': 1, 'No': 0, 'Occasional': 1, 'Regular': 1},
+    'Family_History': {'Yes': 1, 'No': 0},
+    # Activity & Stress ordinal
+    'Physical_Activity': {'Low': 0, 'Moderate': 1, 'High': 2},
+    'Stress_Level': {'Low': 0, 'Moderate': 1, 'High': 2},
+}
+# Lowercase text answer -> code, for the inputs that have text answers
+ANSWER_CODES = {column: {str(answer).lower(): code for answer, code in mapping.items()}
+                for column, mapping in CATEGORY_MAPS.items()}
+
+# Same bins the notebook used to derive the categorical features
+BMI_BINS = (0, 18.5, 25, 30, 100)
+BMI_LABELS = ('Underweight', 'Normal', 'Overweight', 'Obese')
+AGE_BINS = (0, 40, 60, 100)
+AGE_LABELS = ('Young', 'Middle', 'Senior')
+
+
+def to_number(value) -> float:
+    """Scalar equivalent of ``pd.to_numeric(value, errors='coerce')`` followed by ``fillna(0)``."""
+    if isinstance(value, (bool, np.bool_)):
+        return float(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        value = float(value)
+        return 0.0 if math.isnan(value) else value
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    if isinstance(value, str):
+        text = value.strip()
+        # float() also accepts '1_000' and non-ASCII digits, pandas does not
+        if not text.isascii() or '_' in text:
+            return 0.0
+        try:
+            value = float(text)
+        except ValueError:
+            return 0.0
+        return 0.0 if math.isnan(value) else value
+    return 0.0
+
+
+def is_missing(value) -> bool:
+    if value is None:
+        return True
+    try:
+        return bool(value != value)  # NaN / NaT
+    except TypeError:
+        return True  # pd.NA refuses to be a bool
+    except Exception:
+        return False
+
+
+def cut(value: float, bins, labels):
+    """Scalar ``pd.cut`` with right-closed bins; returns None outside the bins."""
+    i = bisect_left(bins, value) - 1
+    if 0 <= i < len(labels) and value == value:
+        return labels[i]
+    return None
+
+
+def _candidates(name):
+    # generate possible input keys that map to this expected column
+    yield name
+    yield name.replace(' ', '_')
+    yield name.replace(' ', '').lower()
+    yield name.lower().replace(' ', '_')
+
+
+def to_number_array(values) -> np.ndarray:
+    """Vectorized :func:`to_number` for a column of values."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'biuf':
+        out = arr.astype(np.float64)
+        out[np.isnan(out)] = 0.0
+        return out
+    return np.fromiter((to_number(v) for v in arr), dtype=np.float64, count=len(arr))
+
+
+def to_code(column, value) -> float:
+    """:func:`to_number`, except that the text answers of ``column`` (``'Yes'``, ``'High'``) become their codes."""
+    if isinstance(value, str) and column in ANSWER_CODES:
+        code = ANSWER_CODES[column].get(value.strip().lower())
+        if code is not None:
+            return float(code)
+    return to_number(value)
+
+
+def to_code_array(column, values) -> np.ndarray:
+    """Vectorized :func:`to_code`."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'biuf' or column not in ANSWER_CODES:
+        return to_number_array(arr)
+    # A text column holds a handful of distinct answers: convert each once
+    converted = {}
+    out = np.empty(len(arr), dtype=np.float64)
+    for i, value in enumerate(arr.tolist()):
+        try:
+            out[i] = converted[value]
+        except KeyError:
+            out[i] = converted[value] = to_code(column, value)
+        except TypeError:  # unhashable
+            out[i] = to_code(column, value)
+    return out
+
+
+def cut_array(values: np.ndarray, bins, labels) -> np.ndarray:
+    """Vectorized :func:`cut`; values outside the bins become None."""
+    idx = np.searchsorted(bins, values, side='left') - 1
+    valid = (idx >= 0) & (idx < len(labels)) & ~np.isnan(values)
+    out = np.full(len(values), None, dtype=object)
+    out[valid] = np.asarray(labels, dtype=object)[idx[valid]]
+    return out
+
+
+class ColumnRule:
+    """How one preprocessor input column is filled from a request dict.
+
+    ``source`` is the request key the value is read from, ``coerce`` names the
+    conversion applied to it and ``default`` is used when the result is missing.
+    Calling the rule with a request dict returns the coerced value;
+    :meth:`values` does the same for a whole column of requests at once.
+    """
+
+    __slots__ = ('column', 'source', 'coerce', 'default', '_fetch', '_fetch_column')
+
+    def __init__(self, column, source, coerce, default, fetch, fetch_column):
+        self.column = column
+        self.source = source
+        self.coerce = coerce
+        self.default = default
+        self._fetch = fetch
+        self._fetch_column = fetch_column
+
+    def __call__(self, record):
+        value = self._fetch(record)
+        return self.default if is_missing(value) else value
+
+    def values(self, columns, n) -> np.ndarray:
+        """Column version of ``__call__``: ``columns`` maps request keys to length-``n`` sequences."""
+        values = self._fetch_column(columns, n)
+        if values.dtype == object:
+            missing = np.fromiter((is_missing(v) for v in values), dtype=bool, count=n)
+            values[missing] = self.default
+        return values
+
+    def __repr__(self):
+        return f'ColumnRule({self.column!r}, source={self.source!r}, coerce={self.coerce!r}, default={self.default!r})'
+
+
+def _column(columns, key, n):
+    # keys absent from the input behave like the 0 fill of a reindex
+    if key in columns:
+        return np.asarray(columns[key])
+    return np.zeros(n)
+
+
+def _numeric_fetch(key):
+    if key is None:
+        return (lambda record: 0.0), (lambda columns, n: np.zeros(n))
+    if key == 'TC_HDL_Ratio':
+        # Use a safe divisor if HDL not provided; this is a fallback only
+        def fetch(record):
+            ratio = record.get(key, 0)
+            if is_missing(ratio) or ratio == 0:
+                return to_number(record.get('Cholesterol', 0)) / 50
+            return to_number(ratio)
+
+        def fetch_column(columns, n):
+            raw = _column(columns, key, n)
+            fallback = np.fromiter((is_missing(v) or v == 0 for v in raw), dtype=bool, count=n)
+            out = to_number_array(raw)
+            out[fallback] = to_number_array(_column(columns, 'Cholesterol', n))[fallback] / 50
+            return out
+        return fetch, fetch_column
+    # Text answers are coded as on the validated form and in the recommendation rules
+    return (lambda record: to_code(key, record.get(key, 0))), \
+        (lambda columns, n: to_code_array(key, _column(columns, key, n)))
+
+
+def _category_fetch(key):
+    if key is None:
+        return (lambda record: None), (lambda columns, n: np.full(n, None, dtype=object))
+    return (lambda record: record.get(key, 0)), \
+        (lambda columns, n: _column(columns, key, n).astype(object))
+
+
+def _binned_fetch(key, bins, labels):
+    return (lambda record: cut(to_number(record.get(key, 0)), bins, labels)), \
+        (lambda columns, n: cut_array(to_number_array(_column(columns, key, n)), bins, labels))
+
+
+def _resolve_source(column):
+    """Map a preprocessor column to its request key and, for derived categories, its bins."""
+    for cand in _candidates(column):
+        if cand in INPUT_COLUMNS:
+            return cand, None
+    # handle some common derived/renamed columns
+    if column == 'Systolic_BP':
+        return 'Systolic', None
+    if column == 'Diastolic_BP':
+        return 'Diastolic', None
+    if column == 'BMI_Category':
+        return 'BMI', (BMI_BINS, BMI_LABELS)
+    if column == 'Age_Group':
+        return 'Age', (AGE_BINS, AGE_LABELS)
+    return None, None
+
+
+class OneHotLookup:
+    """Precomputed one-hot encoding for the fitted OneHotEncoder's categories.
+
+    Every kept category is mapped, by its lowercase string, to its output column
+    so encoding a value is one dict lookup instead of a string comparison per
+    category. The dropped category (``drop='first'``) and unknown values map to
+    no column, i.e. an all-zero block, as with ``handle_unknown='ignore'``.
+    """
+
+    def __init__(self, categories, drop_idx=None, offset=0):
+        self.categories = [[str(c) for c in cats] for cats in categories]
+        self.lookups = []
+        # (categorical column index, category) of every output column, in order
+        self.columns = []
+        col = offset
+        for i, cats in enumerate(self.categories):
+            dropped = None if drop_idx is None else drop_idx[i]
+            lookup = {}
+            for j, cat in enumerate(cats):
+                if dropped is not None and j == dropped:
+                    continue
+                lookup.setdefault(cat.lower(), col)
+                self.columns.append((i, cat))
+                col += 1
+            self.lookups.append(lookup)
+        self.offset = offset
+        self.n_columns = col - offset
+
+    def encode_one(self, values, row):
+        """Set the one-hot cells for one row's categorical ``values`` in the 1-d ``row``."""
+        for value, lookup in zip(values, self.lookups):
+            col = lookup.get(str(value).lower())
+            if col is not None:
+                row[col] = 1.0
+
+    def encode(self, columns, X):
+        """Bulk version: ``columns`` holds one sequence of values per categorical column."""
+        rows = np.arange(X.shape[0])
+        for values, lookup in zip(columns, self.lookups):
+            get = lookup.get
+            cols = np.fromiter((get(str(v).lower(), -1) for v in values), dtype=np.int64, count=len(rows))
+            hit = cols >= 0
+            X[rows[hit], cols[hit]] = 1.0
+
+
+class AlignmentPlan:
+    """Compiled mapping from a request dict to the chronic model's input row.
+
+    Built once per loaded preprocessor (see :meth:`from_preprocessor`); applying
+    it to a request is a single pass over the precompiled column rules that
+    writes the scaled numeric values followed by the one-hot categories into a
+    preallocated float32 matrix, the same layout ``ColumnTransformer.transform``
+    produces (float32 is what XGBoost converts its input to anyway).
+    """
+
+    def __init__(self, num_rules, num_offset, num_scale, cat_rules, categories, drop_idx=None):
+        self.num_rules = num_rules
+        self.cat_rules = cat_rules
+        self.num_offset = np.asarray(num_offset, dtype=np.float64)
+        self.num_scale = np.asarray(num_scale, dtype=np.float64)
+        self.encoder = OneHotLookup(categories, drop_idx, offset=len(num_rules))
+        self.categories = self.encoder.categories
+        self._num_steps = list(zip(num_rules, self.num_offset.tolist(), self.num_scale.tolist()))
+        self.n_features = len(num_rules) + self.encoder.n_columns
+
+    @property
+    def rules(self):
+        return list(self.num_rules) + list(self.cat_rules)
+
+    @property
+    def feature_names(self):
+        """Model input column names, e.g. ``['Age', ..., 'Gender_Male', ...]``."""
+        return ([rule.column for rule in self.num_rules]
+                + [f'{self.cat_rules[i].column}_{cat}' for i, cat in self.encoder.columns])
+
+    @property
+    def feature_groups(self):
+        """Index into :attr:`rules` of the preprocessor column each model input column comes from."""
+        n_num = len(self.num_rules)
+        return np.array(list(range(n_num)) + [n_num + i for i, _ in self.encoder.columns], dtype=np.intp)
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor):
+        return cls.from_spec(preprocessor_spec(preprocessor))
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Build the plan from a :func:`preprocessor_spec` dict (e.g. read back from a lean export)."""
+        num_cols, cat_cols = list(spec['num_cols']), list(spec['cat_cols'])
+        categories = [list(c) for c in spec['categories']]
+        num_rules = []
+        for col in num_cols:
+            key, _ = _resolve_source(col)
+            num_rules.append(ColumnRule(col, key, 'to_code' if key in ANSWER_CODES else 'to_number', 0.0,
+                                        *_numeric_fetch(key)))
+        cat_rules = []
+        for col, cats in zip(cat_cols, categories):
+            key, binning = _resolve_source(col)
+            default = cats[0] if len(cats) > 0 else ''
+            if binning is not None:
+                rule = ColumnRule(col, key, 'cut', default, *_binned_fetch(key, *binning))
+            else:
+                rule = ColumnRule(col, key, 'category', default, *_category_fetch(key))
+            cat_rules.append(rule)
+        return cls(num_rules, spec['num_offset'], spec['num_scale'], cat_rules, categories, spec['drop_idx'])
+
+    def align_one(self, record):
+        """Return the raw (unscaled, unencoded) values in preprocessor column order."""
+        return [rule(record) for rule in self.num_rules] + [rule(record) for rule in self.cat_rules]
+
+    def transform_one(self, record) -> np.ndarray:
+        """Return the (1, n_features) model input for a single request dict."""
+        X = np.zeros((1, self.n_features), dtype=np.float32)
+        row = X[0]
+        for i, (rule, offset, scale) in enumerate(self._num_steps):
+            row[i] = (rule(record) - offset) / scale
+        self.encoder.encode_one([rule(record) for rule in self.cat_rules], row)
+        return X
+
+    def transform(self, records) -> np.ndarray:
+        """Return the (len(records), n_features) model input for a list of request dicts."""
+        X = np.zeros((len(records), self.n_features), dtype=np.float32)
+        if not len(records):
+            return X
+        if self.num_rules:
+            raw = np.array([[rule(r) for rule in self.num_rules] for r in records], dtype=np.float64)
+            X[:, :len(self.num_rules)] = (raw - self.num_offset) / self.num_scale
+        self.encoder.encode([[rule(r) for r in records] for rule in self.cat_rules], X)
+        return X
+
+    def transform_columns(self, columns, n) -> np.ndarray:
+        """Return the (n, n_features) model input from columnar data.
+
+        ``columns`` maps request keys (see ``INPUT_COLUMNS``) to length-``n``
+        sequences, e.g. a DataFrame chunk; this is the vectorized path used for
+        bulk scoring and gives the same rows as :meth:`transform`.
+        """
+        X = np.zeros((n, self.n_features), dtype=np.float32)
+        if not n:
+            return X
+        for i, rule in enumerate(self.num_rules):
+            X[:, i] = (rule.values(columns, n) - self.num_offset[i]) / self.num_scale[i]
+        self.encoder.encode([rule.values(columns, n) for rule in self.cat_rules], X)
+        return X
+
+
+def preprocessor_spec(preprocessor):
+    """Everything an AlignmentPlan needs from a fitted ColumnTransformer, as plain lists.
+
+    ``num_offset``/``num_scale`` reproduce the StandardScaler and ``drop_idx``
+    the OneHotEncoder's dropped category per column (None when nothing is dropped).
+    """
+    expected = list(preprocessor.feature_names_in_)
+    num_cols, cat_cols, categories = [], [], []
+    num_transformer = enc = None
+    for name, transformer, cols in preprocessor.transformers_:
+        if name == 'num':
+            num_cols, num_transformer = list(cols), transformer
+        elif name == 'cat':
+            cat_cols, enc = list(cols), transformer
+    drop_idx = None
+    if enc is not None:
+        categories = [[str(v) for v in c] for c in enc.categories_]
+        drop = getattr(enc, 'drop_idx_', None)
+        if drop is not None:
+            drop_idx = [None if d is None else int(d) for d in drop]
+    # Columns the ColumnTransformer does not route anywhere are dropped by it too
+    unknown = set(num_cols + cat_cols) - set(expected)
+    if unknown:
+        raise ValueError(f'preprocessor columns not in feature_names_in_: {sorted(unknown)}')
+    offset, scale = _scaler_params(num_transformer, len(num_cols))
+    return {'feature_names_in': expected, 'num_cols': num_cols, 'cat_cols': cat_cols,
+            'categories': categories, 'drop_idx': drop_idx,
+            'num_offset': [float(v) for v in offset], 'num_scale': [float(v) for v in scale]}
+
+
+def _scaler_params(transformer, n):
+    """Offset/scale that reproduce a fitted StandardScaler; identity otherwise."""
+    offset, scale = [0.0] * n, [1.0] * n
+    if transformer is None:
+        return offset, scale
+    if getattr(transformer, 'with_mean', False) and getattr(transformer, 'mean_', None) is not None:
+        offset = list(transformer.mean_)
+    if getattr(transformer, 'with_std', False) and getattr(transformer, 'scale_', None) is not None:
+        scale = list(transformer.scale_)
+    return offset, scale
@@ -0,0 +1,305 @@
+# src/incremental_training.py
+"""Update the chronic (multi-output) model from a batch of new rows, without a full refit.
+
+    python src/incremental_training.py Data/new_rows.csv --base artifacts --rounds 50
+
+The preprocessor is updated from the batch: ``StandardScaler.partial_fit``
+updates the running means/scales. Category sets are compared with the
+batch, and new categories are reported but not added (see
+:func:`update_preprocessor`). The existing boosters are then rewritten for
+the new scaling and boosted for ``--rounds`` more trees on the batch only.
+Their numeric split thresholds are mapped onto the new scaling, so the
+trees make exactly the same splits on the same raw values. Cost therefore
+grows with the batch, not with the history.
+
+The result is written as a new version under ``<base>/versions/<id>/``
+(``chronic_disease_model.pkl``, ``preprocessor.pkl``, ``report.json``). The
+base artifacts are left untouched unless ``--promote`` is given.
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from src.feature_pipeline import AGE_BINS, AGE_LABELS, BMI_BINS, BMI_LABELS
+    from src.preprocessing import CATEGORY_MAPS, DROP_COLUMNS
+except ImportError:  # run as `python src/incremental_training.py`
+    from feature_pipeline import AGE_BINS, AGE_LABELS, BMI_BINS, BMI_LABELS
+    from preprocessing import CATEGORY_MAPS, DROP_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = 'chronic_disease_model.pkl'
+PREPROCESSOR_FILE = 'preprocessor.pkl'
+REPORT_FILE = 'report.json'
+VERSIONS_DIR = 'versions'
+
+# Label columns the chronic model was fitted on (notebooks/model_training.ipynb), in estimator order
+CHRONIC_TARGETS = ('Diabetes_Risk', 'Hypertension', 'High_Cholesterol')
+
+
+def prepare_chronic_batch(raw):
+    """Raw extract rows -> (features frame, {target: int8 array}), as in the training notebook.
+
+    Missing numbers take the batch median and missing text the batch mode,
+    the notebook's imputation.
+    """
+    import pandas as pd
+
+    df = raw.drop(DROP_COLUMNS, axis=1, errors='ignore').copy()
+    for col in df.select_dtypes(include='number').columns:
+        df[col] = df[col].fillna(df[col].median())
+    for col in df.select_dtypes(include='object').columns:
+        mode = df[col].mode()
+        if len(mode):
+            df[col] = df[col].fillna(mode.iloc[0])
+
+    bp = df.pop('Blood Pressure') if 'Blood Pressure' in df.columns else pd.Series(np.nan, index=df.index)
+    parts = bp.astype(str).str.split('/', n=1, expand=True).reindex(columns=[0, 1])
+    df['Systolic_BP'] = pd.to_numeric(parts[0], errors='coerce')
+    df['Diastolic_BP'] = pd.to_numeric(parts[1], errors='coerce')
+
+    labels = {
+        'Diabetes_Risk': (df['Glucose'] > 126) | (df['HbA1c'] > 6.5),
+        'Hypertension': (df['Systolic_BP'] >= 140) | (df['Diastolic_BP'] >= 90),
+        'High_Cholesterol': df['Cholesterol'] > 240,
+    }
+    labels = {name: labels[name].to_numpy(np.int8) for name in CHRONIC_TARGETS}
+
+    df['BMI_Category'] = pd.cut(df['BMI'], bins=BMI_BINS, labels=BMI_LABELS)
+    df['Age_Group'] = pd.cut(df['Age'], bins=AGE_BINS, labels=AGE_LABELS)
+    for col in ('Smoking', 'Alcohol'):
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].map(lambda v: CATEGORY_MAPS[col].get(v, v))
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+    return df, labels
+
+
+def update_preprocessor(preprocessor, X):
+    """Return an updated copy of the fitted ColumnTransformer and what changed.
+
+    The scaler statistics are merged with ``partial_fit``. The one-hot
+    categories stay fixed: a new category would change the model's input
+    width, so it is only reported (the encoder ignores unknown values).
+    """
+    updated = copy.deepcopy(preprocessor)
+    scaler = updated.named_transformers_['num']
+    num_cols = _columns(updated, 'num')
+    seen_before = int(np.max(scaler.n_samples_seen_))
+    scaler.partial_fit(X[num_cols])
+
+    unseen = {}
+    if 'cat' in updated.named_transformers_:
+        enc = updated.named_transformers_['cat']
+        for col, cats in zip(_columns(updated, 'cat'), enc.categories_):
+            known = {str(c) for c in cats}
+            counts = X[col].dropna().astype(str).value_counts()
+            new = {cat: int(n) for cat, n in counts.items() if cat not in known}
+            if new:
+                unseen[col] = new
+    changes = {'samples_seen': [seen_before, int(np.max(scaler.n_samples_seen_))], 'unseen_categories': unseen}
+    return updated, changes
+
+
+def _columns(preprocessor, name):
+    for step, _, cols in preprocessor.transformers_:
+        if step == name:
+            return list(cols)
+    return []
+
+
+def _scaling(preprocessor):
+    scaler = preprocessor.named_transformers_['num']
+    return np.asarray(scaler.mean_, dtype=np.float64), np.asarray(scaler.scale_, dtype=np.float64)
+
+
+def remap_thresholds(booster, old_scaling, new_scaling):
+    """Copy of ``booster`` whose numeric splits are rescaled from one StandardScaler fit to another.
+
+    A split ``x < t`` on the old scaled value is the same split on the raw
+    value ``t * old_scale + old_mean``, so it becomes
+    ``(t * old_scale + old_mean - new_mean) / new_scale``. Features whose
+    scaling is undefined (e.g. an all-missing column) are left alone.
+    """
+    import xgboost as xgb
+
+    (old_mean, old_scale), (new_mean, new_scale) = old_scaling, new_scaling
+    slope = old_scale / new_scale
+    intercept = (old_mean - new_mean) / new_scale
+    valid = np.isfinite(slope) & np.isfinite(intercept)
+    n_num = len(slope)
+
+    model = json.loads(booster.save_raw('json'))
+    for tree in model['learner']['gradient_booster']['model']['trees']:
+        feature = np.asarray(tree['split_indices'], dtype=np.int64)
+        split = np.asarray(tree['left_children']) != -1  # leaves store their value in split_conditions
+        split &= feature < n_num
+        split[split] = valid[feature[split]]
+        if not split.any():
+            continue
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float64)
+        f = feature[split]
+        old = conditions[split].astype(np.float32)
+        new = (conditions[split] * slope[f] + intercept[f]).astype(np.float32)
+        # Hist thresholds sit on data values, which go right (x >= t): keep those ties on the right
+        # by lowering the threshold past the float32 rounding of both scalings.
+        margin = 2 * (np.abs(slope[f]) * np.spacing(np.abs(old)) + np.spacing(np.abs(new)))
+        conditions[split] = new - margin
+        tree['split_conditions'] = conditions.tolist()
+    remapped = xgb.Booster()
+    remapped.load_model(bytearray(json.dumps(model).encode()))
+    return remapped
+
+
+def _continue_params(estimator, nthread):
+    params = {k: v for k, v in estimator.get_xgb_params().items() if v is not None}
+    params.pop('n_jobs', None)
+    params.update(tree_method='hist', nthread=nthread)
+    return params
+
+
+def _metrics(y, p):
+    from sklearn.metrics import log_loss, roc_auc_score
+    return {'logloss': round(float(log_loss(y, p, labels=[0, 1])), 5),
+            'auc': round(float(roc_auc_score(y, p)), 5) if 0 < y.sum() < len(y) else None}
+
+
+def _compare(previous, updated, X, labels):
+    """{target: {'previous': metrics, 'updated': metrics}} on one evaluation frame."""
+    old_model, old_pre = previous
+    new_model, new_pre = updated
+    old_proba = old_model.predict_proba(old_pre.transform(X))
+    new_proba = new_model.predict_proba(new_pre.transform(X))
+    return {name: {'previous': _metrics(labels[name], old_proba[i][:, 1]),
+                   'updated': _metrics(labels[name], new_proba[i][:, 1])}
+            for i, name in enumerate(CHRONIC_TARGETS)}
+
+
+def incremental_update(base_dir, batch, rounds=50, holdout=0.2, seed=42, nthread=None, reference=None):
+    """Update the model in ``base_dir`` with the raw ``batch`` frame.
+
+    Returns ``(model, preprocessor, report)``; nothing is written.
+    ``reference`` is an optional raw frame (e.g. a sample of earlier data)
+    evaluated alongside the batch holdout to catch forgetting.
+    """
+    import joblib
+    import xgboost as xgb
+
+    start = time.perf_counter()
+    base_dir = Path(base_dir)
+    model = joblib.load(base_dir / MODEL_FILE)
+    preprocessor = joblib.load(base_dir / PREPROCESSOR_FILE)
+
+    X, labels = prepare_chronic_batch(batch)
+    X = X[list(preprocessor.feature_names_in_)]
+    order = np.random.default_rng(seed).permutation(len(X))
+    n_hold = int(round(len(X) * holdout))
+    hold_idx, train_idx = order[:n_hold], order[n_hold:]
+
+    new_pre, changes = update_preprocessor(preprocessor, X.iloc[train_idx])
+    old_scaling, new_scaling = _scaling(preprocessor), _scaling(new_pre)
+    X_train = new_pre.transform(X.iloc[train_idx]).astype(np.float32)
+    nthread = nthread or os.cpu_count() or 1
+
+    estimators = []
+    for i, name in enumerate(CHRONIC_TARGETS):
+        estimator = model.estimators_[i]
+        booster = remap_thresholds(estimator.get_booster(), old_scaling, new_scaling)
+        dtrain = xgb.DMatrix(X_train, label=labels[name][train_idx], missing=np.nan)
+        booster = xgb.train(_continue_params(estimator, nthread), dtrain, num_boost_round=rounds,
+                            xgb_model=booster)
+        updated = xgb.XGBClassifier()
+        updated.load_model(bytearray(booster.save_raw('ubj')))
+        estimators.append(updated)
+    new_model = copy.copy(model)
+    new_model.estimators_ = estimators
+    train_seconds = time.perf_counter() - start
+
+    evaluation = {}
+    if n_hold:
+        evaluation['batch_holdout'] = _compare((model, preprocessor), (new_model, new_pre), X.iloc[hold_idx],
+                                               {k: v[hold_idx] for k, v in labels.items()})
+    if reference is not None:
+        X_ref, ref_labels = prepare_chronic_batch(reference)
+        evaluation['reference'] = _compare((model, preprocessor), (new_model, new_pre),
+                                           X_ref[list(preprocessor.feature_names_in_)], ref_labels)
+
+    report = {
+        'base': str(base_dir),
+        'rows': {'train': len(train_idx), 'holdout': n_hold},
+        'rounds_added': rounds,
+        'trees_per_target': [e.get_booster().num_boosted_rounds() for e in estimators],
+        'preprocessor': changes,
+        'update_seconds': round(train_seconds, 3),
+        'evaluation': evaluation,
+    }
+    return new_model, new_pre, report
+
+
+def write_version(base_dir, model, preprocessor, report, version=None):
+    """Write the updated artifacts to ``<base_dir>/versions/<version>/`` and return that directory."""
+    import joblib
+
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    out_dir = Path(base_dir) / VERSIONS_DIR / version
+    tmp_dir = out_dir.with_name(out_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    joblib.dump(model, tmp_dir / MODEL_FILE)
+    joblib.dump(preprocessor, tmp_dir / PREPROCESSOR_FILE)
+    (tmp_dir / REPORT_FILE).write_text(json.dumps(dict(report, version=version), indent=2))
+    os.replace(tmp_dir, out_dir)
+    return out_dir
+
+
+def promote(version_dir, target_dir):
+    """Copy a version's model and preprocessor over ``target_dir``'s, one atomic replace each.
+
+    The preprocessor is replaced first, so that the registry's hot reload
+    never pairs a new model with an old preprocessor.
+    """
+    for name in (PREPROCESSOR_FILE, MODEL_FILE):
+        tmp = Path(target_dir) / f'.{name}.tmp'
+        shutil.copyfile(Path(version_dir) / name, tmp)
+        os.replace(tmp, Path(target_dir) / name)
+
+
+def main(argv=None):
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Update the chronic model from a batch of new rows.')
+    parser.add_argument('batch', help='CSV of new rows in the raw extract format')
+    parser.add_argument('--base', default='artifacts', help='directory with the current model (default: artifacts)')
+    parser.add_argument('--rounds', type=int, default=50, help='trees added per target (default: 50)')
+    parser.add_argument('--holdout', type=float, default=0.2, help='fraction of the batch kept for the report')
+    parser.add_argument('--reference', help='CSV of earlier rows to evaluate both versions on as well')
+    parser.add_argument('--nthread', type=int, help='XGBoost threads (default: all cores)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--promote', action='store_true', help='also replace the model in --base')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    reference = pd.read_csv(args.reference) if args.reference else None
+    model, preprocessor, report = incremental_update(args.base, pd.read_csv(args.batch), rounds=args.rounds,
+                                                     holdout=args.holdout, seed=args.seed,
+                                                     nthread=args.nthread, reference=reference)
+    out_dir = write_version(args.base, model, preprocessor, report)
+    print(json.dumps(report['evaluation'], indent=2))
+    print(f"Wrote {out_dir} in {report['update_seconds']}s")
+    if args.promote:
+        promote(out_dir, args.base)
+        print(f'Promoted {out_dir.name} to {args.base}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,379 @@
+# src/lean_model.py
+"""NumPy-only inference for the multi-output chronic model.
+
+    python src/lean_model.py export [--out artifacts/lean]
+
+``export`` turns ``chronic_disease_model.pkl`` + ``preprocessor.pkl`` into a
+directory the API can serve from without sklearn, xgboost or pandas:
+
+    meta.json          feature layout, category tables, file digests
+    arrays.npz         scaler mean/scale (float64)
+    booster_<i>.json   XGBoost JSON model of target i (``Booster.save_raw('json')``)
+    forest/<name>.npy  the boosters compiled into :class:`LeanForest` node arrays
+
+:class:`LeanForest` compiles the boosters' trees into flat node arrays and
+scores a whole input matrix with a few vectorised gathers per tree level.
+The compiled arrays are memory-mapped read-only when the export is loaded,
+so every worker process on a host shares one copy of them in the page cache.
+Exports without ``forest/`` are compiled from the booster JSON at load time.
+"""
+import argparse
+import hashlib
+import json
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from src.feature_pipeline import AlignmentPlan, preprocessor_spec
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from feature_pipeline import AlignmentPlan, preprocessor_spec
+
+FORMAT_VERSION = 1
+LEAN_DIR = 'lean'
+META_FILE = 'meta.json'
+ARRAYS_FILE = 'arrays.npz'
+FOREST_DIR = 'forest'
+
+_SUPPORTED_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+
+
+def _sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def _parse_base_score(value):
+    # '5E-1' in older models, '[4.1608334E-1]' (one per target) since XGBoost 3
+    value = value.strip()
+    if value.startswith('['):
+        values = [float(v) for v in value.strip('[]').split(',') if v.strip()]
+        if len(values) != 1:
+            raise ValueError(f'expected one base_score per booster, got {value}')
+        return values[0]
+    return float(value)
+
+
+class LeanForest:
+    """Flat-array form of one or more binary:logistic XGBoost boosters.
+
+    Every node of every tree lives in shared arrays (split feature, float32
+    threshold, children, missing-value direction, leaf value). Leaves point to
+    themselves, so walking ``depth`` levels from the roots lands every row on a
+    leaf of every tree at once. :meth:`predict_proba` mimics
+    ``MultiOutputClassifier.predict_proba``: a list with one (n, 2) array per booster.
+    """
+
+    # Rows walked together; larger blocks fall out of cache (rows x trees index arrays)
+    block_rows = 64
+
+    # Node arrays saved by :meth:`save`; depth and n_features go to meta.json
+    ARRAYS = ('feature', 'threshold', 'children', 'default_left', 'value', 'roots', 'tree_target',
+              'base_margin')
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots,
+                 tree_target, base_margin, depth, n_features, children=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.tree_target = tree_target
+        self.base_margin = base_margin
+        self.depth = depth
+        self.n_features = n_features
+        # children[2 * node + go_right] is the next node
+        self.children = np.stack([left, right], axis=1).ravel() if children is None else children
+        # reduceat boundaries: trees are stored target by target
+        self._target_starts = np.searchsorted(tree_target, np.arange(len(base_margin)))
+
+    @classmethod
+    def from_boosters(cls, models):
+        """Compile parsed XGBoost JSON models (``json.loads(booster.save_raw('json'))``), one per target."""
+        feature, threshold, left, right, default_left, value = [], [], [], [], [], []
+        roots, tree_target, base_margin = [], [], []
+        n_nodes = depth = 0
+        n_features = None
+        for target, model in enumerate(models):
+            learner = model['learner']
+            objective = learner['objective']['name']
+            if objective not in _SUPPORTED_OBJECTIVES:
+                raise ValueError(f'unsupported objective {objective!r} (expected one of {_SUPPORTED_OBJECTIVES})')
+            params = learner['learner_model_param']
+            n_features = int(params['num_feature'])
+            base_score = _parse_base_score(params['base_score'])
+            base_margin.append(math.log(base_score / (1.0 - base_score)))
+            booster = learner['gradient_booster']
+            if booster.get('name') != 'gbtree':
+                raise ValueError(f"unsupported booster {booster.get('name')!r}")
+            for tree in booster['model']['trees']:
+                if any(tree.get('split_type', ())) or int(tree['tree_param'].get('size_leaf_vector', 1)) > 1:
+                    raise ValueError('categorical splits and vector leaves are not supported')
+                lc = np.asarray(tree['left_children'], dtype=np.int64)
+                rc = np.asarray(tree['right_children'], dtype=np.int64)
+                leaf = lc == -1
+                ids = np.arange(len(lc)) + n_nodes
+                left.append(np.where(leaf, ids, lc + n_nodes))
+                right.append(np.where(leaf, ids, rc + n_nodes))
+                feature.append(np.where(leaf, 0, tree['split_indices']))
+                cond = np.asarray(tree['split_conditions'], dtype=np.float32)
+                threshold.append(np.where(leaf, np.float32(0), cond))
+                value.append(np.where(leaf, cond, np.float32(0)))
+                default_left.append(np.asarray(tree['default_left'], dtype=bool))
+                roots.append(n_nodes)
+                tree_target.append(target)
+                depth = max(depth, _tree_depth(lc, rc))
+                n_nodes += len(lc)
+        if not roots:
+            raise ValueError('no trees to compile')
+        return cls(
+            feature=np.concatenate(feature).astype(np.intp),
+            threshold=np.concatenate(threshold).astype(np.float32),
+            left=np.concatenate(left).astype(np.intp),
+            right=np.concatenate(right).astype(np.intp),
+            default_left=np.concatenate(default_left),
+            value=np.concatenate(value).astype(np.float32),
+            roots=np.asarray(roots, dtype=np.intp),
+            tree_target=np.asarray(tree_target, dtype=np.intp),
+            base_margin=np.asarray(base_margin, dtype=np.float64),
+            depth=depth,
+            n_features=n_features,
+        )
+
+    def save(self, directory):
+        """Write the node arrays as ``<name>.npy`` files; returns the meta.json entry describing them.
+
+        Each file is written under a temporary name and renamed into place, so
+        processes that still map the previous export keep their (unlinked) pages.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            tmp = directory / f'{name}.tmp.npy'
+            np.save(tmp, np.ascontiguousarray(getattr(self, name)))
+            tmp.replace(directory / f'{name}.npy')
+        return {'depth': self.depth, 'n_features': self.n_features,
+                'arrays': [f'{name}.npy' for name in self.ARRAYS]}
+
+    @classmethod
+    def load(cls, directory, spec, mmap=True):
+        """Load arrays written by :meth:`save`; with ``mmap`` they are mapped read-only instead of copied."""
+        directory = Path(directory)
+        mode = 'r' if mmap else None
+        # np.asarray drops the np.memmap subclass (whose indexing is slower) but keeps the mapping
+        arrays = {name: np.asarray(np.load(directory / f'{name}.npy', mmap_mode=mode)) for name in cls.ARRAYS}
+        return cls(left=None, right=None, depth=spec['depth'], n_features=spec['n_features'], **arrays)
+
+    def split_thresholds(self, target=None):
+        """Sorted distinct split thresholds of every input column (empty for columns no tree splits on).
+
+        With ``target``, only the trees of that target count.
+        """
+        nodes = np.arange(len(self.feature))
+        internal = self.children[0::2] != nodes
+        if target is not None:
+            # trees are stored target by target and the nodes of a tree are contiguous
+            first, end = self._target_starts[target], (self._target_starts[target + 1]
+                                                       if target + 1 < len(self._target_starts) else len(self.roots))
+            internal &= (nodes >= self.roots[first]) & (nodes < (self.roots[end] if end < len(self.roots)
+                                                                  else len(nodes)))
+        return [np.unique(self.threshold[internal & (self.feature == j)]) for j in range(self.n_features)]
+
+    def margin_bounds(self, target, lower, upper, missing, block_boxes=4096):
+        """Lowest and highest margin of ``target`` over each box of inputs ``lower <= x < upper``.
+
+        ``lower``/``upper`` are (n_boxes, n_features) and may be infinite;
+        columns flagged in ``missing`` may also be NaN. Every leaf a box can
+        reach counts, so the true margin of any row in the box lies within the
+        bounds (they are loose where trees interact, never too tight).
+        """
+        lower, upper = np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64)
+        missing = np.asarray(missing, dtype=bool)
+        first = self._target_starts[target]
+        end = self._target_starts[target + 1] if target + 1 < len(self._target_starts) else len(self.roots)
+        lo = np.full(len(lower), self.base_margin[target])
+        hi = lo.copy()
+        for start in range(0, len(lower), block_boxes):
+            block_lower, block_upper = lower[start:start + block_boxes], upper[start:start + block_boxes]
+            n = len(block_lower)
+            for root in self.roots[first:end]:
+                tree_lo, tree_hi = np.full(n, np.inf), np.full(n, -np.inf)
+                box, node = np.arange(n), np.full(n, root)
+                while len(node):
+                    leaf = self.children[2 * node] == node
+                    if leaf.any():
+                        np.minimum.at(tree_lo, box[leaf], self.value[node[leaf]])
+                        np.maximum.at(tree_hi, box[leaf], self.value[node[leaf]])
+                        box, node = box[~leaf], node[~leaf]
+                    feature, threshold = self.feature[node], self.threshold[node]
+                    nan_left = missing[feature] & self.default_left[node]
+                    nan_right = missing[feature] & ~self.default_left[node]
+                    go_left = (block_lower[box, feature] < threshold) | nan_left
+                    go_right = (block_upper[box, feature] > threshold) | nan_right
+                    box = np.concatenate([box[go_left], box[go_right]])
+                    node = np.concatenate([self.children[2 * node[go_left]], self.children[2 * node[go_right] + 1]])
+                lo[start:start + n] += tree_lo
+                hi[start:start + n] += tree_hi
+        return lo, hi
+
+    def margins(self, X):
+        """Return the (n, n_targets) raw margins for the float32 matrix ``X``."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f'expected input of shape (n, {self.n_features}), got {X.shape}')
+        margins = np.empty((X.shape[0], len(self.base_margin)), dtype=np.float64)
+        for start in range(0, X.shape[0], self.block_rows):
+            margins[start:start + self.block_rows] = self._leaf_sums(X[start:start + self.block_rows])
+        return margins + self.base_margin
+
+    def _leaf_sums(self, X):
+        flat = X.ravel()
+        row_base = (np.arange(X.shape[0], dtype=np.intp) * self.n_features)[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.depth):
+            x = flat[row_base + self.feature[node]]
+            go_right = np.where(np.isnan(x), ~self.default_left[node], x >= self.threshold[node])
+            node = self.children[2 * node + go_right]
+        return np.add.reduceat(self.value[node].astype(np.float64), self._target_starts, axis=1)
+
+    def predict_proba(self, X):
+        p = 1.0 / (1.0 + np.exp(-self.margins(X)))
+        return [np.column_stack([1.0 - p[:, t], p[:, t]]).astype(np.float32) for t in range(p.shape[1])]
+
+
+def _tree_depth(left, right):
+    depth, level = 0, [0]
+    while level:
+        nxt = [c for i in level if left[i] != -1 for c in (left[i], right[i])]
+        if nxt:
+            depth += 1
+        level = nxt
+    return depth
+
+
+class LeanModel:
+    """A loaded lean export: the alignment plan plus the compiled forest."""
+
+    def __init__(self, meta, plan, forest):
+        self.meta = meta
+        self.plan = plan
+        self.forest = forest
+
+    @property
+    def source_digests(self):
+        return self.meta.get('source_digests', {})
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        directory = Path(directory)
+        meta = json.loads((directory / META_FILE).read_text())
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"unsupported lean export format {meta.get('format_version')!r}")
+        for name, digest in meta['files'].items():
+            if _sha256(directory / name) != digest:
+                raise ValueError(f'{directory / name} does not match the digest recorded in {META_FILE}')
+        with np.load(directory / ARRAYS_FILE) as arrays:
+            spec = dict(meta['preprocessor'], num_offset=arrays['num_offset'], num_scale=arrays['num_scale'])
+        if 'forest' in meta:
+            forest = LeanForest.load(directory / FOREST_DIR, meta['forest'], mmap=mmap)
+        else:
+            models = [json.loads((directory / name).read_text()) for name in meta['boosters']]
+            forest = LeanForest.from_boosters(models)
+        plan = AlignmentPlan.from_spec(spec)
+        if plan.n_features != forest.n_features:
+            raise ValueError(f'preprocessor produces {plan.n_features} features, model expects {forest.n_features}')
+        return cls(meta, plan, forest)
+
+
+def _boosters(model):
+    """The XGBoost booster of every target of a MultiOutputClassifier (or a single XGBClassifier)."""
+    for estimator in getattr(model, 'estimators_', [model]):
+        booster = estimator.get_booster()
+        # predict_proba stops at best_iteration when the model was trained with early stopping
+        best = getattr(estimator, 'best_iteration', None)
+        yield booster[:best + 1] if best is not None else booster
+
+
+def compile_forest(model):
+    """The :class:`LeanForest` of a fitted model; a LeanForest is returned as it is."""
+    if isinstance(model, LeanForest):
+        return model
+    return LeanForest.from_boosters([json.loads(b.save_raw('json')) for b in _boosters(model)])
+
+
+def export_lean_model(chronic_model_path, preprocessor_path, out_dir):
+    """Write the lean form of a MultiOutputClassifier of XGBClassifiers + its ColumnTransformer.
+
+    Returns the path of the written ``meta.json``.
+    """
+    import joblib
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model = joblib.load(chronic_model_path)
+    preprocessor = joblib.load(preprocessor_path)
+    spec = preprocessor_spec(preprocessor)
+
+    files, boosters, models = {}, [], []
+    for i, booster in enumerate(_boosters(model)):
+        name = f'booster_{i}.json'
+        raw = booster.save_raw('json')
+        (out_dir / name).write_bytes(raw)
+        boosters.append(name)
+        models.append(json.loads(raw))
+        files[name] = _sha256(out_dir / name)
+
+    np.savez(out_dir / ARRAYS_FILE,
+             num_offset=np.asarray(spec.pop('num_offset'), dtype=np.float64),
+             num_scale=np.asarray(spec.pop('num_scale'), dtype=np.float64))
+    files[ARRAYS_FILE] = _sha256(out_dir / ARRAYS_FILE)
+
+    forest = LeanForest.from_boosters(models).save(out_dir / FOREST_DIR)
+    for name in forest['arrays']:
+        files[f'{FOREST_DIR}/{name}'] = _sha256(out_dir / FOREST_DIR / name)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'preprocessor': spec,
+        'boosters': boosters,
+        'forest': forest,
+        'files': files,
+        # The registry only prefers this export while these still match the pickles next to it
+        'source_digests': {'chronic_model': _sha256(chronic_model_path),
+                           'preprocessor': _sha256(preprocessor_path)},
+    }
+    # meta.json goes last: it is what the registry watches for changes
+    meta_path = out_dir / META_FILE
+    tmp = meta_path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(meta, indent=2))
+    tmp.replace(meta_path)
+    return meta_path
+
+
+def main(argv=None):
+    try:
+        from src.model_registry import CHRONIC_MODEL_FILE, DEFAULT_SEARCH_DIRS, PREPROCESSOR_FILE, _locate_file
+    except ImportError:
+        from model_registry import CHRONIC_MODEL_FILE, DEFAULT_SEARCH_DIRS, PREPROCESSOR_FILE, _locate_file
+
+    parser = argparse.ArgumentParser(description='Export the chronic model to the NumPy-only lean format.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='write meta.json, arrays.npz, booster JSON and forest/ files')
+    export.add_argument('--model', help=f'path to {CHRONIC_MODEL_FILE} (default: searched like the API does)')
+    export.add_argument('--preprocessor', help=f'path to {PREPROCESSOR_FILE} (default: searched like the API does)')
+    export.add_argument('--out', help='output directory (default: lean/ next to the model)')
+    args = parser.parse_args(argv)
+
+    model_path = Path(args.model) if args.model else _locate_file(CHRONIC_MODEL_FILE, DEFAULT_SEARCH_DIRS)
+    preprocessor_path = (Path(args.preprocessor) if args.preprocessor
+                         else _locate_file(PREPROCESSOR_FILE, DEFAULT_SEARCH_DIRS))
+    out_dir = Path(args.out) if args.out else model_path.parent / LEAN_DIR
+    print(f'Wrote {export_lean_model(model_path, preprocessor_path, out_dir)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
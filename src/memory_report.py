@@ -0,0 +1,116 @@
+# src/memory_report.py
+"""Unique vs shared memory of the serving processes (Linux ``/proc``).
+
+    python src/memory_report.py <gunicorn master pid> [--json]
+
+For the master and every worker this reports, in MiB:
+
+    rss      resident set size (what ``ps``/``top`` show; counts shared pages in full)
+    private  pages only this process maps: what each extra worker really costs
+    shared   pages also mapped by another process (preloaded model, mmap'd arrays, libraries)
+    pss      proportional set size: private + shared / number of sharers
+
+Summing ``pss`` over all processes gives the real footprint of the server.
+With ``GUNICORN_PRELOAD=1`` the model is loaded before the workers fork, so
+it moves from each worker's ``private`` into ``shared``.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+PROC = Path('/proc')
+_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def _read_smaps(pid):
+    """Sum the smaps fields (kB) of ``pid``; smaps_rollup where available (Linux 4.14+)."""
+    totals = dict.fromkeys(_FIELDS, 0)
+    rollup = PROC / str(pid) / 'smaps_rollup'
+    path = rollup if rollup.exists() else PROC / str(pid) / 'smaps'
+    with open(path) as fh:
+        for line in fh:
+            key, _, rest = line.partition(':')
+            if key in totals:
+                totals[key] += int(rest.split()[0])
+    return totals
+
+
+def process_memory(pid=None):
+    """Return ``{'pid', 'rss_mb', 'private_mb', 'shared_mb', 'pss_mb'}`` for one process, or None off Linux."""
+    pid = pid or os.getpid()
+    try:
+        kb = _read_smaps(pid)
+    except OSError:
+        return None
+    mb = lambda value: round(value / 1024, 1)
+    return {
+        'pid': pid,
+        'rss_mb': mb(kb['Rss']),
+        'private_mb': mb(kb['Private_Clean'] + kb['Private_Dirty']),
+        'shared_mb': mb(kb['Shared_Clean'] + kb['Shared_Dirty']),
+        'pss_mb': mb(kb['Pss']),
+    }
+
+
+def child_pids(pid):
+    """Direct children of ``pid`` (the workers of a gunicorn master)."""
+    children = []
+    for entry in PROC.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / 'stat').read_text()
+        except OSError:
+            continue  # exited while scanning
+        # the command name (field 2) may contain spaces; the parent pid follows the state after ')'
+        if int(stat.rpartition(')')[2].split()[1]) == pid:
+            children.append(int(entry.name))
+    return sorted(children)
+
+
+def memory_report(master_pid):
+    """Memory of a gunicorn master and its workers, plus per-worker averages and the server total."""
+    master = process_memory(master_pid)
+    if master is None:
+        raise ProcessLookupError(f'cannot read /proc/{master_pid}/smaps')
+    workers = [m for m in map(process_memory, child_pids(master_pid)) if m is not None]
+    n = len(workers) or 1
+    return {
+        'master': master,
+        'workers': workers,
+        'worker_avg_private_mb': round(sum(w['private_mb'] for w in workers) / n, 1),
+        'worker_avg_shared_mb': round(sum(w['shared_mb'] for w in workers) / n, 1),
+        'total_pss_mb': round(master['pss_mb'] + sum(w['pss_mb'] for w in workers), 1),
+    }
+
+
+def format_report(report):
+    rows = [('master', report['master'])] + [('worker', w) for w in report['workers']]
+    lines = [f"{'role':<8}{'pid':>8}{'rss':>10}{'private':>10}{'shared':>10}{'pss':>10}   (MiB)"]
+    for role, m in rows:
+        lines.append(f"{role:<8}{m['pid']:>8}{m['rss_mb']:>10}{m['private_mb']:>10}{m['shared_mb']:>10}"
+                     f"{m['pss_mb']:>10}")
+    lines.append(f"{len(report['workers'])} workers: {report['worker_avg_private_mb']} MiB private + "
+                 f"{report['worker_avg_shared_mb']} MiB shared each; server total (PSS) "
+                 f"{report['total_pss_mb']} MiB")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report unique vs shared memory of a gunicorn master and its workers.')
+    parser.add_argument('pid', type=int, help='pid of the gunicorn master (e.g. from `pgrep -o gunicorn`)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+    try:
+        report = memory_report(args.pid)
+    except ProcessLookupError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
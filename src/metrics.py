@@ -0,0 +1,191 @@
+# src/metrics.py
+"""Request, stage and model metrics, rendered in the Prometheus text format.
+
+The metrics are kept in memory, per process: every gunicorn worker serves
+its own ``/metrics``. Recording a sample is one ``perf_counter`` delta
+plus a bucket increment under a lock. ``METRICS_ENABLED=0`` turns
+recording off.
+
+Request stages (label ``stage``):
+
+    parse            JSON body to the model input (validation and, for plan backends, the model row)
+    align            input dicts to the model matrix (column mapping, scaling, one-hot)
+    grid             precomputed risk grid lookup
+    cache            prediction cache lookup
+    predict          ``predict_proba`` of every target (queueing included when coalescing)
+    recommendations  ``get_recommendations``
+    explain          SHAP contributions
+    serialize        ``jsonify`` of the response
+"""
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no', 'off')
+# Fraction of requests whose inputs/outputs are logged at INFO (DEBUG logging traces all of them)
+TRACE_SAMPLE_RATE = float(os.environ.get('PREDICT_TRACE_SAMPLE', '0') or 0)
+
+# Seconds; from 100µs (lean single-row scoring) to 10s (large batches)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._sample_lines(labels, value))
+        return lines
+
+    def _sample_lines(self, labels, value):
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels):
+        return self._values.get(labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of durations in seconds."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, seconds, *labels):
+        if not ENABLED:
+            return
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket (non-cumulative) counts + one overflow slot, sum
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += seconds
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def _sample_lines(self, labels, state):
+        counts, total = state
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            le = 'le="{}"'.format(_format_value(bound))
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, (le,))} {cumulative}')
+        suffix = _format_labels(self.labelnames, labels)
+        lines.append(f'{self.name}_sum{suffix} {_format_value(total)}')
+        lines.append(f'{self.name}_count{suffix} {cumulative}')
+        return lines
+
+
+REQUESTS = Counter('health_http_requests_total', 'HTTP requests by route, method and status.',
+                   ('route', 'method', 'status'))
+REQUEST_SECONDS = Histogram('health_http_request_duration_seconds', 'HTTP request latency by route.', ('route',))
+STAGE_SECONDS = Histogram('health_stage_duration_seconds', 'Time spent per request stage and model backend.',
+                          ('stage', 'backend'))
+PREDICTIONS = Counter('health_predictions_total', 'Records scored, by model backend and entry point.',
+                      ('backend', 'path'))
+PREDICTION_ERRORS = Counter('health_prediction_errors_total', 'Records that could not be scored.', ('backend',))
+CACHE_LOOKUPS = Counter('health_prediction_cache_lookups_total', 'Prediction cache lookups by result.',
+                        ('result',))
+GRID_LOOKUPS = Counter('health_risk_grid_lookups_total', 'Precomputed risk grid lookups by result.',
+                       ('result',))
+AUDIT_EVENTS = Counter('health_audit_events_total', 'Audit log events by outcome (written, dropped, failed).',
+                       ('result',))
+MODEL_LOADS = Counter('health_model_loads_total', 'Model artifact loads (startup and hot reloads) by backend.',
+                      ('backend',))
+MODEL_VERSION = Gauge('health_model_version', 'Version number of the loaded model artifacts.', ('backend',))
+
+ALL_METRICS = (REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, PREDICTIONS, PREDICTION_ERRORS, CACHE_LOOKUPS,
+               GRID_LOOKUPS, AUDIT_EVENTS, MODEL_LOADS, MODEL_VERSION)
+
+
+def observe_stage(stage, backend, started):
+    """Record the time since ``started`` (a ``time.perf_counter()`` value); returns the current time."""
+    now = time.perf_counter()
+    STAGE_SECONDS.observe(now - started, stage, backend)
+    return now
+
+
+def record_model_load(artifacts):
+    MODEL_LOADS.inc(artifacts.backend)
+    MODEL_VERSION.clear()  # one series: the snapshot being served
+    MODEL_VERSION.set(artifacts.version, artifacts.backend)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in ALL_METRICS:
+        metric.clear()
+
+
+def should_trace(log):
+    """Whether to log this request's inputs/outputs: always at DEBUG, else a TRACE_SAMPLE_RATE sample."""
+    return log.isEnabledFor(logging.DEBUG) or (TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE)
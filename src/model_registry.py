@@ -0,0 +1,302 @@
+# src/model_registry.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+try:
+    from src.feature_pipeline import AlignmentPlan
+    from src.lean_model import LEAN_DIR, META_FILE as LEAN_META_FILE, LeanModel
+    from src.metrics import record_model_load
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from feature_pipeline import AlignmentPlan
+    from lean_model import LEAN_DIR, META_FILE as LEAN_META_FILE, LeanModel
+    from metrics import record_model_load
+
+logger = logging.getLogger('app')
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_SEARCH_DIRS = (REPO_ROOT / 'models', REPO_ROOT / 'artifacts', REPO_ROOT)
+
+# Separate scaler + one classifier per disease (written by src/model_training.py)
+BACKEND_PER_DISEASE = 'per_disease'
+# Single MultiOutputClassifier + ColumnTransformer (written by notebooks/model_training.ipynb)
+BACKEND_MULTI_OUTPUT = 'multi_output'
+# NumPy-only export of the multi-output model (written by `python src/lean_model.py export`)
+BACKEND_LEAN = 'lean'
+BACKENDS = (BACKEND_PER_DISEASE, BACKEND_MULTI_OUTPUT, BACKEND_LEAN)
+
+PER_DISEASE_FILES = {
+    'diabetes': 'diabetes_model.pkl',
+    'heart_disease': 'heart_disease_model.pkl',
+    'stroke': 'stroke_model.pkl',
+}
+SCALER_FILE = 'scaler.pkl'
+CHRONIC_MODEL_FILE = 'chronic_disease_model.pkl'
+PREPROCESSOR_FILE = 'preprocessor.pkl'
+LEAN_META = f'{LEAN_DIR}/{LEAN_META_FILE}'
+
+
+def _locate_file(filename: str, search_dirs: Iterable[Path]):
+    """Search for filename in provided directories and return first matching Path.
+
+    Raises FileNotFoundError with a helpful message if not found.
+    """
+    for d in search_dirs:
+        p = d / filename
+        if p.exists():
+            return p
+    searched = ', '.join(str(d) for d in search_dirs)
+    raise FileNotFoundError(f"Could not find '{filename}' in: {searched}")
+
+
+def _unpickle(path: Path):
+    # joblib (and, through the pickles, sklearn/xgboost) is only imported when a
+    # pickled backend is actually loaded; the lean backend never needs it.
+    import joblib
+    return joblib.load(path)
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class LoadedArtifacts:
+    """Immutable snapshot of everything ``predict_risk`` needs for one model version.
+
+    A new snapshot is built on every (re)load and swapped in as a whole, so a
+    request that grabbed a snapshot keeps a consistent set of objects even if a
+    reload happens mid-request.
+    """
+
+    def __init__(self, backend, paths, digests, version, scaler=None, models=None,
+                 chronic_model=None, preprocessor=None, plan=None):
+        self.backend = backend
+        self.paths = paths
+        self.digests = digests
+        self.version = version
+        # Identifies the artifact *content*: equal fingerprints score identically
+        self.fingerprint = hashlib.sha256(
+            ''.join(f'{k}={v};' for k, v in sorted(digests.items())).encode()).digest()[:16]
+        self.scaler = scaler
+        self.models = models or {}
+        self.chronic_model = chronic_model
+        self.preprocessor = preprocessor
+        # Compiled request -> model input mapping (multi-output backend with a preprocessor, lean backend)
+        self.plan = plan
+        self.loaded_at = time.time()
+
+    def describe(self):
+        return {
+            'backend': self.backend,
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'files': {name: str(p) for name, p in self.paths.items()},
+        }
+
+
+class ModelRegistry:
+    """Resolves and loads the prediction artifacts once per process.
+
+    ``get()`` is cheap and thread-safe: it returns the current
+    :class:`LoadedArtifacts` snapshot, loading it on first use. When
+    ``reload_interval`` is positive, ``get()`` also checks (at most once per
+    interval) whether the artifact files changed on disk and, if their content
+    hash differs, loads the new files and swaps the snapshot atomically. A
+    failed reload keeps serving the previous snapshot.
+
+    ``backend`` pins one of :data:`BACKENDS`; by default per-disease models win,
+    then an up-to-date lean export, then the pickled multi-output model.
+    """
+
+    def __init__(self, search_dirs: Optional[Iterable[Path]] = None, reload_interval: float = 0.0,
+                 backend: Optional[str] = None):
+        if backend not in (None,) + BACKENDS:
+            raise ValueError(f'unknown backend {backend!r} (expected one of {BACKENDS})')
+        self.search_dirs = [Path(d) for d in (search_dirs or DEFAULT_SEARCH_DIRS)]
+        self.reload_interval = reload_interval
+        self.requested_backend = backend
+        self._current = None
+        self._signature = None
+        self._last_check = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    @property
+    def backend(self):
+        return self.get().backend
+
+    def get(self) -> LoadedArtifacts:
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    self._load_locked()
+                return self._current
+        if self.reload_interval > 0 and time.monotonic() - self._last_check >= self.reload_interval:
+            self.maybe_reload()
+        return self._current
+
+    def add_reload_listener(self, callback):
+        """Call ``callback(new_artifacts)`` every time a new snapshot is swapped in by a reload."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def maybe_reload(self) -> bool:
+        """Reload if the artifact files changed. Returns True when a new snapshot was swapped in."""
+        # Only one thread checks/reloads; everybody else keeps using the current snapshot.
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_check = time.monotonic()
+            if self._current is None:
+                self._load_locked()
+                return True
+            try:
+                paths = self._resolve()
+            except FileNotFoundError:
+                logger.warning('Model artifacts disappeared; keeping version %s', self._current.version)
+                return False
+            signature = self._stat_signature(paths)
+            if signature == self._signature:
+                return False
+            # mtime/size changed: only reload when the content actually differs
+            # (a `touch` or a re-copy of identical files is not a new model).
+            digests = {name: _file_digest(p) for name, p in paths.items()}
+            if paths == self._current.paths and digests == self._current.digests:
+                self._signature = signature
+                return False
+            try:
+                self._load_locked(paths, digests, signature)
+            except Exception:
+                logger.exception('Model reload failed; keeping version %s', self._current.version)
+                return False
+            return True
+        finally:
+            self._lock.release()
+
+    def reload(self) -> LoadedArtifacts:
+        """Unconditionally reload the artifacts from disk."""
+        with self._lock:
+            self._load_locked()
+            return self._current
+
+    def _resolve(self):
+        """Return {role: Path} for the backend that is currently available on disk."""
+        requested = self.requested_backend
+        if requested in (None, BACKEND_PER_DISEASE):
+            try:
+                paths = {'scaler': _locate_file(SCALER_FILE, self.search_dirs)}
+                for name, fname in PER_DISEASE_FILES.items():
+                    paths[name] = _locate_file(fname, self.search_dirs)
+                return paths
+            except FileNotFoundError:
+                if requested == BACKEND_PER_DISEASE:
+                    raise
+        paths = {}
+        roles = [('chronic_model', CHRONIC_MODEL_FILE), ('preprocessor', PREPROCESSOR_FILE)]
+        if requested in (None, BACKEND_LEAN):
+            roles.append(('lean', LEAN_META))
+        for role, fname in roles:
+            try:
+                paths[role] = _locate_file(fname, self.search_dirs)
+            except FileNotFoundError:
+                if requested == BACKEND_LEAN and role == 'lean':
+                    raise
+        if 'chronic_model' not in paths and 'lean' not in paths:
+            raise FileNotFoundError(
+                "No scaler/models found and no chronic multi-output model available. "
+                "Searched locations: {}".format(', '.join(str(p) for p in self.search_dirs)))
+        return paths
+
+    def _load_lean(self, paths, digests):
+        """Load the lean export, or return None to fall back to the pickles next to it."""
+        fallback = self.requested_backend is None and 'chronic_model' in paths
+        try:
+            lean = LeanModel.load(paths['lean'].parent)
+        except Exception:
+            if not fallback:
+                raise
+            logger.exception('Could not load lean export %s; using %s', paths['lean'].parent, CHRONIC_MODEL_FILE)
+            return None
+        # An export of an older model must not shadow the retrained pickles
+        stale = sorted(role for role, digest in lean.source_digests.items()
+                       if role in digests and digests[role] != digest)
+        if stale:
+            message = f"lean export {paths['lean'].parent} is out of date with {', '.join(stale)}"
+            if not fallback:
+                raise ValueError(message)
+            logger.warning('%s; using %s (re-run `python src/lean_model.py export`)', message, CHRONIC_MODEL_FILE)
+            return None
+        return lean
+
+    @staticmethod
+    def _stat_signature(paths):
+        sig = []
+        for name, p in sorted(paths.items()):
+            st = os.stat(p)
+            sig.append((name, str(p), st.st_mtime_ns, st.st_size))
+        return tuple(sig)
+
+    def _load_locked(self, paths=None, digests=None, signature=None):
+        paths = paths or self._resolve()
+        signature = signature or self._stat_signature(paths)
+        digests = digests or {name: _file_digest(p) for name, p in paths.items()}
+        version = self._version + 1
+        if 'scaler' in paths:
+            models = {name: _unpickle(paths[name]) for name in PER_DISEASE_FILES}
+            artifacts = LoadedArtifacts(BACKEND_PER_DISEASE, paths, digests, version,
+                                        scaler=_unpickle(paths['scaler']), models=models)
+        else:
+            lean = self._load_lean(paths, digests) if 'lean' in paths else None
+            if lean is not None:
+                artifacts = LoadedArtifacts(BACKEND_LEAN, paths, digests, version,
+                                            chronic_model=lean.forest, plan=lean.plan)
+            else:
+                preprocessor = _unpickle(paths['preprocessor']) if 'preprocessor' in paths else None
+                plan = AlignmentPlan.from_preprocessor(preprocessor) if preprocessor is not None else None
+                artifacts = LoadedArtifacts(BACKEND_MULTI_OUTPUT, paths, digests, version,
+                                            chronic_model=_unpickle(paths['chronic_model']),
+                                            preprocessor=preprocessor, plan=plan)
+        # Swap only once everything loaded successfully
+        previous = self._current
+        self._version = version
+        self._signature = signature
+        self._current = artifacts
+        logger.info('Loaded model artifacts v%s (%s backend)', version, artifacts.backend)
+        record_model_load(artifacts)
+        if previous is not None:
+            for callback in self._listeners:
+                try:
+                    callback(artifacts)
+                except Exception:
+                    logger.exception('Model reload listener %r failed', callback)
+        return artifacts
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """Return the process-wide registry, configured from the environment.
+
+    ``MODEL_RELOAD_INTERVAL`` (seconds, default 0 = disabled) turns on hot-reload
+    and ``MODEL_BACKEND`` (``per_disease``, ``multi_output`` or ``lean``) pins a backend.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                interval = float(os.environ.get('MODEL_RELOAD_INTERVAL', '0') or 0)
+                backend = os.environ.get('MODEL_BACKEND', '').strip() or None
+                _registry = ModelRegistry(reload_interval=interval, backend=backend)
+    return _registry
@@ -1,53 +1,182 @@
 # src/model_training.py
-import pandas as pd
-import xgboost as xgb
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-import joblib
+"""Train the per-disease models served by the ``per_disease`` backend.
+
+    python src/model_training.py --data Data/dirty_v3_path.csv --models-dir models
+
+The cleaned extract (see ``src/preprocessing.py``) is scaled once into a
+float32 feature matrix, and its XGBoost quantile sketch is computed once and
+shared by the three targets. The targets then train concurrently, each with
+its own thread budget and early stopping on a held-out validation split.
+Metrics are computed on a separate test split. Writes ``scaler.pkl``,
+``<target>_model.pkl`` and ``training_report.json``.
+"""
+import argparse
+import json
+import logging
 import os
-from preprocessing import load_and_clean_data, create_features
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    from src.feature_pipeline import INPUT_COLUMNS
+    from src.preprocessing import build_clean_cache, load_clean_cache
+except ImportError:  # run as `python src/model_training.py`
+    from feature_pipeline import INPUT_COLUMNS
+    from preprocessing import build_clean_cache, load_clean_cache
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = 'Data/dirty_v3_path.csv'
+MODELS_DIR = 'models'
+REPORT_FILE = 'training_report.json'
+
+# The per-disease prediction path feeds the scaler the request in INPUT_COLUMNS order
+FEATURE_COLUMNS = list(INPUT_COLUMNS)
+
+DEFAULT_PARAMS = {
+    'objective': 'binary:logistic',
+    'eval_metric': 'logloss',
+    'tree_method': 'hist',
+    'max_depth': 5,
+    'eta': 0.1,
+    'max_bin': 256,
+}
+
+
+def define_targets(df):
+    """Rule-based screening labels: {target: int8 array}."""
+    return {
+        'diabetes': ((df['Glucose'] > 126) | (df['HbA1c'] > 6.5)).to_numpy(np.int8),
+        'heart_disease': ((df['Systolic'] >= 140) | (df['Cholesterol'] > 240)
+                          | (df['Smoking'] == 1)).to_numpy(np.int8),
+        'stroke': ((df['Systolic'] >= 160) | (df['Age'] > 65)).to_numpy(np.int8),  # simplified
+    }
+
+
+def split_indices(n, valid_size=0.2, test_size=0.2, seed=42):
+    """Shuffled (train, valid, test) row indices."""
+    order = np.random.default_rng(seed).permutation(n)
+    n_test = int(round(n * test_size))
+    n_valid = int(round(n * valid_size))
+    return order[n_test + n_valid:], order[n_test:n_test + n_valid], order[:n_test]
+
+
+def load_training_frame(data_path, cache_path=None, chunksize=None):
+    """Memory-map the cleaned training columns, (re)building the Arrow cache when the CSV is newer."""
+    if data_path.endswith(('.arrow', '.feather')):
+        cache_path = data_path
+    else:
+        cache_path = cache_path or os.path.splitext(data_path)[0] + '.clean.arrow'
+        if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(data_path):
+            kwargs = {'chunksize': chunksize} if chunksize else {}
+            rows = build_clean_cache(data_path, cache_path, **kwargs)
+            logger.info('Cleaned %d rows into %s', rows, cache_path)
+    return load_clean_cache(cache_path, columns=FEATURE_COLUMNS)
+
+
+def _evaluate(booster, dtest, y):
+    from sklearn.metrics import log_loss, roc_auc_score
+    p = booster.predict(dtest)
+    metrics = {'logloss': round(float(log_loss(y, p, labels=[0, 1])), 5), 'positive_rate': round(float(y.mean()), 4)}
+    metrics['auc'] = round(float(roc_auc_score(y, p)), 5) if 0 < y.sum() < len(y) else None
+    return metrics
+
+
+def _train_target(name, X, labels, splits, base, params, num_boost_round, early_stopping_rounds):
+    import xgboost as xgb
+
+    train_idx, valid_idx, test_idx = splits
+    y = labels[name]
+    start = time.perf_counter()
+    # ref=base reuses the shared quantile cuts instead of sketching the features again
+    dtrain = xgb.QuantileDMatrix(X[train_idx], label=y[train_idx], ref=base, nthread=params['nthread'])
+    dvalid = xgb.QuantileDMatrix(X[valid_idx], label=y[valid_idx], ref=dtrain, nthread=params['nthread'])
+    booster = xgb.train(params, dtrain, num_boost_round=num_boost_round, evals=[(dvalid, 'valid')],
+                        early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+    info = {'best_iteration': booster.best_iteration, 'best_valid_logloss': round(booster.best_score, 5),
+            'rounds_trained': booster.num_boosted_rounds(), 'train_seconds': round(time.perf_counter() - start, 3)}
+    booster = booster[:booster.best_iteration + 1]  # ship only the trees predict_proba would use
+
+    dtest = xgb.QuantileDMatrix(X[test_idx], label=y[test_idx], ref=dtrain)
+    info['test'] = _evaluate(booster, dtest, y[test_idx])
+    return booster, info
+
 
-DATA_PATH = "data/raw/sample_data.csv"
-MODELS_DIR = "models"
+def train_models(df, models_dir=MODELS_DIR, threads_per_model=None, parallel=None, num_boost_round=1000,
+                 early_stopping_rounds=50, valid_size=0.2, test_size=0.2, seed=42, params=None):
+    """Fit the scaler and the three per-disease models on ``df``; write artifacts and return the report."""
+    import joblib
+    import xgboost as xgb
+    from sklearn.preprocessing import StandardScaler
 
-os.makedirs(MODELS_DIR, exist_ok=True)
+    wall_start = time.perf_counter()
+    labels = define_targets(df)
+    parallel = parallel or len(labels)
+    threads_per_model = threads_per_model or max(1, (os.cpu_count() or 1) // parallel)
+    params = dict(DEFAULT_PARAMS, **(params or {}), nthread=threads_per_model, seed=seed)
+    splits = split_indices(len(df), valid_size, test_size, seed)
 
-# Load & clean
-df = load_and_clean_data(DATA_PATH)
-df = create_features(df)
+    start = time.perf_counter()
+    features = df[FEATURE_COLUMNS]
+    scaler = StandardScaler().fit(features.iloc[splits[0]])
+    X = scaler.transform(features).astype(np.float32)
+    base = xgb.QuantileDMatrix(X[splits[0]], max_bin=params['max_bin'], nthread=threads_per_model * parallel)
+    build_seconds = time.perf_counter() - start
 
-# Define targets
-df['diabetes'] = ((df['Glucose'] > 126) | (df['HbA1c'] > 6.5)).astype(int)
-df['heart_disease'] = ((df['Systolic'] >= 140) | (df['Cholesterol'] > 240) | (df['Smoking'] == 1)).astype(int)
-df['stroke'] = ((df['Systolic'] >= 160) | (df['Age'] > 65)).astype(int)  # simplified
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        futures = {name: pool.submit(_train_target, name, X, labels, splits, base, params,
+                                     num_boost_round, early_stopping_rounds) for name in labels}
+        results = {name: f.result() for name, f in futures.items()}
 
-# Features
-feature_cols = ['Age','Gender','Glucose','HbA1c','Systolic','Diastolic','BMI','Cholesterol',
-                'Triglycerides','Smoking','Alcohol','Physical_Activity','Diet_Score',
-                'Family_History','Sleep_Hours','Stress_Level','TC_HDL_Ratio']
+    os.makedirs(models_dir, exist_ok=True)
+    joblib.dump(scaler, os.path.join(models_dir, 'scaler.pkl'))
+    for name, (booster, _) in results.items():
+        model = xgb.XGBClassifier()
+        model.load_model(bytearray(booster.save_raw('ubj')))
+        joblib.dump(model, os.path.join(models_dir, f'{name}_model.pkl'))
 
-X = df[feature_cols]
-y_diabetes = df['diabetes']
-y_heart = df['heart_disease']
-y_stroke = df['stroke']
+    report = {
+        'rows': {'train': len(splits[0]), 'valid': len(splits[1]), 'test': len(splits[2])},
+        'features': FEATURE_COLUMNS,
+        'params': params,
+        'parallel': parallel,
+        'threads_per_model': threads_per_model,
+        'build_matrix_seconds': round(build_seconds, 3),
+        'wall_seconds': round(time.perf_counter() - wall_start, 3),
+        'targets': {name: info for name, (_, info) in results.items()},
+    }
+    with open(os.path.join(models_dir, REPORT_FILE), 'w') as fh:
+        json.dump(report, fh, indent=2)
+    return report
 
-# Scale
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-joblib.dump(scaler, f'{MODELS_DIR}/scaler.pkl')
 
-# Train-test split
-X_train, X_test = train_test_split(X_scaled, test_size=0.2, random_state=42)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the per-disease XGBoost models.')
+    parser.add_argument('--data', default=DATA_PATH, help=f'raw CSV or cleaned .arrow cache (default: {DATA_PATH})')
+    parser.add_argument('--cache', help='where to keep the cleaned Arrow cache (default: next to --data)')
+    parser.add_argument('--models-dir', default=MODELS_DIR, help=f'output directory (default: {MODELS_DIR})')
+    parser.add_argument('--threads-per-model', type=int, help='XGBoost threads per target (default: cores / parallel)')
+    parser.add_argument('--parallel', type=int, help='targets trained at the same time (default: all three)')
+    parser.add_argument('--num-boost-round', type=int, default=1000, help='upper bound on trees (default: 1000)')
+    parser.add_argument('--early-stopping-rounds', type=int, default=50, help='default: 50')
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_PARAMS['max_depth'])
+    parser.add_argument('--eta', type=float, default=DEFAULT_PARAMS['eta'], help='learning rate')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
 
-# Train models
-models = {}
-targets = {'diabetes': y_diabetes, 'heart_disease': y_heart, 'stroke': y_stroke}
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    df = load_training_frame(args.data, args.cache)
+    report = train_models(df, args.models_dir, threads_per_model=args.threads_per_model, parallel=args.parallel,
+                          num_boost_round=args.num_boost_round, early_stopping_rounds=args.early_stopping_rounds,
+                          seed=args.seed, params={'max_depth': args.max_depth, 'eta': args.eta})
+    for name, info in report['targets'].items():
+        print(f"{name}: best_iteration={info['best_iteration']} test={info['test']} ({info['train_seconds']}s)")
+    print(f"All models trained and saved to {args.models_dir} in {report['wall_seconds']}s")
+    return 0
 
-for name, y in targets.items():
-    y_train = y.iloc[X_train.index]
-    model = xgb.XGBClassifier(n_estimators=200, max_depth=5, random_state=42)
-    model.fit(X_train, y_train)
-    models[name] = model
-    joblib.dump(model, f'{MODELS_DIR}/{name}_model.pkl')
 
-print("All models trained and saved!")
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
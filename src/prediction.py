@@ -1,251 +1,289 @@
 # src/prediction.py
-import joblib
-import pandas as pd
+import logging
+import time
+from collections.abc import Mapping
+
 import numpy as np
-from pathlib import Path
-from typing import Iterable
 
+try:
+    from src.coalescer import MicroBatcher, coalescer_from_env
+    from src.feature_pipeline import ANSWER_CODES, CATEGORY_MAPS, INPUT_COLUMNS, NUMERIC_INPUTS, to_code_array
+    from src.metrics import CACHE_LOOKUPS, GRID_LOOKUPS, PREDICTION_ERRORS, PREDICTIONS, observe_stage
+    from src.model_registry import BACKEND_PER_DISEASE, get_registry
+    from src.prediction_cache import PredictionCache, cache_from_env
+    from src.risk_grid import RiskGrid, grid_from_env
+    from src.validation import prealigned
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from coalescer import MicroBatcher, coalescer_from_env
+    from feature_pipeline import ANSWER_CODES, CATEGORY_MAPS, INPUT_COLUMNS, NUMERIC_INPUTS, to_code_array
+    from metrics import CACHE_LOOKUPS, GRID_LOOKUPS, PREDICTION_ERRORS, PREDICTIONS, observe_stage
+    from model_registry import BACKEND_PER_DISEASE, get_registry
+    from prediction_cache import PredictionCache, cache_from_env
+    from risk_grid import RiskGrid, grid_from_env
+    from validation import prealigned
 
-def _locate_file(filename: str, search_dirs: Iterable[Path]):
-    """Search for filename in provided directories and return first matching Path.
+logger = logging.getLogger('app')
+
+# Output order of the multi-output chronic model
+TARGET_NAMES = ['diabetes', 'heart_disease', 'stroke']
+
+_UNSET = object()
+_coalescer = _UNSET
+_cache = _UNSET
+_grid = _UNSET
+
+
+def _positive_proba(arr):
+    """Positive-class column of one target's (n_samples, n_classes) probabilities."""
+    arr = np.asarray(arr)
+    if arr.ndim == 2 and arr.shape[1] > 1:
+        return arr[:, 1]
+    if arr.ndim == 2 and arr.shape[1] == 1:
+        return arr[:, 0]
+    return np.full(len(arr), np.nan)
 
-    Raises FileNotFoundError with a helpful message if not found.
-    """
-    for d in search_dirs:
-        p = d / filename
-        if p.exists():
-            return p
-    searched = ', '.join(str(d) for d in search_dirs)
-    raise FileNotFoundError(f"Could not find '{filename}' in: {searched}")
-
-
-def predict_risk(input_dict):
-    # Resolve repository root and candidate artifact/model folders
-    repo_root = Path(__file__).resolve().parents[1]
-    candidates = [repo_root / 'models', repo_root / 'artifacts', repo_root]
-
-    # Attempt to load separate scaler + per-disease models. If those aren't available,
-    # fall back to a multi-output chronic model + preprocessor saved in artifacts.
-    models = {}
-    scaler = None
-    try:
-        scaler_path = _locate_file('scaler.pkl', candidates)
-        scaler = joblib.load(scaler_path)
-
-        model_files = {
-            'diabetes': 'diabetes_model.pkl',
-            'heart_disease': 'heart_disease_model.pkl',
-            'stroke': 'stroke_model.pkl'
-        }
-
-        for name, fname in model_files.items():
-            path = _locate_file(fname, candidates)
-            models[name] = joblib.load(path)
-    except FileNotFoundError:
-        # Try fallback: a single multi-output model saved by the notebook (e.g. chronic_disease_model.pkl)
-        try:
-            chronic_path = _locate_file('chronic_disease_model.pkl', candidates)
-            chronic_model = joblib.load(chronic_path)
-            # Try to load a preprocessor if available to transform raw input
-            try:
-                preproc_path = _locate_file('preprocessor.pkl', candidates)
-                preprocessor = joblib.load(preproc_path)
-            except FileNotFoundError:
-                preprocessor = None
-
-            # Build df below as usual, then use preprocessor to transform
-            # and extract probabilities from the multi-output model.
-            # We'll set models to a special marker and handle later.
-            models = {'__multi__': (chronic_model, preprocessor)}
-
-        except FileNotFoundError as e:
-            # Re-raise earlier, with a clear message about what we searched for
-            raise FileNotFoundError(
-                "No scaler/models found and no chronic multi-output model available. "
-                "Searched locations: {}".format(', '.join(str(p) for p in candidates))) from e
+
+def _input_frame(records):
+    # pandas is only needed by the per-disease models and a chronic model saved without
+    # its preprocessor; the plan-based backends never build a DataFrame.
+    import pandas as pd
 
     # Build DataFrame with expected columns (fallback values)
-    df = pd.DataFrame([input_dict])
-    df = df.reindex(columns=[
-        'Age', 'Gender', 'Glucose', 'HbA1c', 'Systolic', 'Diastolic', 'BMI', 'Cholesterol',
-        'Triglycerides', 'Smoking', 'Alcohol', 'Physical_Activity', 'Diet_Score',
-        'Family_History', 'Sleep_Hours', 'Stress_Level', 'TC_HDL_Ratio'
-    ], fill_value=0)
-
-    # Ensure TC_HDL_Ratio exists sensibly
-    if (pd.isna(df.loc[0, 'TC_HDL_Ratio']) or df.loc[0, 'TC_HDL_Ratio'] == 0) and 'Cholesterol' in df.columns:
+    df = pd.DataFrame(list(records))
+    df = df.reindex(columns=INPUT_COLUMNS, fill_value=0)
+
+    # Ensure TC_HDL_Ratio exists sensibly; reindex's fill value makes it an int column
+    df['TC_HDL_Ratio'] = pd.to_numeric(df['TC_HDL_Ratio'], errors='coerce').astype(float)
+    missing_ratio = df['TC_HDL_Ratio'].isna() | (df['TC_HDL_Ratio'] == 0)
+    if missing_ratio.any():
         # Use a safe divisor if HDL not provided; this is a fallback only
-        df['TC_HDL_Ratio'] = df['Cholesterol'] / 50
-
-    # Coerce numeric columns to numeric to avoid dtype issues
-    numeric_cols = ['Age', 'Glucose', 'HbA1c', 'Systolic', 'Diastolic', 'BMI', 'Cholesterol',
-                    'Triglycerides', 'Smoking', 'Alcohol', 'Physical_Activity', 'Diet_Score',
-                    'Family_History', 'Sleep_Hours', 'Stress_Level', 'TC_HDL_Ratio']
-    for c in numeric_cols:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
+        df.loc[missing_ratio, 'TC_HDL_Ratio'] = df.loc[missing_ratio, 'Cholesterol'] / 50
 
-    # If we have the multi-output chronic model, use its preprocessor (if present) to transform
-    if '__multi__' in models:
-        chronic_model, preprocessor = models['__multi__']
-        if preprocessor is not None:
-            # Align and populate the raw DataFrame to match preprocessor.feature_names_in_
-            expected = list(preprocessor.feature_names_in_)
-
-            def _candidates(name):
-                # generate possible input keys that map to this expected column
-                yield name
-                yield name.replace(' ', '_')
-                yield name.replace(' ', '').lower()
-                yield name.lower().replace(' ', '_')
-
-            df_aligned = pd.DataFrame(index=df.index)
-            for col in expected:
-                found = False
-                for cand in _candidates(col):
-                    if cand in df.columns:
-                        df_aligned[col] = df[cand]
-                        found = True
-                        break
-                if not found:
-                    # handle some common derived/renamed columns
-                    if col == 'Systolic_BP' and 'Systolic' in df.columns:
-                        df_aligned[col] = pd.to_numeric(df['Systolic'], errors='coerce')
-                    elif col == 'Diastolic_BP' and 'Diastolic' in df.columns:
-                        df_aligned[col] = pd.to_numeric(df['Diastolic'], errors='coerce')
-                    elif col == 'BMI_Category' and 'BMI' in df.columns:
-                        df_aligned[col] = pd.cut(pd.to_numeric(df['BMI'], errors='coerce'), bins=[0,18.5,25,30,100], labels=['Underweight','Normal','Overweight','Obese'])
-                    elif col == 'Age_Group' and 'Age' in df.columns:
-                        df_aligned[col] = pd.cut(pd.to_numeric(df['Age'], errors='coerce'), bins=[0,40,60,100], labels=['Young','Middle','Senior'])
-                    else:
-                        # default to NaN
-                        df_aligned[col] = pd.NA
-
-            # Identify categorical columns and their default fill values from the fitted OneHotEncoder
-            cat_cols = []
-            cat_fill = {}
-            try:
-                # transformers_ entries: ('num', transformer, cols), ('cat', transformer, cols)
-                for name, transformer, cols in preprocessor.transformers_:
-                    if name == 'cat':
-                        cat_cols = list(cols)
-                        try:
-                            enc = preprocessor.named_transformers_['cat']
-                            # enc.categories_ is a list parallel to cat_cols
-                            for i, col in enumerate(cat_cols):
-                                cats = enc.categories_[i] if hasattr(enc, 'categories_') else []
-                                cat_fill[col] = cats[0] if len(cats) > 0 else ''
-                        except Exception:
-                            for col in cat_cols:
-                                cat_fill[col] = ''
-                        break
-            except Exception:
-                cat_cols = []
-
-            # Coerce numeric columns to numeric (safe) and fill categorical cols with a default category
-            for c in df_aligned.columns:
-                if c in cat_cols:
-                    # ensure object dtype before filling with string category
-                    df_aligned[c] = df_aligned[c].astype(object).fillna(cat_fill.get(c, ''))
-                else:
-                    df_aligned[c] = pd.to_numeric(df_aligned[c], errors='coerce').fillna(0)
-
-            # DEBUG: print alignment and category info to help trace empty prediction cases
-            try:
-                # Use Flask's logger if available; fall back to print
-                import logging
-                logger = logging.getLogger('app')
-                logger.info('--- prediction debug: df_aligned ---')
-                logger.info('columns: %s', list(df_aligned.columns))
-                logger.info('row0: %s', df_aligned.iloc[0].to_dict())
-                logger.info('cat_cols: %s', cat_cols)
-                if 'enc' in locals():
-                    logger.info('encoder categories: %s', [[str(x) for x in cats] for cats in enc.categories_])
-            except Exception:
-                try:
-                    print('\n--- prediction debug: df_aligned ---')
-                    print('columns:', list(df_aligned.columns))
-                    print('row0:', df_aligned.iloc[0].to_dict())
-                    print('cat_cols:', cat_cols)
-                    if 'enc' in locals():
-                        print('encoder categories:', [[str(x) for x in cats] for cats in enc.categories_])
-                except Exception:
-                    pass
-
-            # Manually assemble transformed matrix to avoid OneHotEncoder transform bug
-            # 1) numeric transformer
-            try:
-                num_cols = list(preprocessor.transformers_[0][2])
-                num_transformer = preprocessor.named_transformers_['num']
-                num_array = num_transformer.transform(df_aligned[num_cols])
-            except Exception:
-                # fallback: numeric values as-is
-                num_cols = [c for c in df_aligned.columns if c not in cat_cols]
-                num_array = df_aligned[num_cols].to_numpy()
-
-            # 2) categorical: build one-hot columns respecting drop='first'
-            cat_matrix = np.zeros((len(df_aligned), 0))
-            try:
-                enc = preprocessor.named_transformers_['cat']
-                cat_cols_local = list(preprocessor.transformers_[1][2])
-                cat_arrays = []
-                for i, col in enumerate(cat_cols_local):
-                    cats = enc.categories_[i]
-                    # drop first category per encoder configuration
-                    for cat in cats[1:]:
-                        # compare case-insensitively to be robust to capitalization differences
-                        left = df_aligned[col].astype(str).str.lower()
-                        right = str(cat).lower()
-                        arr = (left == right).astype(int).to_numpy().reshape(-1, 1)
-                        cat_arrays.append(arr)
-                # DEBUG: report categorical matrix stats
-                try:
-                    import logging
-                    logger = logging.getLogger('app')
-                    if cat_arrays:
-                        logger.info('cat_arrays count: %s first col sample: %s', len(cat_arrays), getattr(cat_arrays[0], 'ravel', lambda: cat_arrays[0])()[:5])
-                except Exception:
-                    try:
-                        if cat_arrays:
-                            print('cat_arrays count:', len(cat_arrays), 'first col sample:', cat_arrays[0].ravel()[:5])
-                    except Exception:
-                        pass
-                if cat_arrays:
-                    cat_matrix = np.hstack(cat_arrays)
-                else:
-                    cat_matrix = np.zeros((len(df_aligned), 0))
-            except Exception:
-                cat_matrix = np.zeros((len(df_aligned), 0))
-
-            # 3) concatenate numeric + categorical arrays to form X_proc
-            if num_array.size == 0 and cat_matrix.size == 0:
-                X_proc = df_aligned.to_numpy()
-            else:
-                X_proc = np.hstack([num_array, cat_matrix])
-        elif scaler is not None:
-            # if scaler was somehow set, use it
-            X_proc = scaler.transform(df)
+    # Coerce numeric columns to numeric to avoid dtype issues; text answers ('Yes', 'High') become their codes
+    for c in NUMERIC_INPUTS:
+        if c in ANSWER_CODES:
+            df[c] = to_code_array(c, df[c].to_numpy())
         else:
-            # try to coerce numeric and pass raw
-            X_proc = df.values
+            df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
+    return df
+
+
+def _align(artifacts, records):
+    """Return the model input matrix for the records under the given artifacts."""
+    if artifacts.plan is not None:
+        # The alignment plan compiled from the preprocessor maps requests straight to model rows
+        return artifacts.plan.transform(records)
+    if artifacts.backend == BACKEND_PER_DISEASE:
+        # The per-disease models are trained on the cleaned extract, where Gender is a 0/1 code:
+        # text answers are mapped, numeric codes are kept as they are
+        import pandas as pd
+
+        frame = _input_frame(records)
+        gender = frame['Gender']
+        mapped = gender.astype(str).str.strip().str.title().map(CATEGORY_MAPS['Gender'])
+        frame['Gender'] = mapped.fillna(pd.to_numeric(gender, errors='coerce')).fillna(0)
+        return artifacts.scaler.transform(frame)
+    # no preprocessor saved next to the chronic model: try to pass raw numeric values
+    return _input_frame(records).values
 
-        proba_list = chronic_model.predict_proba(X_proc)
+
+def _predict_matrix(artifacts, X):
+    """Return {target: positive-class probabilities}, one predict_proba call per target."""
+    if artifacts.chronic_model is not None:
+        # MultiOutputClassifier or the lean export's LeanForest (same predict_proba contract)
+        proba_list = artifacts.chronic_model.predict_proba(X)
         # proba_list is a list/tuple of (n_samples, n_classes) arrays, one per target
-        target_names = ['diabetes', 'heart_disease', 'stroke']
-        results = {}
-        for i, arr in enumerate(proba_list):
+        return {TARGET_NAMES[i]: _positive_proba(arr) for i, arr in enumerate(proba_list)}
+    # Otherwise use separate scaler + models
+    return {name: _positive_proba(model.predict_proba(X)) for name, model in artifacts.models.items()}
+
+
+def _score(artifacts, records, X=None):
+    started = time.perf_counter()
+    if X is None:
+        X = _align(artifacts, records)
+    started = observe_stage('align', artifacts.backend, started)
+    scores = _predict_matrix(artifacts, X)
+    observe_stage('predict', artifacts.backend, started)
+    return scores
+
+
+def get_coalescer():
+    """The micro-batcher used by predict_risk, or None when coalescing is disabled."""
+    global _coalescer
+    if _coalescer is _UNSET:
+        _coalescer = coalescer_from_env(_predict_matrix)
+    return _coalescer
+
+
+def configure_coalescer(enabled=True, max_batch=32, max_wait_ms=2.0):
+    """Turn micro-batching of concurrent predict_risk calls on or off for this process."""
+    global _coalescer
+    previous = _coalescer
+    _coalescer = MicroBatcher(_predict_matrix, max_batch, max_wait_ms / 1000.0) if enabled else None
+    if isinstance(previous, MicroBatcher):
+        previous.close()
+    return _coalescer
+
+
+def _clear_prediction_cache(*_):
+    """Reload listener for whichever cache is current; replaced caches are not kept alive by the registry."""
+    if isinstance(_cache, PredictionCache):
+        _cache.clear()
+
+
+def get_prediction_cache():
+    """The predict_risk result cache, or None when disabled (``PREDICT_CACHE_SIZE=0``)."""
+    global _cache
+    if _cache is _UNSET:
+        _cache = cache_from_env()
+        get_registry().add_reload_listener(_clear_prediction_cache)
+    return _cache
+
+
+def configure_prediction_cache(maxsize=1024, ttl=0.0):
+    """Replace the result cache for this process; ``maxsize=0`` disables caching."""
+    global _cache
+    _cache = PredictionCache(maxsize, ttl) if maxsize > 0 else None
+    get_registry().add_reload_listener(_clear_prediction_cache)
+    return _cache
+
+
+def get_risk_grid():
+    """The precomputed risk grid checked before the model, or None when ``PREDICT_GRID`` is unset."""
+    global _grid
+    if _grid is _UNSET:
+        _grid = grid_from_env()
+    return _grid
+
+
+def configure_risk_grid(directory=None):
+    """Use the grid in ``directory`` for this process; ``None`` turns the grid off."""
+    global _grid
+    _grid = RiskGrid.load(directory) if directory is not None else None
+    return _grid
+
+
+def _risk_dict(scores, i):
+    return {name: round(float(p[i]) * 100, 1) for name, p in scores.items()}
+
+
+def predict_risk(input_dict, registry=None):
+    # Artifacts are resolved and unpickled once per process by the model registry;
+    # per-disease models (scaler + one model per disease) take precedence over the
+    # multi-output chronic model + preprocessor saved in artifacts.
+    artifacts = (registry or get_registry()).get()
+    backend = artifacts.backend
+    started = time.perf_counter()
+
+    # Requests checked by src/validation.py arrive with their model row already built
+    X = prealigned(artifacts, input_dict)
+    if X is None and artifacts.plan is not None:
+        plan = artifacts.plan
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('prediction debug: aligned row %s',
+                         dict(zip((r.column for r in plan.rules), plan.align_one(input_dict))))
+        X = plan.transform_one(input_dict)
+    elif X is None:
+        X = _align(artifacts, [input_dict])
+    started = observe_stage('align', backend, started)
+
+    # Inside the grid built offline (src/risk_grid.py) the model is not called at all;
+    # the grid ignores itself when the loaded model files are not the ones it was built from
+    grid = get_risk_grid()
+    if grid is not None and artifacts.plan is not None:
+        risks = grid.lookup(artifacts, X)
+        started = observe_stage('grid', backend, started)
+        if risks is not None:
+            GRID_LOOKUPS.inc('hit')
+            return risks
+        GRID_LOOKUPS.inc('miss')
+
+    # Cached by aligned feature vector, so equivalent raw inputs share an entry
+    cache = get_prediction_cache()
+    if cache is not None:
+        key = cache.key(artifacts, X)
+        risks = cache.get(key)
+        started = observe_stage('cache', backend, started)
+        if risks is not None:
+            CACHE_LOOKUPS.inc('hit')
+            return dict(risks)
+        CACHE_LOOKUPS.inc('miss')
+
+    coalescer = get_coalescer()
+    if coalescer is not None:
+        # Concurrent single-record requests are flushed through the model together
+        scores = coalescer.submit(artifacts, X).result()
+    else:
+        scores = _predict_matrix(artifacts, X)
+    observe_stage('predict', backend, started)
+    PREDICTIONS.inc(backend, 'single')
+    risks = _risk_dict(scores, 0)
+    if cache is not None:
+        cache.put(key, risks)
+        return dict(risks)
+    return risks
+
+
+def predict_risk_batch(records, registry=None):
+    """Score many input dicts with one ``predict_proba`` call per target.
+
+    Returns a list parallel to ``records``: ``{'risks': {...}}`` for every
+    record that could be scored and ``{'error': message}`` for the others, so a
+    bad record never fails the whole batch.
+    """
+    artifacts = (registry or get_registry()).get()
+    results = [None] * len(records)
+    valid = []
+    for i, record in enumerate(records):
+        if isinstance(record, Mapping):
+            valid.append(i)
+        else:
+            results[i] = {'error': f'record must be an object, got {type(record).__name__}'}
+    if not valid:
+        return _count_outcomes(artifacts.backend, results)
+
+    try:
+        scores = _score(artifacts, [records[i] for i in valid], prealigned(artifacts, records))
+    except Exception:
+        # Isolate the offending record(s): score the rest one by one
+        logger.exception('Batch scoring failed; retrying %d records individually', len(valid))
+        for i in valid:
             try:
-                prob_pos = float(arr[0][1])
-            except Exception:
-                prob_pos = float(arr[0]) if arr.shape[1] == 1 else float('nan')
-            results[target_names[i]] = round(prob_pos * 100, 1)
-        return results
+                results[i] = {'risks': _risk_dict(_score(artifacts, [records[i]]), 0)}
+            except Exception as e:
+                results[i] = {'error': str(e)}
+    else:
+        for j, i in enumerate(valid):
+            results[i] = {'risks': _risk_dict(scores, j)}
 
-    # Otherwise use separate scaler + models
-    X = scaler.transform(df)
-    results = {}
-    for name, model in models.items():
-        proba = model.predict_proba(X)[0][1]
-        results[name] = round(proba * 100, 1)
+    return _count_outcomes(artifacts.backend, results)
+
+
+def _count_outcomes(backend, results):
+    errors = sum(1 for r in results if 'error' in r)
+    if len(results) > errors:
+        PREDICTIONS.inc(backend, 'batch', amount=len(results) - errors)
+    if errors:
+        PREDICTION_ERRORS.inc(backend, amount=errors)
+    return results
 
-    return results
\ No newline at end of file
+
+def predict_risk_columns(columns, n, registry=None):
+    """Score ``n`` records given column-wise (e.g. a DataFrame chunk keyed by INPUT_COLUMNS names).
+
+    Returns ``{target: array of risk percentages}`` rounded like predict_risk.
+    Used for bulk scoring, where building a dict per row would dominate.
+    """
+    artifacts = (registry or get_registry()).get()
+    started = time.perf_counter()
+    if artifacts.plan is not None:
+        X = artifacts.plan.transform_columns(columns, n)
+    else:
+        keys = list(columns)
+        X = _align(artifacts, [{k: columns[k][i] for k in keys} for i in range(n)])
+    started = observe_stage('align', artifacts.backend, started)
+    scores = _predict_matrix(artifacts, X)
+    observe_stage('predict', artifacts.backend, started)
+    PREDICTIONS.inc(artifacts.backend, 'columns', amount=n)
+    return {name: np.round(p.astype(np.float64) * 100, 1) for name, p in scores.items()}
@@ -0,0 +1,79 @@
+# src/prediction_cache.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('app')
+
+
+class PredictionCache:
+    """Bounded LRU cache of predict_risk results with an optional TTL.
+
+    Keys are a hash of the *aligned* model input row plus the artifacts'
+    content fingerprint, so requests that normalize to the same features
+    ('Male'/'male', '55'/55) share an entry and a reloaded model never serves
+    results computed by the previous one. ``ttl`` of 0 disables expiry.
+    """
+
+    def __init__(self, maxsize=1024, ttl=0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def key(artifacts, X):
+        return artifacts.fingerprint + hashlib.blake2b(X.tobytes(), digest_size=16).digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires and expires < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, *_):
+        """Drop every entry (registered as a model-reload listener)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'expirations': self.expirations, 'size': len(self._data),
+                    'maxsize': self.maxsize, 'ttl': self.ttl}
+
+
+def cache_from_env():
+    """Build the cache from ``PREDICT_CACHE_SIZE`` (0 disables) and ``PREDICT_CACHE_TTL`` (seconds)."""
+    size = int(os.environ.get('PREDICT_CACHE_SIZE', '1024'))
+    if size <= 0:
+        return None
+    ttl = float(os.environ.get('PREDICT_CACHE_TTL', '0') or 0)
+    logger.info('Prediction cache enabled (size=%s, ttl=%ss)', size, ttl)
+    return PredictionCache(maxsize=size, ttl=ttl)
@@ -1,50 +1,340 @@
 # src/preprocessing.py
-import pandas as pd
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-import joblib
+"""Cleaning of raw screening extracts for training.
+
+The CSV is streamed in chunks, twice. The first pass collects per-column
+statistics (dtype, exact median of numeric columns, mode of text columns).
+The second pass applies the cleaning with those global statistics and writes
+every chunk to an Arrow IPC (Feather v2) cache, which training memory-maps:
+
+    python src/preprocessing.py Data/dirty_v3_path.csv cache/clean.arrow
+
+The result is identical to cleaning the whole file in memory
+(:func:`load_and_clean_data`), whatever the chunk size.
+"""
+import argparse
 import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.feature_pipeline import CATEGORY_MAPS
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from feature_pipeline import CATEGORY_MAPS
+
+DROP_COLUMNS = ['random_notes', 'noise_col', 'LengthOfStay']
+
+# Unknown/missing answers count as "no" instead of being imputed
+ZERO_FILLED = ('Smoking', 'Alcohol')
+
+BMI_CATEGORY_BINS = [0, 18.5, 25, 30, 100]
+
+DEFAULT_CHUNKSIZE = 100_000
+# Text columns with more distinct values than this are kept as plain objects, not categoricals
+MAX_CATEGORIES = 1000
+
+_NUMERIC_KINDS = ('int', 'float')
+
+
+def normalize_header(name):
+    """'Physical Activity' -> 'Physical_Activity' (the training code uses underscored names)."""
+    return str(name).strip().replace(' ', '_')
+
+
+def _kind(series):
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'int'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'float'
+    return 'object'
+
+
+def _merge_kind(a, b):
+    if a is None or a == b:
+        return b
+    if a in _NUMERIC_KINDS and b in _NUMERIC_KINDS:
+        return 'float'
+    return 'object'
+
+
+def _map_codes(series, mapping):
+    """Vectorized ``series.map(mapping)`` for text (object or categorical) columns."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        lookup = np.array([mapping.get(c, np.nan) for c in series.cat.categories], dtype=np.float64)
+        codes = series.cat.codes.to_numpy()
+        values = np.where(codes >= 0, lookup[codes] if len(lookup) else np.nan, np.nan)
+        if not np.isnan(values).any():
+            values = values.astype(np.int64)
+        return pd.Series(values, index=series.index, name=series.name)
+    return series.map(mapping)
+
+
+def clean_chunk(df):
+    """Row-local cleaning (no imputation): drop junk, split BP, encode text codes.
+
+    Imputation needs whole-file statistics and is applied by :meth:`CleaningStats.fill`.
+    """
+    df = df.rename(columns=normalize_header)
+    df = df.drop(DROP_COLUMNS, axis=1, errors='ignore')
 
-def load_and_clean_data(filepath):
-    df = pd.read_csv(filepath)
-    
-    # Drop junk
-    df = df.drop(['random_notes', 'noise_col', 'LengthOfStay'], axis=1, errors='ignore')
-    
-    # Split BP
     if 'Blood_Pressure' in df.columns:
-        bp = df['Blood_Pressure'].str.split('/', expand=True).astype(float)
-        df['Systolic'] = bp[0]
-        df['Diastolic'] = bp[1]
+        bp = df['Blood_Pressure']
+        if _kind(bp) in _NUMERIC_KINDS:
+            # a single reading is the systolic pressure
+            systolic, diastolic = bp.astype(np.float64), np.nan
+        else:
+            parts = bp.astype(object).str.split('/', expand=True).astype(float)
+            systolic = parts[0]
+            diastolic = parts[1] if parts.shape[1] > 1 else np.nan
         df = df.drop('Blood_Pressure', axis=1)
-    
-    # Encode categoricals
-    df['Gender'] = df['Gender'].map({'Male': 1, 'Female': 0})
-    df['Smoking'] = df['Smoking'].map({'Yes': 1, 'No': 0, 'Former': 1}).fillna(0)
-    df['Alcohol'] = df['Alcohol'].map({'Yes': 1, 'No': 0, 'Occasional': 1, 'Regular': 1}).fillna(0)
-    df['Family_History'] = df['Family_History'].map({'Yes': 1, 'No': 0})
-    
-    # Activity & Stress ordinal
-    activity_map = {'Low': 0, 'Moderate': 1, 'High': 2}
-    stress_map = {'Low': 0, 'Moderate': 1, 'High': 2}
-    df['Physical_Activity'] = df['Physical_Activity'].map(activity_map)
-    df['Stress_Level'] = df['Stress_Level'].map(stress_map)
-    
-    # Fill NA
-    for col in df.select_dtypes(include=['float64', 'int64']):
-        df[col].fillna(df[col].median(), inplace=True)
-    for col in df.select_dtypes(include=['object']):
-        df[col].fillna(df[col].mode()[0], inplace=True)
-    
+        df['Systolic'] = systolic
+        df['Diastolic'] = diastolic
+
+    for col, mapping in CATEGORY_MAPS.items():
+        if col in df.columns and _kind(df[col]) == 'object':
+            df[col] = _map_codes(df[col], mapping)
+    for col in ZERO_FILLED:
+        if col in df.columns:
+            df[col] = df[col].fillna(0)
+    return df
+
+
+def _median_from_counts(values, counts):
+    n = int(counts.sum())
+    if n == 0:
+        return np.nan
+    cum = np.cumsum(counts)
+    lo = values[np.searchsorted(cum, (n - 1) // 2, side='right')]
+    hi = values[np.searchsorted(cum, n // 2, side='right')]
+    return (float(lo) + float(hi)) / 2
+
+
+def _mode(counter):
+    if not counter:
+        return None
+    top = max(counter.values())
+    candidates = [v for v, c in counter.items() if c == top]
+    try:
+        return min(candidates)  # pandas' mode() is sorted; [0] is the smallest
+    except TypeError:
+        return min(candidates, key=str)
+
+
+class CleaningStats:
+    """Whole-file statistics gathered chunk by chunk.
+
+    Numeric columns keep exact value counts (merged after every chunk), so
+    the median is the exact one; memory grows with the number of *distinct*
+    values, which is small for rounded measurements. Text columns keep a
+    value counter for the mode.
+    """
+
+    def __init__(self):
+        self.raw_kinds = {}        # raw header -> kind, as read from the CSV
+        self.raw_values = {}       # raw header -> Counter of text values (category tables)
+        self.kinds = {}            # cleaned column -> kind
+        self.columns = None        # cleaned column order
+        self._numeric = {}         # cleaned column -> (sorted values, counts)
+        self._text = {}            # cleaned column -> Counter
+        self.rows = 0
+        # a raw column was read as text in one chunk and as numbers/bools in another
+        self.mixed_kinds = False
+
+    def update_raw(self, chunk):
+        for col in chunk.columns:
+            s = chunk[col]
+            kind = _kind(s)
+            previous = self.raw_kinds.get(col)
+            if previous is not None and previous != kind and not {previous, kind} <= set(_NUMERIC_KINDS):
+                self.mixed_kinds = True
+            self.raw_kinds[col] = _merge_kind(previous, kind)
+            if kind == 'object':
+                counter = self.raw_values.setdefault(col, Counter())
+                if counter is not None:
+                    counter.update(s.dropna().tolist())
+                    if len(counter) > MAX_CATEGORIES:
+                        self.raw_values[col] = None
+
+    def update(self, cleaned):
+        if self.columns is None:
+            self.columns = list(cleaned.columns)
+        self.rows += len(cleaned)
+        for col in cleaned.columns:
+            s = cleaned[col]
+            kind = _kind(s)
+            self.kinds[col] = _merge_kind(self.kinds.get(col), kind)
+            if kind in _NUMERIC_KINDS:
+                values = s.to_numpy(dtype=np.float64)
+                values = values[~np.isnan(values)]
+                if col in self._numeric:
+                    old_values, old_counts = self._numeric[col]
+                    merged, inverse = np.unique(np.concatenate([old_values, values]), return_inverse=True)
+                    counts = np.bincount(inverse, weights=np.concatenate(
+                        [old_counts, np.ones(len(values))]), minlength=len(merged))
+                    self._numeric[col] = (merged, counts)
+                else:
+                    uniq, counts = np.unique(values, return_counts=True)
+                    self._numeric[col] = (uniq, counts.astype(np.float64))
+            elif kind == 'object':
+                self._text.setdefault(col, Counter()).update(s.dropna().tolist())
+
+    def medians(self):
+        return {col: _median_from_counts(*self._numeric[col]) if col in self._numeric else np.nan
+                for col, kind in self.kinds.items() if kind in _NUMERIC_KINDS}
+
+    def modes(self):
+        return {col: _mode(self._text.get(col, Counter()))
+                for col, kind in self.kinds.items() if kind == 'object'}
+
+    def read_dtypes(self, categories=True):
+        """Explicit ``read_csv`` dtypes for the second pass (categoricals for small text columns)."""
+        dtypes = {}
+        for col, kind in self.raw_kinds.items():
+            if kind == 'int':
+                dtypes[col] = 'int64'
+            elif kind == 'float':
+                dtypes[col] = 'float64'
+            elif kind == 'bool':
+                dtypes[col] = 'bool'
+            elif (categories and self.raw_values.get(col) is not None
+                  and normalize_header(col) != 'Blood_Pressure'):
+                dtypes[col] = pd.CategoricalDtype(sorted(self.raw_values[col], key=str))
+            else:
+                dtypes[col] = object
+        return dtypes
+
+    def fill(self, cleaned, medians, modes):
+        """Impute and cast one cleaned chunk to the whole-file dtypes."""
+        for col, kind in self.kinds.items():
+            if col not in cleaned.columns:
+                continue
+            s = cleaned[col]
+            if kind in _NUMERIC_KINDS:
+                if s.isna().any():
+                    s = s.fillna(medians[col])
+                s = s.astype('int64' if kind == 'int' else 'float64')
+            elif kind == 'object' and modes.get(col) is not None and s.isna().any():
+                if isinstance(s.dtype, pd.CategoricalDtype) and modes[col] not in s.cat.categories:
+                    s = s.cat.add_categories([modes[col]])
+                s = s.fillna(modes[col])
+            cleaned[col] = s
+        return cleaned
+
+
+def _read_chunks(filepath, chunksize, dtype=None):
+    yield from pd.read_csv(filepath, chunksize=chunksize, dtype=dtype)
+
+
+def collect_stats(filepath, chunksize=DEFAULT_CHUNKSIZE):
+    """First pass: whole-file column kinds, value tables, medians and modes."""
+    stats = CleaningStats()
+    for chunk in _read_chunks(filepath, chunksize):
+        stats.update_raw(chunk)
+        stats.update(clean_chunk(chunk))
+    # read_csv infers dtypes per chunk: if a column was text in one chunk and numbers in
+    # another (e.g. one stray value deep in a numeric column), the whole-file read treats
+    # it as text everywhere, so redo the pass with those dtypes.
+    if stats.mixed_kinds:
+        dtypes = stats.read_dtypes(categories=False)
+        stats = CleaningStats()
+        for chunk in _read_chunks(filepath, chunksize, dtypes):
+            stats.update_raw(chunk)
+            stats.update(clean_chunk(chunk))
+    return stats
+
+
+def iter_clean_chunks(filepath, chunksize=DEFAULT_CHUNKSIZE, stats=None, features=False):
+    """Second pass: yield cleaned, imputed chunks (optionally with :func:`create_features` columns)."""
+    stats = stats or collect_stats(filepath, chunksize)
+    medians, modes = stats.medians(), stats.modes()
+    for chunk in _read_chunks(filepath, chunksize, stats.read_dtypes()):
+        cleaned = stats.fill(clean_chunk(chunk), medians, modes)
+        if features:
+            cleaned = create_features(cleaned, copy=False)
+        yield cleaned
+
+
+def build_clean_cache(filepath, cache_path, chunksize=DEFAULT_CHUNKSIZE, features=True):
+    """Clean ``filepath`` chunk by chunk into an uncompressed Arrow IPC file. Returns the row count."""
+    import pyarrow as pa
+
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    tmp_path = f'{cache_path}.tmp'
+    writer = None
+    rows = 0
+    try:
+        for cleaned in iter_clean_chunks(filepath, chunksize, features=features):
+            table = pa.Table.from_pandas(cleaned, preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_file(tmp_path, table.schema)
+            writer.write_table(table)
+            rows += len(cleaned)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError(f'{filepath} has no rows')
+    os.replace(tmp_path, cache_path)
+    return rows
+
+
+def load_clean_cache(cache_path, columns=None):
+    """Memory-map a cache written by :func:`build_clean_cache` and return it as a DataFrame.
+
+    Only ``columns`` (default: all) are materialized; null-free numeric columns
+    are backed by the mapped file rather than copied.
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(str(cache_path)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(list(columns))
+    return table.to_pandas(split_blocks=True)
+
+
+def load_and_clean_data(filepath, chunksize=DEFAULT_CHUNKSIZE):
+    """Clean the whole extract into one in-memory DataFrame (text columns as objects)."""
+    chunks = list(iter_clean_chunks(filepath, chunksize))
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0].reset_index(drop=True)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
     return df
 
-def create_features(df):
-    df = df.copy()
+
+def create_features(df, copy=True):
+    if copy:
+        df = df.copy()
     if 'Cholesterol' in df.columns and 'HDL' not in df.columns:
         df['HDL'] = df['Cholesterol'] * 0.25  # placeholder
     df['TC_HDL_Ratio'] = df['Cholesterol'] / df['HDL']
-    df['BMI_Category'] = pd.cut(df['BMI'], bins=[0, 18.5, 25, 30, 100], labels=[0,1,2,3])
+    df['BMI_Category'] = pd.cut(df['BMI'], bins=BMI_CATEGORY_BINS, labels=[0, 1, 2, 3])
     return df
 
+
 def get_preprocessor():
-    return joblib.load('models/scaler.pkl') if os.path.exists('models/scaler.pkl') else None
\ No newline at end of file
+    import joblib
+    return joblib.load('models/scaler.pkl') if os.path.exists('models/scaler.pkl') else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Clean a raw extract into a memory-mappable Arrow cache.')
+    parser.add_argument('input', help='raw CSV, e.g. Data/dirty_v3_path.csv')
+    parser.add_argument('output', help='Arrow IPC (.arrow/.feather) file to write')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f'rows per chunk (default: {DEFAULT_CHUNKSIZE})')
+    parser.add_argument('--no-features', action='store_true', help='skip create_features()')
+    args = parser.parse_args(argv)
+    rows = build_clean_cache(args.input, args.output, args.chunksize, features=not args.no_features)
+    print(f'Wrote {rows} rows to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,164 @@
 # src/recommendations.py
+"""Lifestyle recommendations from the predicted risks and the model inputs.
+
+The rules are data: :data:`RULES` below, or a JSON file named by
+``RECOMMENDATION_RULES``, e.g.::
+
+    [{"priority": 90, "target": "heart_disease", "min_risk": 60,
+      "when": [["Smoking", "==", 1]], "message": "Quit smoking immediately"}]
+
+A rule fires when the risk of its ``target`` (a percentage) is above
+``min_risk`` and every ``when`` condition holds on the inputs. Conditions
+compare an input key (``BMI``, ``Smoking``, ...) with a number; text answers
+like ``'yes'`` are mapped to the codes of ``feature_pipeline.CATEGORY_MAPS``
+first. The messages that fire are returned ranked by priority (highest
+first; rules of equal priority in table order).
+
+:class:`RuleSet` compiles the table once. :meth:`RuleSet.recommend_many`
+evaluates every rule on whole columns with NumPy, so batch and bulk
+scoring do not loop over rules per row.
+"""
+import json
+import logging
+import operator
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from src.feature_pipeline import to_code, to_code_array
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from feature_pipeline import to_code, to_code_array
+
+logger = logging.getLogger('app')
+
+# (priority, target, risk above which it applies (%), input conditions, message)
+RULES = (
+    (90, 'heart_disease', 60, (('Smoking', '==', 1),), 'Quit smoking immediately'),
+    (80, 'stroke', 60, (), 'Control blood pressure daily'),
+    (70, 'diabetes', 60, (('BMI', '>', 30),), 'Aim to lose 5-7% body weight'),
+    (60, 'diabetes', 60, (), 'Reduce sugar & refined carbs'),
+    (50, 'heart_disease', 60, (), 'Limit salt <2g/day'),
+    (40, 'diabetes', 60, (), 'Walk 30 min daily'),
+    (40, 'heart_disease', 60, (), 'Eat oats, nuts, and olive oil'),
+    (30, 'stroke', 60, (), 'Manage stress with meditation'),
+)
+
+_OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+              '==': operator.eq, '!=': operator.ne}
+
+
+def _input_column(column, values, n):
+    """Vectorized :func:`to_code`; a missing column reads as 0 (like the model inputs)."""
+    if values is None:
+        return np.zeros(n)
+    return to_code_array(column, values)
+
+
+class RuleSet:
+    """A compiled rule table; see the module docstring."""
+
+    def __init__(self, rules=RULES):
+        rules = [tuple(rule) for rule in rules]
+        for _, target, _, conditions, message in rules:
+            for column, op, _ in conditions:
+                if op not in _OPERATORS:
+                    raise ValueError(f'rule {message!r}: unknown operator {op!r} (expected one of {list(_OPERATORS)})')
+        # Stable sort: rules of equal priority keep their table order
+        rules.sort(key=lambda rule: -rule[0])
+        self.rules = rules
+        self.messages = [rule[4] for rule in rules]
+        self.targets = sorted({rule[1] for rule in rules})
+        self.columns = sorted({column for rule in rules for column, _, _ in rule[3]})
+        self._compiled = [(target, float(min_risk), [(column, _OPERATORS[op], float(value))
+                                                     for column, op, value in conditions], message)
+                          for _, target, min_risk, conditions, message in rules]
+
+    @classmethod
+    def from_json(cls, path):
+        entries = json.loads(Path(path).read_text())
+        return cls([(entry.get('priority', 0), entry['target'], entry.get('min_risk', 0),
+                     tuple(tuple(condition) for condition in entry.get('when', ())), entry['message'])
+                    for entry in entries])
+
+    def recommend(self, risks, inputs):
+        """Ranked messages for one record: ``risks`` maps targets to percentages, ``inputs`` is the input dict."""
+        recs = []
+        values = {}
+        for target, min_risk, conditions, message in self._compiled:
+            if not risks.get(target, 0) > min_risk:
+                continue
+            for column, op, value in conditions:
+                if column not in values:
+                    values[column] = to_code(column, inputs.get(column, 0))
+                if not op(values[column], value):
+                    break
+            else:
+                recs.append(message)
+        return recs
+
+    def matches(self, risks, columns, n):
+        """(n, n_rules) boolean matrix of the rules that fire, columns in ranking order.
+
+        ``risks`` maps targets to length-``n`` arrays of percentages and
+        ``columns`` maps input keys to length-``n`` sequences.
+        """
+        risk = {target: np.asarray(risks[target], dtype=np.float64) if target in risks else np.zeros(n)
+                for target in self.targets}
+        values = {column: _input_column(column, columns.get(column), n) for column in self.columns}
+        fired = np.empty((n, len(self._compiled)), dtype=bool)
+        for j, (target, min_risk, conditions, _) in enumerate(self._compiled):
+            mask = risk[target] > min_risk
+            for column, op, value in conditions:
+                mask &= op(values[column], value)
+            fired[:, j] = mask
+        return fired
+
+    def recommend_many(self, risks, columns, n):
+        """:meth:`recommend` for ``n`` records given column-wise; returns one list of messages per record."""
+        fired = self.matches(risks, columns, n)
+        if not n:
+            return []
+        # Records that fire the same rules share one ranked message list: each row's rules are
+        # packed into one integer (bit j = rule j), so grouping them is a 1-D np.unique
+        if fired.shape[1] < 63:
+            codes = fired.astype(np.int64) @ (np.int64(1) << np.arange(fired.shape[1], dtype=np.int64))
+            patterns, inverse = np.unique(codes, return_inverse=True)
+            patterns = [[j for j in range(fired.shape[1]) if code >> j & 1] for code in patterns.tolist()]
+        else:
+            patterns, inverse = np.unique(fired, axis=0, return_inverse=True)
+            patterns = [np.flatnonzero(pattern).tolist() for pattern in patterns]
+        ranked = [[self.messages[j] for j in pattern] for pattern in patterns]
+        return [list(ranked[k]) for k in inverse.ravel().tolist()]
+
+
+_rule_set = None
+_rule_set_lock = threading.Lock()
+
+
+def get_rule_set():
+    """The process-wide :class:`RuleSet`: ``RECOMMENDATION_RULES`` (a JSON file) or :data:`RULES`."""
+    global _rule_set
+    if _rule_set is None:
+        with _rule_set_lock:
+            if _rule_set is None:
+                path = os.environ.get('RECOMMENDATION_RULES', '').strip()
+                _rule_set = RuleSet.from_json(path) if path else RuleSet()
+                if path:
+                    logger.info('Loaded %d recommendation rules from %s', len(_rule_set.rules), path)
+    return _rule_set
+
 
 def get_recommendations(risks, inputs):
-    recs = []
-    
-    if risks['diabetes'] > 60:
-        recs.append("Reduce sugar & refined carbs")
-        recs.append("Walk 30 min daily")
-        if inputs['BMI'] > 30:
-            recs.append("Aim to lose 5-7% body weight")
-    
-    if risks['heart_disease'] > 60:
-        recs.append("Limit salt <2g/day")
-        recs.append("Eat oats, nuts, and olive oil")
-        if inputs['Smoking'] == 1:
-            recs.append("Quit smoking immediately")
-    
-    if risks['stroke'] > 60:
-        recs.append("Control blood pressure daily")
-        recs.append("Manage stress with meditation")
-    
-    return recs[:3]
\ No newline at end of file
+    return get_rule_set().recommend(risks, inputs)
+
+
+def get_recommendations_batch(risks, inputs):
+    """Recommendations for parallel lists of risk dicts and input dicts."""
+    rules = get_rule_set()
+    n = len(risks)
+    columns = {column: [record.get(column, 0) for record in inputs] for column in rules.columns}
+    risk_columns = {target: [r.get(target, 0) for r in risks] for target in rules.targets}
+    return rules.recommend_many(risk_columns, columns, n)
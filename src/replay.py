@@ -0,0 +1,251 @@
+# src/replay.py
+"""Replay audit-logged traffic against ``/predict`` as a load test.
+
+    python src/replay.py logs/ --url http://127.0.0.1:8000 --qps 200 --duration 60
+    python src/replay.py logs/audit.*.ndjson* --url http://127.0.0.1:8000 --concurrency 16
+    python src/replay.py logs/ --in-process --batch 100 --requests 500
+
+Reads the NDJSON files of ``src/audit_log.py``: a directory, files or globs,
+with gzipped rotations included, oldest first. It re-sends each logged request body,
+either as logged or regrouped into ``/predict/batch`` requests of ``--batch``
+records. ``--url`` targets a running server; ``--in-process`` scores through
+the Flask app in this process instead (no server needed).
+
+``--qps`` sends on a fixed schedule (open loop) from up to ``--concurrency``
+threads. Latency is measured from each request's *scheduled* time, so a
+server that falls behind shows up in the percentiles instead of slowing the
+schedule down. Without ``--qps``, ``--concurrency`` threads send back to back
+(closed loop). The run stops after ``--requests`` requests (default: every
+logged request once, ``--loops`` times) or ``--duration`` seconds.
+"""
+import argparse
+import glob
+import gzip
+import http.client
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+logger = logging.getLogger('app')
+
+PREDICT = '/predict'
+BATCH = '/predict/batch'
+
+
+def log_files(paths):
+    """The audit log files named by ``paths`` (files, directories or globs), oldest first."""
+    files = set()
+    for pattern in paths:
+        for match in glob.glob(str(pattern)) or [pattern]:
+            path = Path(match)
+            if path.is_dir():
+                files.update(p for p in path.iterdir()
+                             if p.is_file() and '.ndjson' in p.name and not p.name.endswith('.tmp'))
+            elif path.is_file():
+                files.add(path)
+            else:
+                raise FileNotFoundError(f'no audit log at {match}')
+    return sorted(files, key=lambda p: (p.stat().st_mtime, p.name))
+
+
+def iter_events(paths):
+    """Yield the events of the audit logs; unreadable lines are skipped with a warning."""
+    for path in log_files(paths):
+        opener = gzip.open if path.suffix == '.gz' else open
+        bad = 0
+        with opener(path, 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    bad += 1
+        if bad:
+            logger.warning('Skipped %d unreadable lines of %s', bad, path)
+
+
+def load_requests(paths, batch=0, limit=None):
+    """``[(route, body bytes, content type)]`` to replay from the audit logs.
+
+    With ``batch``, the logged records (singles and the records of logged
+    batches) are regrouped into NDJSON ``/predict/batch`` bodies of ``batch`` records.
+    """
+    try:
+        from src.api import parse_batch_body
+    except ImportError:
+        from api import parse_batch_body
+
+    requests, records = [], []
+    for event in iter_events(paths):
+        route = event.get('route')
+        if route == PREDICT and 'request' in event:
+            if batch:
+                records.append(event['request'])
+            else:
+                requests.append((PREDICT, json.dumps(event['request']).encode(), 'application/json'))
+        elif route == BATCH and 'body' in event:
+            if batch:
+                try:
+                    records.extend(parse_batch_body(event['body'], event.get('mimetype', ''))[0])
+                except ValueError:
+                    continue  # a body the server rejected as a whole; nothing to regroup
+            else:
+                requests.append((BATCH, event['body'].encode(), event.get('mimetype') or 'application/json'))
+        if limit is not None and len(requests) >= limit:
+            break
+    for start in range(0, len(records), batch or 1):
+        chunk = records[start:start + batch]
+        requests.append((BATCH, ''.join(json.dumps(r) + '\n' for r in chunk).encode(), 'application/x-ndjson'))
+    return requests[:limit]
+
+
+class HttpSender:
+    """POSTs to a running server over one keep-alive connection per thread."""
+
+    def __init__(self, url, timeout=30.0):
+        parts = urlsplit(url)
+        self.connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                 else http.client.HTTPConnection)
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __call__(self, route, body, content_type):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(self.netloc, timeout=self.timeout)
+        try:
+            connection.request('POST', self.prefix + route, body, {'Content-Type': content_type})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+class InProcessSender:
+    """POSTs through the Flask app of this process (its test client), no server involved."""
+
+    def __init__(self):
+        try:
+            from app import app
+        except ImportError:
+            sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+            from app import app
+        self.app = app
+        self._local = threading.local()
+
+    def __call__(self, route, body, content_type):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client.post(route, data=body, content_type=content_type).status_code
+
+
+def replay(requests, send, total, qps=None, concurrency=8, duration=None):
+    """Send ``total`` requests (cycling through ``requests``) and return the run's summary."""
+    if not requests:
+        raise ValueError('nothing to replay: no /predict events in the audit logs')
+    latencies = np.full(total, np.nan)
+    statuses = [None] * total
+    counter = iter(range(total))
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            scheduled = start + i / qps if qps else time.perf_counter()
+            if deadline is not None and scheduled >= deadline:
+                return
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                statuses[i] = send(*requests[i % len(requests)])
+            except Exception as e:
+                statuses[i] = type(e).__name__
+            latencies[i] = time.perf_counter() - scheduled
+
+    with ThreadPoolExecutor(concurrency, thread_name_prefix='replay') as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - start
+    sent = ~np.isnan(latencies)
+    done = latencies[sent] * 1000
+    by_status = {}
+    for status in statuses:
+        if status is not None:
+            by_status[str(status)] = by_status.get(str(status), 0) + 1
+    return {
+        'requests': int(sent.sum()),
+        'status': dict(sorted(by_status.items())),
+        'seconds': round(wall, 3),
+        'achieved_qps': round(sent.sum() / wall, 1) if wall else 0.0,
+        'target_qps': qps,
+        'concurrency': concurrency,
+        'latency_ms': {name: round(float(np.percentile(done, q)), 3) if len(done) else None
+                       for name, q in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))},
+    }
+
+
+def format_summary(summary):
+    lat = summary['latency_ms']
+    status = ', '.join(f'{code}: {n}' for code, n in summary['status'].items())
+    return (f"{summary['requests']} requests in {summary['seconds']}s ({summary['achieved_qps']} req/s"
+            f"{', target ' + str(summary['target_qps']) if summary['target_qps'] else ''}); status {status}\n"
+            f"latency ms: p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay audit-logged /predict traffic as a load test.')
+    parser.add_argument('logs', nargs='+', help='audit log files, directories or globs')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='base URL of a running server, e.g. http://127.0.0.1:8000')
+    target.add_argument('--in-process', action='store_true', help='score through the Flask app in this process')
+    parser.add_argument('--qps', type=float, help='send at this fixed rate (open loop)')
+    parser.add_argument('--concurrency', type=int, default=8, help='sending threads (default: %(default)s)')
+    parser.add_argument('--requests', type=int, help='requests to send (default: every logged request, --loops times)')
+    parser.add_argument('--loops', type=int, default=1, help='passes over the logged requests (default: %(default)s)')
+    parser.add_argument('--duration', type=float, help='stop after this many seconds')
+    parser.add_argument('--batch', type=int, default=0,
+                        help='regroup the logged records into /predict/batch requests of this size')
+    parser.add_argument('--limit', type=int, help='read at most this many requests from the logs')
+    parser.add_argument('--timeout', type=float, default=30.0, help='HTTP timeout in seconds (default: %(default)s)')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args(argv)
+
+    try:
+        requests = load_requests(args.logs, batch=args.batch, limit=args.limit)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if not requests:
+        print('no /predict events in the audit logs', file=sys.stderr)
+        return 1
+    send = HttpSender(args.url, args.timeout) if args.url else InProcessSender()
+    total = args.requests or len(requests) * args.loops
+    if args.duration and args.qps and not args.requests:
+        total = int(args.duration * args.qps)
+    summary = replay(requests, send, total, qps=args.qps, concurrency=args.concurrency, duration=args.duration)
+    print(json.dumps(summary, indent=2) if args.json else format_summary(summary))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
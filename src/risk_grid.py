@@ -0,0 +1,515 @@
+# src/risk_grid.py
+"""Precomputed risk lookup for the single-record ``predict_risk`` path.
+
+    python src/risk_grid.py build requests.ndjson --out artifacts/risk_grid [--max-error 1] \\
+        [--tolerance Glucose=5 ...] [--axes diabetes=HbA1c,Glucose ...] [--holdout 0.2]
+    python src/risk_grid.py report artifacts/risk_grid other_requests.ndjson [--json]
+
+Each target of the chronic model depends almost entirely on one or two
+inputs (HbA1c and glucose for diabetes, systolic pressure for heart disease,
+cholesterol for stroke). So the grid of a target is a small dense array
+over those inputs, its *axes*. Each axis is cut at the thresholds that
+target's trees split on, because the model output only changes where an
+input crosses one. ``--tolerance`` (raw units) merges thresholds closer
+than that into wider cells.
+
+``build`` scores a population of records with the exact model: past
+``/predict`` bodies as NDJSON, or a CSV/Parquet extract as ``bulk_score.py``
+reads it. The axes of each target are the inputs that explain most of its
+variance on the population, unless ``--axes`` names them. A cell holding at
+least ``--min-count`` of those records is then checked against the trees
+themselves, not against the records: every leaf reachable with the axes
+inside the cell and *any* value of the other inputs (missing ones included)
+bounds the risk there. The cell is filled, with the middle of that range,
+only when no input can move the risk more than ``--max-error`` points away
+from it. Every other cell is left empty, because the remaining inputs
+matter there; lookups that land in it fall back to the model. So the error
+bound holds for every request, in or out of the population's distribution;
+the hit rate does not. ``report.json`` (written by the build) measures the
+hit rate and the error against the exact model on a holdout split, so it
+only describes traffic like the population.
+
+The grid is a few ``.npy`` files of some kB that every worker memory-maps
+read-only. It is only used with the model files it was built from.
+Serving: ``PREDICT_GRID=artifacts/risk_grid``. ``predict_risk`` looks the
+aligned row up before the prediction cache and the model, and falls back to
+them on a miss.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from src.lean_model import compile_forest
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from lean_model import compile_forest
+
+logger = logging.getLogger('app')
+
+# 2: cells are verified over every input (grids of format 1 only agreed with their build population)
+FORMAT_VERSION = 2
+META_FILE = 'meta.json'
+REPORT_FILE = 'report.json'
+# The grid is only valid for the model + preprocessor it was built from
+MODEL_ROLES = ('chronic_model', 'preprocessor')
+# Cells hold risks in tenths of a percent (what predict_risk rounds to); EMPTY cells are left to the model
+EMPTY = np.iinfo(np.uint16).max
+DEFAULT_MAX_AXES = 2
+MAX_CELLS = 1 << 20
+# Widens the verified margin range for the float32 sums of the model's own predict_proba
+MARGIN_SLACK = 1e-4
+
+
+def merge_edges(edges, tolerance):
+    """Drop every threshold closer than ``tolerance`` to the previous kept one."""
+    if tolerance <= 0 or len(edges) < 2:
+        return edges
+    kept = [edges[0]]
+    for edge in edges[1:]:
+        if edge - kept[-1] >= tolerance:
+            kept.append(edge)
+    return np.asarray(kept, dtype=edges.dtype)
+
+
+def cell_index(X, columns, edges):
+    """Flat cell index of every row of ``X`` on the given axes (-1 where an axis value is missing).
+
+    A tree sends ``x`` right at threshold ``t`` when ``x >= t``, so the
+    interval of ``x`` is the number of thresholds at or below it.
+    """
+    index = np.zeros(len(X), dtype=np.int64)
+    missing = np.zeros(len(X), dtype=bool)
+    for column, axis_edges in zip(columns, edges):
+        x = X[:, column]
+        missing |= np.isnan(x)
+        index = index * (len(axis_edges) + 1) + np.searchsorted(axis_edges, x, side='right')
+    index[missing] = -1
+    return index
+
+
+def model_digests(artifacts):
+    """SHA-256 of the model files behind ``artifacts``, by role (see :data:`MODEL_ROLES`).
+
+    A lean export deployed without its pickles carries the digests of the
+    files it was exported from.
+    """
+    digests = {role: artifacts.digests[role] for role in MODEL_ROLES if role in artifacts.digests}
+    if len(digests) < len(MODEL_ROLES) and 'lean' in artifacts.paths:
+        source = json.loads(Path(artifacts.paths['lean']).read_text()).get('source_digests', {})
+        for role in MODEL_ROLES:
+            if role in source:
+                digests.setdefault(role, source[role])
+    return digests
+
+
+class TargetGrid:
+    """The grid of one target: the thresholds of each axis and the flat array of cell risks."""
+
+    def __init__(self, name, columns, edges, values):
+        self.name = name
+        self.columns = list(columns)
+        self.edges = list(edges)
+        self.values = values
+
+    def lookup_one(self, row):
+        index = 0
+        for column, axis_edges in zip(self.columns, self.edges):
+            x = row[column]
+            if x != x:
+                return EMPTY
+            index = index * (len(axis_edges) + 1) + int(axis_edges.searchsorted(x, side='right'))
+        return self.values[index]
+
+    def lookup(self, X):
+        index = cell_index(X, self.columns, self.edges)
+        values = np.full(len(X), EMPTY, dtype=np.uint16)
+        found = index >= 0
+        values[found] = self.values[index[found]]
+        return values
+
+
+class RiskGrid:
+    """Per-target lookup grids; see the module docstring."""
+
+    def __init__(self, meta, targets):
+        self.meta = meta
+        self.targets = targets
+        self._checked = (None, False)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        directory = Path(directory)
+        meta = json.loads((directory / META_FILE).read_text())
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"unsupported risk grid format {meta.get('format_version')!r}")
+        mode = 'r' if mmap else None
+        targets = []
+        for spec in meta['targets']:
+            edges = [np.load(directory / name) for name in spec['edges']]
+            values = np.asarray(np.load(directory / spec['values'], mmap_mode=mode))
+            targets.append(TargetGrid(spec['name'], spec['columns'], edges, values))
+        return cls(meta, targets)
+
+    def matches(self, artifacts):
+        """Whether ``artifacts`` were loaded from the model files this grid was built from."""
+        checked, ok = self._checked
+        if checked is not artifacts:
+            ok = artifacts.plan is not None and model_digests(artifacts) == self.meta['model_digests']
+            if not ok:
+                logger.warning('Risk grid was built for other model files; not using it with model v%s',
+                               artifacts.version)
+            self._checked = (artifacts, ok)
+        return ok
+
+    def lookup(self, artifacts, X):
+        """Risks of the one-row model input ``X`` as ``predict_risk`` returns them, or None outside the grid."""
+        if not self.matches(artifacts):
+            return None
+        row = X[0]
+        risks = {}
+        for grid in self.targets:
+            value = grid.lookup_one(row)
+            if value == EMPTY:
+                return None
+            risks[grid.name] = int(value) / 10
+        return risks
+
+    def lookup_many(self, X):
+        """``(hit, risks)``: the rows of ``X`` found for every target, and their (hits, n_targets) risks."""
+        values = np.column_stack([grid.lookup(X) for grid in self.targets])
+        hit = (values != EMPTY).all(axis=1)
+        return hit, values[hit].astype(np.float64) / 10
+
+
+def grid_from_env():
+    """Load the grid named by ``PREDICT_GRID`` (a directory), or None when unset or unreadable."""
+    directory = os.environ.get('PREDICT_GRID', '').strip()
+    if not directory:
+        return None
+    try:
+        grid = RiskGrid.load(directory)
+    except (OSError, ValueError, KeyError):
+        logger.exception('Could not load risk grid %s; scoring every request with the model', directory)
+        return None
+    logger.info('Risk grid enabled (%s, max error %s points)', directory, grid.meta['max_error'])
+    return grid
+
+
+def _risk_tenths(p):
+    # exactly predict_risk's rounding, in tenths of a percent
+    return np.array([round(round(float(v) * 100, 1) * 10) for v in p], dtype=np.int64)
+
+
+def _sigmoid(margin):
+    return 1.0 / (1.0 + np.exp(-margin))
+
+
+def cell_boxes(n_features, columns, edges, cells):
+    """``(lower, upper)`` of the given flat cells: ``lower <= x < upper`` on the axes, unbounded on other inputs."""
+    lower = np.full((len(cells), n_features), -np.inf)
+    upper = np.full((len(cells), n_features), np.inf)
+    positions = np.unravel_index(cells, [len(e) + 1 for e in edges]) if len(edges) else ()
+    for column, axis_edges, position in zip(columns, edges, positions):
+        bounds = np.concatenate([[-np.inf], axis_edges.astype(np.float64), [np.inf]])
+        lower[:, column], upper[:, column] = bounds[position], bounds[position + 1]
+    return lower, upper
+
+
+def _within_cell_sse(index, risks, n_cells):
+    counts = np.bincount(index, minlength=n_cells)
+    sums = np.bincount(index, weights=risks, minlength=n_cells)
+    squares = np.bincount(index, weights=risks.astype(np.float64) ** 2, minlength=n_cells)
+    used = counts > 0
+    return float((squares[used] - sums[used] ** 2 / counts[used]).sum())
+
+
+def pick_axes(X, risks, thresholds, max_axes=DEFAULT_MAX_AXES):
+    """Greedily pick the columns whose cells leave the least variance of ``risks`` within a cell."""
+    axes = []
+    candidates = [j for j, edges in enumerate(thresholds) if len(edges)]
+    while len(axes) < max_axes and candidates:
+        best = None
+        for j in candidates:
+            columns = axes + [j]
+            edges = [thresholds[c] for c in columns]
+            n_cells = math.prod(len(e) + 1 for e in edges)
+            if n_cells > MAX_CELLS:
+                continue
+            index = cell_index(X, columns, edges)
+            found = index >= 0
+            sse = _within_cell_sse(index[found], risks[found], n_cells)
+            if best is None or sse < best[0]:
+                best = (sse, j)
+        if best is None:
+            break
+        axes.append(best[1])
+        candidates.remove(best[1])
+        if best[0] == 0:
+            break
+    return axes
+
+
+def build_grid(artifacts, X, out_dir, max_error=1.0, tolerance=None, axes=None, min_count=1,
+               max_axes=DEFAULT_MAX_AXES):
+    """Build the grid from the population ``X`` (aligned model input) and write it to ``out_dir``.
+
+    ``max_error`` is in risk percentage points. ``tolerance`` maps numeric
+    input columns to a threshold merge distance in raw units, and ``axes``
+    maps target names to the model input columns of their grid.
+    """
+    try:
+        from src.prediction import TARGET_NAMES, _predict_matrix
+    except ImportError:
+        from prediction import TARGET_NAMES, _predict_matrix
+
+    if artifacts.plan is None:
+        raise ValueError('the risk grid needs a model with a preprocessor (multi_output or lean backend)')
+    digests = model_digests(artifacts)
+    missing_roles = [role for role in MODEL_ROLES if role not in digests]
+    if missing_roles:
+        raise ValueError(f"cannot tie the grid to the model files: no {', '.join(missing_roles)} digest")
+    plan = artifacts.plan
+    names = plan.feature_names
+    num_columns = [rule.column for rule in plan.num_rules]
+    tolerance, axes = dict(tolerance or {}), dict(axes or {})
+    unknown = sorted(set(tolerance) - set(num_columns)) + sorted(
+        {c for columns in axes.values() for c in columns} - set(names))
+    if unknown:
+        raise ValueError(f'unknown model input {unknown} (expected some of {names})')
+    unknown = sorted(set(axes) - set(TARGET_NAMES))
+    if unknown:
+        raise ValueError(f'unknown target {unknown} (expected some of {TARGET_NAMES})')
+
+    X = np.asarray(X, dtype=np.float32)
+    scores = _predict_matrix(artifacts, X)
+    forest = compile_forest(artifacts.chronic_model)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    max_tenths = int(round(max_error * 10))
+    specs = []
+    for t, name in enumerate(TARGET_NAMES):
+        thresholds = forest.split_thresholds(t)
+        for j, column in enumerate(num_columns):
+            if column in tolerance:
+                # thresholds live in the scaled model input space
+                thresholds[j] = merge_edges(thresholds[j], tolerance[column] / abs(plan.num_scale[j]))
+        risks = _risk_tenths(scores[name])
+        columns = ([names.index(c) for c in axes[name]] if name in axes
+                   else pick_axes(X, risks, thresholds, max_axes))
+        edges = [thresholds[j].astype(np.float32) for j in columns]
+        n_cells = math.prod(len(e) + 1 for e in edges)
+        if n_cells > MAX_CELLS:
+            raise ValueError(f'{name}: {n_cells} cells on {[names[j] for j in columns]}; '
+                             f'use fewer axes or a larger --tolerance')
+        index = cell_index(X, columns, edges)
+        counts = np.bincount(index[index >= 0], minlength=n_cells)
+        # Only the cells whose risk provably stays within max_error of one value, whatever the other inputs are
+        cells = np.flatnonzero(counts >= min_count)
+        lower, upper = cell_boxes(forest.n_features, columns, edges, cells)
+        may_be_missing = np.ones(forest.n_features, dtype=bool)
+        may_be_missing[columns] = False  # a missing axis value is a miss
+        lo, hi = forest.margin_bounds(t, lower, upper, may_be_missing)
+        lo, hi = _risk_tenths(_sigmoid(lo - MARGIN_SLACK)), _risk_tenths(_sigmoid(hi + MARGIN_SLACK))
+        middle = (lo + hi + 1) // 2
+        verified = np.maximum(middle - lo, hi - middle) <= max_tenths
+        keep = np.zeros(n_cells, dtype=bool)
+        keep[cells[verified]] = True
+        values = np.full(n_cells, EMPTY, dtype=np.uint16)
+        values[cells[verified]] = middle[verified].astype(np.uint16)
+
+        files = []
+        for a, axis_edges in enumerate(edges):
+            files.append(f'{name}_edges_{a}.npy')
+            np.save(out_dir / files[-1], axis_edges)
+        # written under a temporary name and renamed, like the lean export
+        tmp = out_dir / f'{name}_values.tmp.npy'
+        np.save(tmp, values)
+        tmp.replace(out_dir / f'{name}_values.npy')
+        specs.append({'name': name, 'columns': [int(j) for j in columns], 'axes': [names[j] for j in columns],
+                      'shape': [len(e) + 1 for e in edges], 'edges': files, 'values': f'{name}_values.npy',
+                      'cells_filled': int(keep.sum()), 'records_covered': int(counts[keep].sum())})
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'targets': specs,
+        'max_error': max_error,
+        'tolerance': tolerance,
+        'min_count': min_count,
+        'population': int(len(X)),
+        'model_digests': digests,
+    }
+    # meta.json goes last: a directory without it is not a grid yet
+    tmp = out_dir / f'{META_FILE}.tmp'
+    tmp.write_text(json.dumps(meta, indent=2))
+    tmp.replace(out_dir / META_FILE)
+    return RiskGrid.load(out_dir)
+
+
+def accuracy_report(grid, artifacts, X, timing_rows=200):
+    """Hit rate of ``grid`` on ``X`` and its error (risk percentage points) against the exact model."""
+    try:
+        from src.prediction import _predict_matrix
+    except ImportError:
+        from prediction import _predict_matrix
+
+    X = np.asarray(X, dtype=np.float32)
+    hit, grid_risks = grid.lookup_many(X)
+    scores = _predict_matrix(artifacts, X[hit]) if hit.any() else None
+    errors = {}
+    for t, target in enumerate(grid.targets):
+        if scores is None:
+            errors[target.name] = {'mean': None, 'p99': None, 'max': None}
+            continue
+        err = np.abs(np.rint(grid_risks[:, t] * 10) - _risk_tenths(scores[target.name])) / 10
+        errors[target.name] = {'mean': round(float(err.mean()), 3), 'p99': round(float(np.percentile(err, 99)), 3),
+                               'max': round(float(err.max()), 3)}
+
+    sample = X[:timing_rows]
+    started = time.perf_counter()
+    for i in range(len(sample)):
+        grid.lookup(artifacts, sample[i:i + 1])
+    lookup_us = (time.perf_counter() - started) / max(len(sample), 1) * 1e6
+    started = time.perf_counter()
+    for i in range(len(sample)):
+        _predict_matrix(artifacts, sample[i:i + 1])
+    model_us = (time.perf_counter() - started) / max(len(sample), 1) * 1e6
+    return {
+        'records': int(len(X)),
+        'hits': int(hit.sum()),
+        'hit_rate': round(float(hit.mean()), 4) if len(X) else 0.0,
+        'abs_error': errors,
+        'lookup_us': round(lookup_us, 1),
+        'model_us': round(model_us, 1),
+        'backend': artifacts.backend,
+    }
+
+
+def load_population(path, artifacts, limit=None):
+    """Aligned model input of the records in ``path``.
+
+    ``.ndjson``/``.jsonl``/``.json`` files hold ``/predict`` form bodies and
+    go through request validation; CSV/Parquet extracts are read the way
+    ``bulk_score.py`` reads them.
+    """
+    path = Path(path)
+    if path.suffix.lower() in ('.ndjson', '.jsonl', '.json'):
+        try:
+            from src.api import parse_batch_body
+            from src.validation import get_schema
+        except ImportError:
+            from api import parse_batch_body
+            from validation import get_schema
+        mimetype = 'application/json' if path.suffix.lower() == '.json' else 'application/x-ndjson'
+        records, _ = parse_batch_body(path.read_text(), mimetype)
+        batch, _, invalid = get_schema(artifacts).validate_many(records[:limit])
+        if invalid:
+            logger.warning('Skipped %d invalid records of %s', len(invalid), path)
+        return batch.matrix
+    try:
+        from src.bulk_score import iter_chunks, normalize_columns
+        from src.feature_pipeline import INPUT_COLUMNS
+    except ImportError:
+        from bulk_score import iter_chunks, normalize_columns
+        from feature_pipeline import INPUT_COLUMNS
+    parts, n = [], 0
+    for chunk in iter_chunks(path, 100_000):
+        chunk = normalize_columns(chunk)
+        if limit is not None:
+            chunk = chunk.iloc[:limit - n]
+        columns = {c: chunk[c].to_numpy() for c in INPUT_COLUMNS if c in chunk.columns}
+        parts.append(artifacts.plan.transform_columns(columns, len(chunk)))
+        n += len(chunk)
+        if limit is not None and n >= limit:
+            break
+    return np.vstack(parts) if parts else np.empty((0, artifacts.plan.n_features), dtype=np.float32)
+
+
+def _parse_pairs(items, option, convert):
+    parsed = {}
+    for item in items or ():
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise SystemExit(f'{option} expects NAME=VALUE, got {item!r}')
+        parsed[key.strip()] = convert(value)
+    return parsed
+
+
+def format_report(report):
+    lines = [f"{report['hits']}/{report['records']} records in the grid (hit rate {report['hit_rate']:.1%}); "
+             f"lookup {report['lookup_us']} us vs {report['model_us']} us for the {report['backend']} model"]
+    for name, err in report['abs_error'].items():
+        lines.append(f"  {name:<14} |error| mean {err['mean']}  p99 {err['p99']}  max {err['max']} (risk points)")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    try:
+        from src.model_registry import get_registry
+    except ImportError:
+        from model_registry import get_registry
+
+    parser = argparse.ArgumentParser(description='Build or evaluate the precomputed risk lookup grid.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='build the grid from a population of records')
+    build.add_argument('population', help='NDJSON/JSON of /predict bodies, or a CSV/Parquet extract')
+    build.add_argument('--out', default='artifacts/risk_grid', help='grid directory (default: %(default)s)')
+    build.add_argument('--max-error', type=float, default=1.0,
+                       help='leave cells where the risk can be more than this many points off to the model '
+                            '(default: %(default)s)')
+    build.add_argument('--tolerance', action='append', metavar='COLUMN=VALUE',
+                       help='merge thresholds of a numeric input closer than VALUE (raw units); repeatable')
+    build.add_argument('--axes', action='append', metavar='TARGET=COLUMN[,COLUMN]',
+                       help="model inputs of a target's grid instead of the automatic choice; repeatable")
+    build.add_argument('--max-axes', type=int, default=DEFAULT_MAX_AXES,
+                       help='inputs picked per target (default: %(default)s)')
+    build.add_argument('--min-count', type=int, default=1,
+                       help='fill only cells with at least this many records; 0 also fills cells the population '
+                            'never reached (default: %(default)s)')
+    build.add_argument('--holdout', type=float, default=0.2,
+                       help='fraction of the population kept out of the grid for report.json (default: %(default)s)')
+    build.add_argument('--limit', type=int, help='use only the first LIMIT records')
+    build.add_argument('--seed', type=int, default=0, help='seed of the holdout split')
+    report = sub.add_parser('report', help='hit rate and error of a grid against the exact model')
+    report.add_argument('grid', help='grid directory')
+    report.add_argument('records', help='NDJSON/JSON of /predict bodies, or a CSV/Parquet extract')
+    report.add_argument('--limit', type=int, help='use only the first LIMIT records')
+    report.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    artifacts = get_registry().get()
+    if args.command == 'build':
+        X = load_population(args.population, artifacts, args.limit)
+        order = np.random.default_rng(args.seed).permutation(len(X))
+        n_holdout = int(len(X) * args.holdout)
+        holdout, population = X[order[:n_holdout]], X[order[n_holdout:]]
+        grid = build_grid(artifacts, population, args.out, max_error=args.max_error,
+                          tolerance=_parse_pairs(args.tolerance, '--tolerance', float),
+                          axes=_parse_pairs(args.axes, '--axes', lambda v: [c.strip() for c in v.split(',')]),
+                          min_count=args.min_count, max_axes=args.max_axes)
+        for spec in grid.meta['targets']:
+            print(f"{spec['name']}: axes {spec['axes']}, {spec['cells_filled']}/{math.prod(spec['shape'])} "
+                  f"cells filled, covering {spec['records_covered']}/{len(population)} records")
+        if len(holdout):
+            result = accuracy_report(grid, artifacts, holdout)
+            (Path(args.out) / REPORT_FILE).write_text(json.dumps(result, indent=2))
+            print(format_report(result))
+        return 0
+
+    grid = RiskGrid.load(args.grid)
+    if not grid.matches(artifacts):
+        print(f'{args.grid} was built for other model files', file=sys.stderr)
+        return 1
+    result = accuracy_report(grid, artifacts, load_population(args.records, artifacts, args.limit))
+    print(json.dumps(result, indent=2) if args.json else format_report(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
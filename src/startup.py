@@ -0,0 +1,85 @@
+# src/startup.py
+import logging
+import os
+import time
+
+try:
+    from src.memory_report import process_memory
+    from src.model_registry import get_registry
+    from src.prediction import predict_risk_batch
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from memory_report import process_memory
+    from model_registry import get_registry
+    from prediction import predict_risk_batch
+
+logger = logging.getLogger('app')
+
+# Scored once at boot so the first real request does not pay for lazy imports/first-call setup
+WARMUP_RECORD = {
+    'Age': 45, 'Gender': 'Male', 'Glucose': 100, 'HbA1c': 5.6, 'Systolic': 120, 'Diastolic': 80,
+    'BMI': 25, 'Cholesterol': 190, 'Triglycerides': 150, 'Smoking': 0, 'Alcohol': 0,
+    'Physical_Activity': 1, 'Diet_Score': 60, 'Family_History': 0, 'Sleep_Hours': 7,
+    'Stress_Level': 1, 'TC_HDL_Ratio': 4,
+}
+
+
+class StartupReport:
+    """Wall-clock durations of the startup phases of one process, in milliseconds."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.phases = {}
+        self.details = {}
+
+    def record(self, phase, seconds):
+        self.phases[phase] = round(seconds * 1000, 1)
+
+    def as_dict(self):
+        return {'pid': self.pid, 'phases_ms': dict(self.phases),
+                'total_ms': round(sum(self.phases.values()), 1), **self.details}
+
+    def log(self, log=logger):
+        timings = ' '.join(f'{name}={ms}ms' for name, ms in self.phases.items())
+        log.info('Startup (pid %s): %s total=%sms %s', self.pid, timings,
+                 self.as_dict()['total_ms'], self.details)
+
+
+report = StartupReport()
+
+
+def warm_up(registry=None, startup_report=None, explain=False):
+    """Load the model artifacts and score one record before the process takes traffic.
+
+    Returns the :class:`StartupReport` with ``model_load`` and ``warmup_score``
+    phases added (and ``explainer_load`` with ``explain=True``) and the
+    process's private/shared memory afterwards; a failure to load propagates
+    so the worker fails to boot instead of serving 500s.
+    """
+    startup_report = startup_report or report
+    startup_report.pid = os.getpid()  # the app may have been imported before a fork
+    registry = registry or get_registry()
+
+    start = time.perf_counter()
+    artifacts = registry.get()
+    startup_report.record('model_load', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    outcome = predict_risk_batch([WARMUP_RECORD], registry=registry)[0]
+    startup_report.record('warmup_score', time.perf_counter() - start)
+    if 'error' in outcome:
+        raise RuntimeError(f"warm-up scoring failed: {outcome['error']}")
+
+    if explain:
+        try:
+            from src.explainer import explain_batch
+        except ImportError:
+            from explainer import explain_batch
+        start = time.perf_counter()
+        explain_batch([WARMUP_RECORD], registry=registry)
+        startup_report.record('explainer_load', time.perf_counter() - start)
+
+    startup_report.details.update(backend=artifacts.backend, model_version=artifacts.version)
+    memory = process_memory()
+    if memory is not None:
+        startup_report.details.update(private_mb=memory['private_mb'], shared_mb=memory['shared_mb'])
+    return startup_report
@@ -0,0 +1,465 @@
+# src/tuning.py
+"""Hyperparameter search for the chronic (multi-output) model, on cached preprocessed folds.
+
+    python src/tuning.py --data Data/dirty_v3_path.csv --folds 5 --workers 4 --threads-per-model 1
+    python src/tuning.py --param max_depth=4,6,8 --param learning_rate=0.05,0.1 --max-rounds 450 --no-export
+
+Each cross-validation fold is preprocessed once. The notebook's
+ColumnTransformer is fitted on the fold's training rows, and the transformed
+float32 matrices and labels are saved as ``.npy`` files under
+``cache/tuning/<key>/``. The key covers the data file's digest, ``--folds``
+and ``--seed``. Workers memory-map those files, and later runs on the same
+data reuse them.
+
+The candidates are the product of the ``--param`` value lists (default:
+:data:`DEFAULT_SPACE`). They are pruned by successive halving. Every
+candidate first trains ``--min-rounds`` boosting rounds. The best
+1/``--eta`` by mean validation logloss (over folds and targets) go on to
+``--eta`` times as many rounds, up to ``--max-rounds``. A survivor is not
+retrained from round 0: its boosters of the previous rung are saved under
+``boosters/`` and continued for the missing rounds only. One job fits one
+(candidate, rounds, fold, target). Jobs run in ``--workers`` processes, each
+XGBoost model with ``--threads-per-model`` threads.
+
+Every finished job is appended to ``results.ndjson`` next to the folds. An
+interrupted run picks up where it stopped: jobs already in the log are not
+trained again. The winner is refitted on all rows. Its ``preprocessor.pkl``
+and ``chronic_disease_model.pkl`` are copied into ``--export`` (default
+``artifacts``) with :func:`incremental_training.promote`. Each run writes
+``tuning_report.json`` next to the log.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from src.incremental_training import (CHRONIC_TARGETS, MODEL_FILE, PREPROCESSOR_FILE, prepare_chronic_batch,
+                                          promote)
+except ImportError:  # run as `python src/tuning.py`
+    from incremental_training import (CHRONIC_TARGETS, MODEL_FILE, PREPROCESSOR_FILE, prepare_chronic_batch,
+                                      promote)
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = 'Data/dirty_v3_path.csv'
+CACHE_DIR = 'cache/tuning'
+RESULTS_FILE = 'results.ndjson'
+REPORT_FILE = 'tuning_report.json'
+FOLDS_FILE = 'folds.json'
+BEST_DIR = 'best'
+BOOSTERS_DIR = 'boosters'
+# Bump when the cached fold layout or the preprocessing changes, so stale folds are not reused
+FOLD_FORMAT = 1
+
+# Columns of the chronic preprocessor (notebooks/model_training.ipynb), in the fitted frame's order
+NUMERIC_COLUMNS = ['Age', 'Glucose', 'BMI', 'Oxygen Saturation', 'Cholesterol', 'Triglycerides', 'HbA1c',
+                   'Smoking', 'Alcohol', 'Physical Activity', 'Diet Score', 'Family History', 'Stress Level',
+                   'Sleep Hours', 'Systolic_BP', 'Diastolic_BP']
+CATEGORICAL_COLUMNS = ['Gender', 'BMI_Category', 'Age_Group']
+FEATURE_COLUMNS = ['Age', 'Gender', 'Glucose', 'BMI', 'Oxygen Saturation', 'Cholesterol', 'Triglycerides',
+                   'HbA1c', 'Smoking', 'Alcohol', 'Physical Activity', 'Diet Score', 'Family History',
+                   'Stress Level', 'Sleep Hours', 'Systolic_BP', 'Diastolic_BP', 'BMI_Category', 'Age_Group']
+
+# The notebook's XGBClassifier settings that are not searched
+BASE_PARAMS = {'objective': 'binary:logistic', 'eval_metric': 'logloss', 'tree_method': 'hist'}
+
+# Searched by default: the notebook's values and their neighbours. Names are XGBClassifier
+# parameters that xgb.train accepts as well.
+DEFAULT_SPACE = {
+    'max_depth': [4, 6, 8],
+    'learning_rate': [0.05, 0.1, 0.2],
+    'subsample': [0.8, 1.0],
+    'colsample_bytree': [0.8, 1.0],
+}
+
+
+def build_preprocessor():
+    """An unfitted copy of the notebook's ColumnTransformer."""
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    return ColumnTransformer([
+        ('num', StandardScaler(), NUMERIC_COLUMNS),
+        ('cat', OneHotEncoder(drop='first', handle_unknown='ignore'), CATEGORICAL_COLUMNS),
+    ])
+
+
+def _dense(matrix):
+    return np.ascontiguousarray(matrix.toarray() if hasattr(matrix, 'toarray') else matrix, dtype=np.float32)
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_frame(data_path):
+    """The raw extract -> (features frame in :data:`FEATURE_COLUMNS` order, (n, 3) int8 labels)."""
+    import pandas as pd
+
+    X, labels = prepare_chronic_batch(pd.read_csv(data_path))
+    return X[FEATURE_COLUMNS], np.column_stack([labels[name] for name in CHRONIC_TARGETS])
+
+
+def build_folds(data_path, cache_dir=CACHE_DIR, folds=5, seed=42):
+    """Preprocess each fold of ``data_path`` once; returns the fold directory (reused when present).
+
+    Folds are stratified on the combination of the three labels.
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    digest = _file_digest(data_path)
+    key = hashlib.sha256(json.dumps([digest, folds, seed, FOLD_FORMAT]).encode()).hexdigest()[:16]
+    fold_dir = Path(cache_dir) / key
+    if (fold_dir / FOLDS_FILE).exists():
+        logger.info('Reusing the cached folds in %s', fold_dir)
+        return fold_dir
+
+    start = time.perf_counter()
+    X, y = load_frame(data_path)
+    strata = y.astype(np.int64) @ (1 << np.arange(y.shape[1]))
+    # Written to a temporary directory and renamed, so a half-written fold set is never reused
+    tmp_dir = fold_dir.with_name(key + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    for k, (train, valid) in enumerate(splitter.split(X, strata)):
+        preprocessor = build_preprocessor()
+        np.save(tmp_dir / f'fold{k}_X_train.npy', _dense(preprocessor.fit_transform(X.iloc[train])))
+        np.save(tmp_dir / f'fold{k}_X_valid.npy', _dense(preprocessor.transform(X.iloc[valid])))
+        np.save(tmp_dir / f'fold{k}_y_train.npy', y[train])
+        np.save(tmp_dir / f'fold{k}_y_valid.npy', y[valid])
+    (tmp_dir / FOLDS_FILE).write_text(json.dumps({
+        'data': str(data_path), 'data_digest': digest, 'folds': folds, 'seed': seed, 'rows': len(X),
+        'targets': list(CHRONIC_TARGETS), 'format': FOLD_FORMAT,
+        'seconds': round(time.perf_counter() - start, 3)}, indent=2))
+    shutil.rmtree(fold_dir, ignore_errors=True)
+    os.replace(tmp_dir, fold_dir)
+    logger.info('Preprocessed %d folds of %d rows into %s in %.1fs', folds, len(X), fold_dir,
+                time.perf_counter() - start)
+    return fold_dir
+
+
+def candidate_grid(space):
+    """``[(candidate id, params)]`` for the product of ``space``'s value lists, in a stable order."""
+    names = sorted(space)
+    candidates = []
+    for values in itertools.product(*(space[name] for name in names)):
+        params = dict(zip(names, values))
+        cid = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+        candidates.append((cid, params))
+    return candidates
+
+
+def rung_rounds(min_rounds, max_rounds, eta):
+    """Boosting rounds of each successive-halving rung: ``min_rounds * eta**i``, capped at ``max_rounds``."""
+    rounds = []
+    r = min_rounds
+    while r < max_rounds:
+        rounds.append(r)
+        r *= eta
+    return rounds + [max_rounds]
+
+
+# Per process: (fold dir, fold, target, max_bin) -> (dtrain, dvalid, valid labels)
+_matrices = {}
+
+
+def _fold_matrices(fold_dir, fold, target, max_bin):
+    import xgboost as xgb
+
+    key = (str(fold_dir), fold, target, max_bin)
+    if key not in _matrices:
+        path = Path(fold_dir)
+        y_train = np.load(path / f'fold{fold}_y_train.npy')[:, target]
+        y_valid = np.load(path / f'fold{fold}_y_valid.npy')[:, target]
+        dtrain = xgb.QuantileDMatrix(np.load(path / f'fold{fold}_X_train.npy', mmap_mode='r'), label=y_train,
+                                     max_bin=max_bin)
+        dvalid = xgb.QuantileDMatrix(np.load(path / f'fold{fold}_X_valid.npy', mmap_mode='r'), label=y_valid,
+                                     ref=dtrain, max_bin=max_bin)
+        _matrices[key] = (dtrain, dvalid, y_valid)
+    return _matrices[key]
+
+
+def _booster_path(fold_dir, cid, fold, target, rounds):
+    return Path(fold_dir) / BOOSTERS_DIR / cid / f'fold{fold}_target{target}_{rounds}.ubj'
+
+
+def fit_job(fold_dir, fold, target, params, rounds, nthread=1, seed=42, cid=None, previous_rounds=0):
+    """Train one target on one cached fold; returns its validation logloss/AUC and train seconds.
+
+    With ``cid``, the booster is saved for the next rung. When the booster of the
+    previous rung (``previous_rounds``) was saved, it is continued for the
+    missing rounds instead of being trained again from round 0.
+    """
+    import xgboost as xgb
+    from sklearn.metrics import log_loss, roc_auc_score
+
+    dtrain, dvalid, y = _fold_matrices(fold_dir, fold, target, params.get('max_bin', 256))
+    init, start_round = None, 0
+    if cid is not None and previous_rounds:
+        previous = _booster_path(fold_dir, cid, fold, target, previous_rounds)
+        if previous.exists():
+            init, start_round = xgb.Booster(model_file=str(previous)), previous_rounds
+    start = time.perf_counter()
+    # A new seed per continuation, so the added rounds do not repeat the first rounds' row samples
+    booster = xgb.train(dict(BASE_PARAMS, **params, nthread=nthread, seed=seed + start_round), dtrain,
+                        num_boost_round=rounds - start_round, xgb_model=init)
+    seconds = time.perf_counter() - start
+    if cid is not None:
+        path = _booster_path(fold_dir, cid, fold, target, rounds)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'.{os.getpid()}.{path.name}')
+        booster.save_model(str(tmp))
+        os.replace(tmp, path)
+    p = booster.predict(dvalid)
+    return {'logloss': float(log_loss(y, p, labels=[0, 1])),
+            'auc': float(roc_auc_score(y, p)) if 0 < y.sum() < len(y) else None,
+            'seconds': round(seconds, 3), 'continued_from': start_round}
+
+
+def _drop_boosters(fold_dir, cid, rounds=None):
+    """Delete a candidate's saved boosters: those of ``rounds``, or all of them."""
+    directory = Path(fold_dir) / BOOSTERS_DIR / cid
+    if rounds is None:
+        shutil.rmtree(directory, ignore_errors=True)
+        return
+    for path in directory.glob(f'fold*_target*_{rounds}.ubj'):
+        path.unlink(missing_ok=True)
+
+
+def _job_key(cid, rounds, fold, target):
+    return f'{cid}/{rounds}/{fold}/{target}'
+
+
+def read_results(path):
+    """The finished jobs of a results log, by job key; unreadable (e.g. half-written) lines are skipped."""
+    done = {}
+    path = Path(path)
+    if not path.exists():
+        return done
+    bad = 0
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+                done[_job_key(record['candidate'], record['rounds'], record['fold'], record['target'])] = record
+            except (ValueError, KeyError, TypeError):
+                bad += line.strip() != ''
+    if bad:
+        logger.warning('Skipped %d unreadable lines of %s', bad, path)
+    return done
+
+
+def _summarize(records):
+    logloss = [r['logloss'] for r in records]
+    per_target = {}
+    for i, name in enumerate(CHRONIC_TARGETS):
+        mine = [r for r in records if r['target'] == i]
+        aucs = [r['auc'] for r in mine if r['auc'] is not None]
+        per_target[name] = {'logloss': round(float(np.mean([r['logloss'] for r in mine])), 6),
+                            'auc': round(float(np.mean(aucs)), 6) if aucs else None}
+    return {'logloss': round(float(np.mean(logloss)), 6), 'targets': per_target}
+
+
+def search(fold_dir, candidates, min_rounds=50, max_rounds=450, eta=3, workers=1, threads_per_model=1,
+           seed=42, log_path=None):
+    """Successive halving over ``candidates`` on the folds in ``fold_dir``; returns the search report."""
+    if eta < 2:
+        raise ValueError('eta must be at least 2')
+    if not candidates:
+        raise ValueError('no candidates to search')
+    fold_dir = Path(fold_dir)
+    meta = json.loads((fold_dir / FOLDS_FILE).read_text())
+    log_path = Path(log_path or fold_dir / RESULTS_FILE)
+    done = read_results(log_path)
+    schedule = rung_rounds(min_rounds, max_rounds, eta)
+    survivors = list(candidates)
+    rungs = []
+    trained = reused = 0
+    train_seconds = 0.0
+    start = time.perf_counter()
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        with open(log_path, 'a', encoding='utf-8') as log:
+            if log.tell() and not log_path.read_bytes().endswith(b'\n'):
+                log.write('\n')  # end the half-written line of an interrupted run
+            for i, rounds in enumerate(schedule):
+                previous_rounds = schedule[i - 1] if i else 0
+                jobs = [(cid, params, fold, target) for cid, params in survivors
+                        for fold in range(meta['folds']) for target in range(len(CHRONIC_TARGETS))]
+                todo = [job for job in jobs if _job_key(job[0], rounds, job[2], job[3]) not in done]
+                reused += len(jobs) - len(todo)
+                logger.info('Rung %d: %d candidates x %d rounds, %d jobs (%d from the log)',
+                            i, len(survivors), rounds, len(jobs), len(jobs) - len(todo))
+
+                def _finish(job, result):
+                    nonlocal trained, train_seconds
+                    cid, params, fold, target = job
+                    record = dict(candidate=cid, params=params, rounds=rounds, fold=fold, target=target, **result)
+                    # One line per job, flushed at once: an interrupted run loses at most the jobs in flight
+                    log.write(json.dumps(record) + '\n')
+                    log.flush()
+                    done[_job_key(cid, rounds, fold, target)] = record
+                    trained += 1
+                    train_seconds += result['seconds']
+
+                if pool is None:
+                    for job in todo:
+                        _finish(job, fit_job(fold_dir, job[2], job[3], job[1], rounds, threads_per_model, seed,
+                                             job[0], previous_rounds))
+                else:
+                    futures = {pool.submit(fit_job, fold_dir, job[2], job[3], job[1], rounds, threads_per_model,
+                                           seed, job[0], previous_rounds): job for job in todo}
+                    for future in as_completed(futures):
+                        _finish(futures[future], future.result())
+
+                scored = {cid: _summarize([done[_job_key(cid, rounds, fold, target)]
+                                           for fold in range(meta['folds'])
+                                           for target in range(len(CHRONIC_TARGETS))])
+                          for cid, _ in survivors}
+                ranked = sorted(survivors, key=lambda c: (scored[c[0]]['logloss'], c[0]))
+                rungs.append({'rounds': rounds, 'candidates': len(ranked),
+                              'ranking': [{'candidate': cid, 'params': params, **scored[cid]}
+                                          for cid, params in ranked]})
+                if i < len(schedule) - 1:
+                    survivors = ranked[:max(1, math.ceil(len(ranked) / eta))]
+                else:
+                    survivors = ranked
+                # The survivors' boosters of this rung are continued by the next one; the rest are not needed
+                for cid, _ in ranked[len(survivors):]:
+                    _drop_boosters(fold_dir, cid)
+                for cid, _ in survivors:
+                    if previous_rounds:
+                        _drop_boosters(fold_dir, cid, previous_rounds)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    best = rungs[-1]['ranking'][0]
+    return {
+        'folds': meta, 'candidates': len(candidates), 'eta': eta, 'workers': workers,
+        'threads_per_model': threads_per_model, 'jobs_trained': trained, 'jobs_reused': reused,
+        'train_seconds': round(train_seconds, 3), 'seconds': round(time.perf_counter() - start, 3),
+        'log': str(log_path),
+        'best': {'candidate': best['candidate'], 'params': best['params'], 'rounds': rungs[-1]['rounds'],
+                 'logloss': best['logloss'], 'targets': best['targets']},
+        'rungs': rungs,
+    }
+
+
+def fit_best(data_path, params, rounds, nthread=None, seed=42):
+    """Refit the preprocessor and the multi-output model with ``params`` on all rows of ``data_path``."""
+    from sklearn.multioutput import MultiOutputClassifier
+    from xgboost import XGBClassifier
+
+    X, y = load_frame(data_path)
+    preprocessor = build_preprocessor()
+    Xt = preprocessor.fit_transform(X)
+    estimator = XGBClassifier(**BASE_PARAMS, **params, n_estimators=rounds, random_state=seed, n_jobs=nthread)
+    model = MultiOutputClassifier(estimator).fit(Xt, y)
+    return model, preprocessor
+
+
+def export_best(data_path, report, fold_dir, export_dir, nthread=None, seed=42):
+    """Refit the winner, keep it under ``<fold_dir>/best/`` and copy it into ``export_dir``."""
+    import joblib
+
+    best = report['best']
+    start = time.perf_counter()
+    model, preprocessor = fit_best(data_path, best['params'], best['rounds'], nthread=nthread, seed=seed)
+    best_dir = Path(fold_dir) / BEST_DIR
+    best_dir.mkdir(exist_ok=True)
+    joblib.dump(preprocessor, best_dir / PREPROCESSOR_FILE)
+    joblib.dump(model, best_dir / MODEL_FILE)
+    Path(export_dir).mkdir(parents=True, exist_ok=True)
+    promote(best_dir, export_dir)
+    logger.info('Exported candidate %s (%d rounds) to %s in %.1fs', best['candidate'], best['rounds'],
+                export_dir, time.perf_counter() - start)
+    return best_dir
+
+
+def parse_space(specs):
+    """``['max_depth=4,6', ...]`` -> ``{'max_depth': [4, 6], ...}``; values are parsed as JSON where possible."""
+    space = {}
+    for spec in specs:
+        name, sep, values = spec.partition('=')
+        if not sep or not name.strip() or not values.strip():
+            raise ValueError(f'expected name=v1,v2,... in --param, got {spec!r}')
+        parsed = []
+        for value in values.split(','):
+            try:
+                parsed.append(json.loads(value))
+            except ValueError:
+                parsed.append(value.strip())
+        space[name.strip()] = parsed
+    return space
+
+
+def format_report(report):
+    best = report['best']
+    lines = [f"{report['candidates']} candidates, {report['jobs_trained']} jobs trained "
+             f"({report['jobs_reused']} from the log) in {report['seconds']}s"]
+    for rung in report['rungs']:
+        top = rung['ranking'][0]
+        lines.append(f"  {rung['rounds']:>5} rounds: {rung['candidates']:>3} candidates, "
+                     f"best {top['candidate']} logloss {top['logloss']:.5f}")
+    lines.append(f"best {best['candidate']} ({best['rounds']} rounds): {json.dumps(best['params'], sort_keys=True)}")
+    for name, metrics in best['targets'].items():
+        lines.append(f"  {name:<17} logloss {metrics['logloss']:.5f}  auc {metrics['auc']}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Successive-halving hyperparameter search for the chronic model.')
+    parser.add_argument('--data', default=DATA_PATH, help=f'raw extract CSV (default: {DATA_PATH})')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help=f'fold cache and results log (default: {CACHE_DIR})')
+    parser.add_argument('--folds', type=int, default=5, help='cross-validation folds (default: %(default)s)')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2',
+                        help='values to search for an XGBoost parameter (repeatable; default: DEFAULT_SPACE)')
+    parser.add_argument('--min-rounds', type=int, default=50, help='boosting rounds of the first rung (default: 50)')
+    parser.add_argument('--max-rounds', type=int, default=450, help='boosting rounds of the last rung (default: 450)')
+    parser.add_argument('--eta', type=int, default=3, help='keep 1/eta of the candidates per rung (default: 3)')
+    parser.add_argument('--workers', type=int, default=1, help='training processes (default: 1)')
+    parser.add_argument('--threads-per-model', type=int, default=1, help='XGBoost threads per job (default: 1)')
+    parser.add_argument('--log', help=f'results log (default: <fold cache>/{RESULTS_FILE})')
+    parser.add_argument('--export', default='artifacts', help='directory to copy the winner into (default: artifacts)')
+    parser.add_argument('--no-export', action='store_true', help='only search; do not refit or export the winner')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    try:
+        space = parse_space(args.param) if args.param else DEFAULT_SPACE
+    except ValueError as e:
+        parser.error(str(e))
+    fold_dir = build_folds(args.data, args.cache_dir, folds=args.folds, seed=args.seed)
+    report = search(fold_dir, candidate_grid(space), min_rounds=args.min_rounds, max_rounds=args.max_rounds,
+                    eta=args.eta, workers=args.workers, threads_per_model=args.threads_per_model,
+                    seed=args.seed, log_path=args.log)
+    if not args.no_export:
+        export_best(args.data, report, fold_dir, args.export, nthread=args.workers * args.threads_per_model,
+                    seed=args.seed)
+        report['exported_to'] = args.export
+    Path(report['log']).with_name(REPORT_FILE).write_text(json.dumps(report, indent=2))
+    print(format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
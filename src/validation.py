@@ -0,0 +1,257 @@
+# src/validation.py
+"""Validation and coercion of ``/predict`` form records.
+
+:class:`InputSchema` is compiled once per loaded model (see
+:func:`get_schema`). Each of the 16 form fields gets its type, its allowed
+range and, for categorical fields, its accepted answers:
+
+* ``gender`` takes the categories of the fitted OneHotEncoder (``categories_``).
+* ``smoking``, ``alcohol``, ``family_history``, ``activity`` and ``stress`` take
+  the answers in ``feature_pipeline.CATEGORY_MAPS``, which are mapped to the codes
+  the models were trained on. The numeric codes are accepted as well.
+
+:meth:`InputSchema.validate` checks and converts a record in one pass
+without pandas and reports every invalid field at once. It returns a
+:class:`ValidatedRecord`: the model input dict, plus the model row the
+alignment plan built from it, so ``predict_risk`` does not convert it again.
+:meth:`InputSchema.validate_many` does the same for a batch and builds one
+matrix for all the valid records.
+"""
+import math
+import threading
+import weakref
+
+try:
+    from src.feature_pipeline import CATEGORY_MAPS
+except ImportError:  # imported as a top-level module with src/ on sys.path
+    from feature_pipeline import CATEGORY_MAPS
+
+# (form field, model input key, kind, minimum, maximum); ranges match the form in templates/index.html
+FIELDS = (
+    ('age', 'Age', 'int', 18, 100),
+    ('gender', 'Gender', 'category', None, None),
+    ('glucose', 'Glucose', 'float', 50, 400),
+    ('hba1c', 'HbA1c', 'float', 3, 15),
+    ('systolic', 'Systolic', 'int', 70, 250),
+    ('diastolic', 'Diastolic', 'int', 40, 150),
+    ('bmi', 'BMI', 'float', 10, 60),
+    ('cholesterol', 'Cholesterol', 'float', 100, 400),
+    ('triglycerides', 'Triglycerides', 'float', 30, 1000),
+    ('smoking', 'Smoking', 'code', None, None),
+    ('alcohol', 'Alcohol', 'code', None, None),
+    ('activity', 'Physical_Activity', 'code', None, None),
+    ('diet_score', 'Diet_Score', 'int', 0, 100),
+    ('family_history', 'Family_History', 'code', None, None),
+    ('sleep', 'Sleep_Hours', 'float', 0, 24),
+    ('stress', 'Stress_Level', 'code', None, None),
+)
+REQUIRED_FIELDS = [name for name, *_ in FIELDS]
+
+
+class ValidationError(ValueError):
+    """A record failed validation; ``fields`` maps each bad form field to what is wrong with it."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        super().__init__('Invalid input: ' + '; '.join(f'{name} {problem}' for name, problem in fields.items()))
+
+    @property
+    def missing(self):
+        return [name for name, problem in self.fields.items() if problem == 'is required']
+
+    def to_dict(self):
+        """The JSON error body: ``error`` (one line for people), ``fields`` and ``missing``."""
+        body = {'error': str(self), 'fields': dict(self.fields)}
+        if self.missing:
+            body['missing'] = self.missing
+        return body
+
+
+class _Invalid(Exception):
+    pass
+
+
+class ValidatedRecord(dict):
+    """Model input dict of a validated record; ``row`` is its model input under ``plan`` (or None)."""
+
+    __slots__ = ('plan', 'row')
+
+
+class ValidatedBatch(list):
+    """The valid records of a batch; ``matrix`` holds their model inputs under ``plan`` (or None)."""
+
+    __slots__ = ('plan', 'matrix')
+
+
+def _number(raw):
+    if isinstance(raw, bool):
+        raise _Invalid('must be a number')
+    if isinstance(raw, (int, float)):
+        value = float(raw)
+    elif isinstance(raw, str):
+        text = raw.strip()
+        # float() also accepts '1_000' and non-ASCII digits; the form never sends those
+        if not text.isascii() or '_' in text:
+            raise _Invalid('must be a number')
+        try:
+            value = float(text)
+        except ValueError:
+            raise _Invalid('must be a number') from None
+    else:
+        raise _Invalid('must be a number')
+    if not math.isfinite(value):
+        raise _Invalid('must be a finite number')
+    return value
+
+
+def _range_check(minimum, maximum):
+    def check(value):
+        if not minimum <= value <= maximum:
+            raise _Invalid(f'must be between {minimum} and {maximum}')
+        return value
+    return check
+
+
+def _float_field(minimum, maximum):
+    check = _range_check(minimum, maximum)
+    return lambda raw: check(_number(raw))
+
+
+def _int_field(minimum, maximum):
+    check = _range_check(minimum, maximum)
+
+    def coerce(raw):
+        value = _number(raw)
+        if not value.is_integer():
+            raise _Invalid('must be a whole number')
+        return int(check(value))
+    return coerce
+
+
+def _choice_field(choices, numeric_codes=()):
+    """Case-insensitive lookup of a text answer; numeric ``numeric_codes`` are accepted as they are."""
+    lookup = {str(answer).strip().lower(): value for answer, value in choices.items()}
+    codes = set(numeric_codes)
+    allowed = ', '.join(sorted({str(answer) for answer in choices} | {str(c) for c in sorted(codes)}))
+
+    def coerce(raw):
+        if isinstance(raw, str):
+            value = lookup.get(raw.strip().lower())
+            if value is not None:
+                return value
+            text = raw.strip()
+            # ASCII digits only, as in _number: isdigit() is also true for '²', which int() rejects
+            if codes and text.isascii() and text.lstrip('-').isdigit() and int(text) in codes:
+                return int(text)
+        elif codes and isinstance(raw, (int, float)) and not isinstance(raw, bool) and raw in codes:
+            return int(raw)
+        raise _Invalid(f'must be one of: {allowed}')
+    return coerce
+
+
+def _encoder_categories(plan, column):
+    """The fitted OneHotEncoder's categories for ``column``, or None when the plan does not encode it."""
+    if plan is None:
+        return None
+    for rule, categories in zip(plan.cat_rules, plan.categories):
+        if rule.source == column:
+            return categories
+    return None
+
+
+class InputSchema:
+    """Compiled checks for the form fields; see the module docstring."""
+
+    def __init__(self, plan=None):
+        self.plan = plan
+        self._steps = []
+        for name, column, kind, minimum, maximum in FIELDS:
+            if kind == 'int':
+                coerce = _int_field(minimum, maximum)
+            elif kind == 'float':
+                coerce = _float_field(minimum, maximum)
+            elif kind == 'category':
+                categories = _encoder_categories(plan, column) or list(CATEGORY_MAPS[column])
+                coerce = _choice_field({c: c for c in categories})
+            else:
+                mapping = CATEGORY_MAPS[column]
+                coerce = _choice_field(mapping, numeric_codes=mapping.values())
+            self._steps.append((name, column, coerce))
+        self._columns = [column for _, column, _ in self._steps] + ['TC_HDL_Ratio']
+
+    def _coerce(self, data):
+        if not isinstance(data, dict):
+            raise ValidationError({'record': 'must be an object with form fields'})
+        record, problems = ValidatedRecord(), {}
+        for name, column, coerce in self._steps:
+            raw = data.get(name)
+            if raw is None or raw == '':
+                problems[name] = 'is required'
+                continue
+            try:
+                record[column] = coerce(raw)
+            except _Invalid as e:
+                problems[name] = str(e)
+        if problems:
+            raise ValidationError(problems)
+        record['TC_HDL_Ratio'] = 0  # not on the form; the alignment plan derives it from Cholesterol
+        record.plan = self.plan
+        record.row = None
+        return record
+
+    def validate(self, data):
+        """Return the :class:`ValidatedRecord` for one form record or raise :class:`ValidationError`."""
+        record = self._coerce(data)
+        if self.plan is not None:
+            record.row = self.plan.transform_one(record)
+        return record
+
+    def validate_many(self, records):
+        """Validate a batch: returns ``(ValidatedBatch, positions, errors)``.
+
+        ``positions[j]`` is the index in ``records`` of the j-th valid record
+        and ``errors`` maps the index of every invalid record to its
+        :class:`ValidationError`.
+        """
+        batch, positions, errors = ValidatedBatch(), [], {}
+        for i, data in enumerate(records):
+            try:
+                batch.append(self._coerce(data))
+            except ValidationError as e:
+                errors[i] = e
+                continue
+            positions.append(i)
+        batch.plan = self.plan
+        batch.matrix = None
+        if self.plan is not None:
+            # The values are clean numbers now, so the plan's vectorized column path applies
+            columns = {column: [record[column] for record in batch] for column in self._columns}
+            batch.matrix = self.plan.transform_columns(columns, len(batch))
+        return batch, positions, errors
+
+
+_schemas = weakref.WeakKeyDictionary()
+_schemas_lock = threading.Lock()
+
+
+def get_schema(artifacts):
+    """The :class:`InputSchema` for a loaded model snapshot, compiled on first use."""
+    schema = _schemas.get(artifacts)
+    if schema is None:
+        with _schemas_lock:
+            schema = _schemas.get(artifacts)
+            if schema is None:
+                schema = _schemas[artifacts] = InputSchema(artifacts.plan)
+    return schema
+
+
+def prealigned(artifacts, records):
+    """The model input validation already built for ``records`` (a ValidatedRecord or ValidatedBatch), or None.
+
+    Only valid while the same snapshot is loaded: after a hot reload the
+    records are aligned again under the new plan.
+    """
+    plan = getattr(records, 'plan', None)
+    if plan is None or plan is not artifacts.plan:
+        return None
+    return records.row if isinstance(records, ValidatedRecord) else records.matrix
@@ -0,0 +1,79 @@
+import json
+import sys
+from pathlib import Path
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from app import app
+
+FORM = {
+    'age': '55', 'gender': 'male', 'glucose': '135', 'hba1c': '6.3',
+    'systolic': '145', 'diastolic': '92', 'bmi': '32', 'cholesterol': '245',
+    'triglycerides': '180', 'smoking': 'yes', 'alcohol': 'no',
+    'activity': 'low', 'diet_score': '45', 'family_history': 'yes',
+    'sleep': '5', 'stress': 'high'
+}
+
+
+def test_predict():
+    with app.test_client() as client:
+        resp = client.post('/predict', json=FORM)
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert set(body['risks']) == {'diabetes', 'heart_disease', 'stroke'}
+    assert isinstance(body['recommendations'], list)
+
+
+def test_predict_batch_json_array_reports_invalid_rows():
+    records = [FORM, {'age': '40'}, dict(FORM, age='old'), 7]
+    with app.test_client() as client:
+        single = client.post('/predict', json=FORM).get_json()
+        resp = client.post('/predict/batch', json=records)
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['count'] == 4 and body['errors'] == 3
+    results = body['results']
+    assert results[0]['risks'] == single['risks']
+    assert results[0]['recommendations'] == single['recommendations']
+    assert 'gender' in results[1]['missing']
+    assert 'error' in results[2] and 'error' in results[3]
+
+
+def test_predict_batch_ndjson():
+    lines = [json.dumps(FORM), '{broken', json.dumps(dict(FORM, gender='female'))]
+    with app.test_client() as client:
+        resp = client.post('/predict/batch', data='\n'.join(lines) + '\n',
+                           content_type='application/x-ndjson')
+    body = resp.get_json()
+    assert resp.status_code == 200
+    assert [('risks' in r) for r in body['results']] == [True, False, True]
+    assert body['results'][1]['error'].startswith('invalid JSON')
+
+
+def test_predict_explain_flag():
+    client = app.test_client()
+    resp = client.post('/predict', json=FORM)
+    assert 'explanations' not in resp.get_json()
+
+    resp = client.post('/predict?explain=1', json=FORM)
+    assert resp.status_code == 200
+    explanations = resp.get_json()['explanations']
+    assert set(explanations) == set(resp.get_json()['risks'])
+    assert all(len(e['contributions']) == 5 for e in explanations.values())
+
+    resp = client.post('/predict/batch?explain=1', json=[FORM, {'age': 40}])
+    results = resp.get_json()['results']
+    assert 'explanations' in results[0] and 'explanations' not in results[1]
+
+
+def test_predict_batch_model_failure_is_a_json_500():
+    from src.api import handle_batch
+
+    class BrokenRegistry:
+        def get(self):
+            raise FileNotFoundError('no model artifacts found')
+
+    body, status = handle_batch(json.dumps([FORM]), 'application/json', BrokenRegistry())
+    assert status == 500 and body == {'error': 'no model artifacts found'}
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import sys
+import threading
+from pathlib import Path
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+import asgi
+from app import app as flask_app
+from asgi import HealthRiskASGI, InferencePool
+
+FORM = {
+    'age': '55', 'gender': 'male', 'glucose': '135', 'hba1c': '6.3',
+    'systolic': '145', 'diastolic': '92', 'bmi': '32', 'cholesterol': '245',
+    'triglycerides': '180', 'smoking': 'yes', 'alcohol': 'no',
+    'activity': 'low', 'diet_score': '45', 'family_history': 'yes',
+    'sleep': '5', 'stress': 'high'
+}
+
+
+class _Lifespan:
+    """Runs the app's lifespan protocol the way an ASGI server does, as a long-lived task."""
+
+    def __init__(self, app):
+        self.events, self.sent = asyncio.Queue(), asyncio.Queue()
+        self.task = asyncio.create_task(app({'type': 'lifespan'}, self.events.get, self.sent.put))
+
+    async def send(self, event):
+        await self.events.put({'type': event})
+        return (await self.sent.get())['type']
+
+
+async def _request(app, method, path, body=b'', content_type='application/json', query=b''):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'headers': [(b'content-type', content_type.encode())]}
+    await app(scope, receive, send)
+    headers = dict(sent[0]['headers'])
+    return sent[0]['status'], headers, sent[1]['body']
+
+
+def _make_app(max_pending=8, **kwargs):
+    return HealthRiskASGI(InferencePool(workers=2, max_pending=max_pending, kind='thread'), **kwargs)
+
+
+def test_asgi_responses_match_flask():
+    async def scenario():
+        app = _make_app()
+        lifespan = _Lifespan(app)
+        assert await lifespan.send('lifespan.startup') == 'lifespan.startup.complete'
+        single = await _request(app, 'POST', '/predict', json.dumps(FORM).encode())
+        batch = await _request(app, 'POST', '/predict/batch', json.dumps([FORM, {'age': '40'}]).encode())
+        bad = await _request(app, 'POST', '/predict', b'{broken')
+        index = await _request(app, 'GET', '/')
+        script = await _request(app, 'GET', '/static/js/main.js')
+        escape = await _request(app, 'GET', '/static/../app.py')
+        wrong_method = await _request(app, 'GET', '/predict')
+        assert await lifespan.send('lifespan.shutdown') == 'lifespan.shutdown.complete'
+        return single, batch, bad, index, script, escape, wrong_method
+
+    single, batch, bad, index, script, escape, wrong_method = asyncio.run(scenario())
+    client = flask_app.test_client()
+    expected = client.post('/predict', json=FORM)
+    assert single[0] == 200 and single[2] == expected.data
+    expected = client.post('/predict/batch', json=[FORM, {'age': '40'}])
+    assert batch[0] == 200 and batch[2] == expected.data
+    assert bad[0] == 400 and json.loads(bad[2]) == client.post('/predict', data='{broken',
+                                                                 content_type='application/json').get_json()
+    assert index[0] == 200 and b'/static/js/main.js' in index[2]
+    assert script[0] == 200 and script[2] == (REPO_ROOT / 'static' / 'js' / 'main.js').read_bytes()
+    assert escape[0] == 404
+    assert wrong_method[0] == 405
+
+
+def test_asgi_backpressure_timeout_and_shutdown(monkeypatch):
+    release = threading.Event()
+
+    def blocking_job(*args):
+        release.wait(5)
+        return 200, b'{}\n'
+
+    monkeypatch.setattr(asgi, 'predict_job', blocking_job)
+
+    async def scenario():
+        app = _make_app(max_pending=1, request_timeout=0.2, shutdown_timeout=5, warm=False)
+        lifespan = _Lifespan(app)
+        await lifespan.send('lifespan.startup')
+        body = json.dumps(FORM).encode()
+        first = asyncio.create_task(_request(app, 'POST', '/predict', body))
+        await asyncio.sleep(0.05)
+        busy = await _request(app, 'POST', '/predict', body)
+        timed_out = await first
+        # The timed-out job still holds its slot until it finishes
+        assert app.pool.pending == 1
+        shutdown = asyncio.create_task(lifespan.send('lifespan.shutdown'))
+        await asyncio.sleep(0.05)
+        draining = await _request(app, 'POST', '/predict', body)
+        release.set()
+        return busy, timed_out, draining, await shutdown, app.pool.pending
+
+    busy, timed_out, draining, shutdown, pending = asyncio.run(scenario())
+    assert busy[0] == 429 and busy[1][b'retry-after'] == b'1'
+    assert json.loads(busy[2]) == {'error': 'Server busy, retry later'}
+    assert timed_out[0] == 504
+    assert draining[0] == 503
+    assert shutdown == 'lifespan.shutdown.complete' and pending == 0
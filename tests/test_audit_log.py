@@ -0,0 +1,104 @@
+import gzip
+import json
+import sys
+import threading
+from pathlib import Path
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from app import app
+from src.audit_log import AuditLog, configure_audit_log
+from src.metrics import AUDIT_EVENTS
+from src.replay import InProcessSender, iter_events, load_requests, replay
+
+FORM = {
+    'age': '55', 'gender': 'male', 'glucose': '135', 'hba1c': '6.3',
+    'systolic': '145', 'diastolic': '92', 'bmi': '32', 'cholesterol': '245',
+    'triglycerides': '180', 'smoking': 'yes', 'alcohol': 'no',
+    'activity': 'low', 'diet_score': '45', 'family_history': 'yes',
+    'sleep': '5', 'stress': 'high'
+}
+
+
+def test_rotation_keeps_backups_and_compresses(tmp_path):
+    log = AuditLog(tmp_path / 'audit.ndjson', max_bytes=200, backups=2, compress=True)
+    for i in range(30):
+        assert log.record({'route': '/predict', 'i': i, 'pad': 'x' * 40})
+    log.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['audit.ndjson', 'audit.ndjson.1.gz', 'audit.ndjson.2.gz']
+    with gzip.open(tmp_path / 'audit.ndjson.1.gz', 'rt') as fh:
+        rotated = [json.loads(line)['i'] for line in fh]
+    live = [json.loads(line)['i'] for line in (tmp_path / 'audit.ndjson').read_text().splitlines()]
+    # The newest events survive, in order, across the rotated and the live file
+    assert rotated + live == list(range(30 - len(rotated) - len(live), 30))
+    assert [e['i'] for e in iter_events([tmp_path])][-len(live):] == live
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    log = AuditLog(tmp_path / 'audit.ndjson', queue_size=1)
+    release, writing = threading.Event(), threading.Event()
+    write = log._write
+
+    def blocked_write(event):
+        writing.set()
+        release.wait(5)
+        write(event)
+
+    log._write = blocked_write
+    dropped = AUDIT_EVENTS.value('dropped')
+    assert log.record({'i': 0})
+    writing.wait(5)  # the writer holds event 0, the queue has room for one more
+    assert log.record({'i': 1})
+    assert not log.record({'i': 2})
+    assert AUDIT_EVENTS.value('dropped') == dropped + 1
+    release.set()
+    log.close()
+    assert [json.loads(line)['i'] for line in (tmp_path / 'audit.ndjson').read_text().splitlines()] == [0, 1]
+
+
+def test_logged_traffic_replays(tmp_path):
+    configure_audit_log(tmp_path / 'audit.ndjson')
+    try:
+        client = app.test_client()
+        client.post('/predict', json=FORM)
+        client.post('/predict', json=dict(FORM, age='150'))
+        client.post('/predict/batch', data=json.dumps(FORM) + '\n' + json.dumps(FORM) + '\n',
+                    content_type='application/x-ndjson')
+    finally:
+        configure_audit_log(None)
+    events = list(iter_events([tmp_path / 'audit.ndjson']))
+    assert [(e['route'], e['status']) for e in events] == [('/predict', 200), ('/predict', 400), ('/predict/batch', 200)]
+    assert events[0]['request'] == FORM and events[0]['response']['risks']
+    assert events[2]['response']['count'] == 2
+
+    requests = load_requests([tmp_path])
+    assert [route for route, _, _ in requests] == ['/predict', '/predict', '/predict/batch']
+    summary = replay(requests, InProcessSender(), total=6, concurrency=2)
+    assert summary['requests'] == 6 and summary['status'] == {'200': 4, '400': 2}
+    assert summary['latency_ms']['p50'] > 0
+
+    regrouped = load_requests([tmp_path], batch=2)
+    assert [(route, body.count(b'\n')) for route, body, _ in regrouped] == [('/predict/batch', 2), ('/predict/batch', 2)]
+    summary = replay(regrouped, InProcessSender(), total=2, qps=100, concurrency=2)
+    assert summary['status'] == {'200': 2} and summary['target_qps'] == 100
+
+
+def test_failed_write_closes_the_file(tmp_path):
+    log = AuditLog(tmp_path / 'audit.ndjson')
+    opened = []
+    open_ = log._open
+
+    def failing_open():
+        open_()
+        opened.append(log._file)
+        log._file.write = lambda line: (_ for _ in ()).throw(OSError('disk full'))
+
+    log._open = failing_open
+    failed = AUDIT_EVENTS.value('failed')
+    for i in range(3):
+        log.record({'i': i})
+    log.close()
+    assert AUDIT_EVENTS.value('failed') == failed + 3
+    assert len(opened) == 3 and all(f.closed for f in opened)
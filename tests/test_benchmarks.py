@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.bench_predict import bench_batch, bench_http, compare, make_records, run_suite, summarize, to_form
+from src import prediction
+from src.model_registry import BACKEND_MULTI_OUTPUT, ModelRegistry
+from src.validation import get_schema
+
+
+def test_summarize_and_compare():
+    stats = summarize([0.001] * 98 + [0.010, 0.020], rows_per_call=10)
+    assert stats['p50_ms'] == 1.0 and stats['p99_ms'] > stats['p95_ms']
+    assert stats['throughput_rows_s'] == round(1000 / 0.128, 1)
+
+    old = {'results': {'warm/lean': {'p50_ms': 2.0}, 'gone': {'p50_ms': 1.0}}}
+    new = {'results': {'warm/lean': {'p50_ms': 1.5}, 'added': {'p50_ms': 1.0}}}
+    assert compare(old, new) == [('warm/lean', 2.0, 1.5, -25.0)]
+
+
+def test_batch_and_http_cases_run():
+    import app as app_module
+    registry = ModelRegistry(search_dirs=[REPO_ROOT / 'artifacts'], backend=BACKEND_MULTI_OUTPUT)
+    records = make_records(20)
+
+    batch = bench_batch(registry, records, 50, max_rows=150)
+    assert batch['calls'] == 3 and batch['rows_per_call'] == 50
+
+    original = app_module.registry
+    http = bench_http(registry, records, concurrency=2, requests_total=6)
+    assert http['calls'] == 6 and http['concurrency'] == 2 and http['peak_rss_mb'] > 0
+    assert app_module.registry is original
+
+
+def test_http_suite_sends_only_valid_forms():
+    registry = ModelRegistry(search_dirs=[REPO_ROOT / 'artifacts'], backend=BACKEND_MULTI_OUTPUT)
+    schema = get_schema(registry.get())
+    # Every generated record passes the /predict schema, so the http suite never stops on a 400
+    _, _, invalid = schema.validate_many([to_form(r) for r in make_records(1000)])
+    assert invalid == {}
+
+    previous = prediction.get_prediction_cache()
+    try:
+        doc = run_suite(('multi_output',), quick=True, concurrency=(2,), suites=['http'])
+    finally:
+        if previous is not None:
+            prediction.configure_prediction_cache(previous.maxsize, previous.ttl)
+    assert doc['results']['http/multi_output/c2']['calls'] == 100
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.bulk_score import bulk_score, normalize_columns
+from src.prediction import predict_risk
+
+
+def test_bulk_score_matches_predict_risk(tmp_path):
+    extract = pd.read_csv(REPO_ROOT / 'Data' / 'dirty_v3_path.csv', nrows=250)
+    source = tmp_path / 'extract.csv'
+    extract.to_csv(source, index=False)
+
+    summary = bulk_score(source, tmp_path / 'scores.csv', chunksize=100, recommendations=True)
+    assert summary['rows'] == 250 and summary['chunks'] == 3
+
+    scores = pd.read_csv(tmp_path / 'scores.csv', keep_default_na=False)
+    assert list(scores.columns) == ['diabetes', 'heart_disease', 'stroke', 'recommendations']
+    records = normalize_columns(extract).to_dict('records')
+    for i in (0, 99, 100, 249):
+        expected = predict_risk(records[i])
+        assert {k: scores.loc[i, k] for k in expected} == expected
+
+
+def test_parquet_recommendations_when_the_first_chunk_fires_no_rule(tmp_path):
+    extract = pd.read_csv(REPO_ROOT / 'Data' / 'dirty_v3_path.csv', nrows=400)
+    source = tmp_path / 'extract.csv'
+    extract.to_csv(source, index=False)
+    bulk_score(source, tmp_path / 'scores.csv', chunksize=400, recommendations=True)
+    scores = pd.read_csv(tmp_path / 'scores.csv', keep_default_na=False)
+    # Healthy rows first: the first chunk's recommendation lists are all empty
+    order = scores[['diabetes', 'heart_disease', 'stroke']].max(axis=1).sort_values(kind='stable').index
+    extract.loc[order].to_csv(source, index=False)
+
+    bulk_score(source, tmp_path / 'scores.parquet', chunksize=50, recommendations=True)
+    written = pd.read_parquet(tmp_path / 'scores.parquet')
+    assert len(written) == 400
+    assert not any(len(recs) for recs in written['recommendations'][:50])
+    assert any(len(recs) for recs in written['recommendations'])
+    assert written['recommendations'].map(' | '.join).tolist() == scores.loc[order, 'recommendations'].tolist()
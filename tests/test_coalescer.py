@@ -0,0 +1,67 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src import prediction
+from src.coalescer import MicroBatcher
+
+
+def test_rows_are_flushed_together_and_routed_back():
+    calls = []
+
+    def score(artifacts, X):
+        calls.append(len(X))
+        return {'double': X[:, 0] * 2}
+
+    batcher = MicroBatcher(score, max_batch=8, max_wait=0.05)
+    barrier = threading.Barrier(8)
+
+    def one(i):
+        barrier.wait()
+        return batcher.submit('artifacts', np.array([[float(i)]])).result(timeout=5)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(one, range(8)))
+    batcher.close()
+    assert [r['double'][0] for r in results] == [2.0 * i for i in range(8)]
+    assert sum(calls) == 8 and max(calls) > 1
+
+
+def test_errors_reach_every_waiting_request():
+    def score(artifacts, X):
+        raise RuntimeError('model exploded')
+
+    batcher = MicroBatcher(score, max_batch=4, max_wait=0.001)
+    future = batcher.submit('artifacts', np.zeros((1, 1)))
+    try:
+        future.result(timeout=5)
+        assert False, 'expected the scoring error'
+    except RuntimeError as e:
+        assert 'exploded' in str(e)
+    batcher.close()
+
+
+def test_predict_risk_through_coalescer_matches_direct_path():
+    sample = {'Age': 55, 'Gender': 'male', 'Glucose': 135, 'HbA1c': 6.3, 'Systolic': 145,
+              'Diastolic': 92, 'BMI': 32, 'Cholesterol': 245, 'Triglycerides': 180}
+    records = [dict(sample, Age=age) for age in range(20, 80, 3)]
+    # keep cached results from short-circuiting the coalescer; the process's cache is restored afterwards
+    previous = prediction.get_prediction_cache()
+    prediction.configure_prediction_cache(maxsize=0)
+    try:
+        expected = [prediction.predict_risk(r) for r in records]
+        batcher = prediction.configure_coalescer(max_batch=16, max_wait_ms=5)
+        with ThreadPoolExecutor(16) as pool:
+            assert list(pool.map(prediction.predict_risk, records)) == expected
+        assert batcher.stats()['rows'] == len(records)
+    finally:
+        prediction.configure_coalescer(enabled=False)
+        if previous is not None:
+            prediction.configure_prediction_cache(previous.maxsize, previous.ttl)
@@ -0,0 +1,76 @@
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src import explainer
+from src.explainer import ExplanationService
+from src.lean_model import export_lean_model
+from src.model_registry import BACKEND_LEAN, BACKEND_MULTI_OUTPUT, ModelRegistry
+from src.prediction import _align, _predict_matrix
+from src.validation import get_schema
+
+RECORDS = [
+    {'Age': 55, 'Gender': 'male', 'Glucose': 135, 'HbA1c': 6.3, 'Systolic': 145, 'Diastolic': 92,
+     'BMI': 32, 'Cholesterol': 245, 'Triglycerides': 180, 'Smoking': 1, 'Diet_Score': 45},
+    {'Age': 23, 'Gender': 'Female', 'Glucose': 88, 'HbA1c': 5.0, 'BMI': 17.9},
+]
+
+
+@pytest.fixture
+def artifacts_dir(tmp_path):
+    for name in ('chronic_disease_model.pkl', 'preprocessor.pkl'):
+        shutil.copy(REPO_ROOT / 'artifacts' / name, tmp_path / name)
+    return tmp_path
+
+
+def test_contributions_add_up_to_the_prediction(artifacts_dir):
+    artifacts = ModelRegistry(search_dirs=[artifacts_dir]).get()
+    service = ExplanationService(artifacts)
+    explanations = service.explain_batch(RECORDS, top_k=len(service.features))
+    scores = _predict_matrix(artifacts, _align(artifacts, RECORDS))
+
+    for i, explanation in enumerate(explanations):
+        assert set(explanation) == set(scores)
+        for target, result in explanation.items():
+            # one entry per preprocessor column: one-hot columns are summed back together
+            assert len(result['contributions']) == len(service.features)
+            margin = result['base_value'] + sum(c['contribution'] for c in result['contributions'])
+            p = scores[target][i]
+            assert 1 / (1 + np.exp(-margin)) == pytest.approx(p, abs=1e-3)
+    top = service.explain(RECORDS[0], top_k=3)['diabetes']['contributions']
+    assert len(top) == 3
+    assert abs(top[0]['contribution']) >= abs(top[-1]['contribution'])
+
+
+def test_lean_backend_explains_like_the_pickles(artifacts_dir):
+    export_lean_model(artifacts_dir / 'chronic_disease_model.pkl', artifacts_dir / 'preprocessor.pkl',
+                      artifacts_dir / 'lean')
+    lean = ModelRegistry(search_dirs=[artifacts_dir]).get()
+    pickled = ModelRegistry(search_dirs=[artifacts_dir], backend=BACKEND_MULTI_OUTPUT).get()
+    assert lean.backend == BACKEND_LEAN
+    assert ExplanationService(lean).explain_batch(RECORDS) == ExplanationService(pickled).explain_batch(RECORDS)
+
+
+def test_validated_records_reuse_their_rows(artifacts_dir, monkeypatch):
+    artifacts = ModelRegistry(search_dirs=[artifacts_dir]).get()
+    service = ExplanationService(artifacts)
+    form = {'age': '55', 'gender': 'male', 'glucose': '135', 'hba1c': '6.3', 'systolic': '145', 'diastolic': '92',
+            'bmi': '32', 'cholesterol': '245', 'triglycerides': '180', 'smoking': 'yes', 'alcohol': 'no',
+            'activity': 'low', 'diet_score': '45', 'family_history': 'yes', 'sleep': '5', 'stress': 'high'}
+    record = get_schema(artifacts).validate(form)
+    expected = service.explain(dict(record))
+
+    def no_align(*_):
+        raise AssertionError('validated records are not aligned again')
+
+    monkeypatch.setattr(explainer, '_align', no_align)
+    assert service.explain(record) == expected
+    assert service.explain_batch([record, record]) == [expected, expected]
+
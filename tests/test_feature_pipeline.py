@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.feature_pipeline import AlignmentPlan, to_number
+
+PREPROCESSOR = joblib.load(REPO_ROOT / 'artifacts' / 'preprocessor.pkl')
+
+SAMPLE = {
+    'Age': '55', 'Gender': 'male', 'Glucose': 135, 'HbA1c': 6.3,
+    'Systolic': 145, 'Diastolic': 92, 'BMI': 32, 'Cholesterol': 245,
+    'Triglycerides': 180, 'Smoking': 1, 'Alcohol': 0,
+    'Physical_Activity': 0, 'Diet_Score': 45, 'Family_History': 1,
+    'Sleep_Hours': 5, 'Stress_Level': 2, 'TC_HDL_Ratio': 5
+}
+
+
+def test_plan_records_sources_and_defaults():
+    plan = AlignmentPlan.from_preprocessor(PREPROCESSOR)
+    rules = {r.column: r for r in plan.rules}
+    assert rules['Systolic_BP'].source == 'Systolic'
+    assert rules['Physical Activity'].source == 'Physical_Activity'
+    assert rules['Oxygen Saturation'].source is None
+    assert rules['BMI_Category'].coerce == 'cut'
+    assert rules['Smoking'].coerce == 'to_code' and rules['Age'].coerce == 'to_number'
+    assert rules['Gender'].default == 'Female'
+
+
+def test_plan_matches_column_transformer():
+    plan = AlignmentPlan.from_preprocessor(PREPROCESSOR)
+    X = plan.transform_one(SAMPLE)
+    assert X.shape == (1, plan.n_features)
+
+    frame = pd.DataFrame([{
+        'Age': 55, 'Gender': 'Male', 'Glucose': 135, 'BMI': 32, 'Oxygen Saturation': 0,
+        'Cholesterol': 245, 'Triglycerides': 180, 'HbA1c': 6.3, 'Smoking': 1, 'Alcohol': 0,
+        'Physical Activity': 0, 'Diet Score': 45, 'Family History': 1, 'Stress Level': 2,
+        'Sleep Hours': 5, 'Systolic_BP': 145, 'Diastolic_BP': 92,
+        'BMI_Category': 'Obese', 'Age_Group': 'Middle',
+    }])[list(PREPROCESSOR.feature_names_in_)]
+    np.testing.assert_array_equal(X, PREPROCESSOR.transform(frame).astype(np.float32))
+
+
+def test_to_number_matches_pandas_coercion():
+    for value in ['55', ' 6.5 ', 'yes', '', None, float('nan'), True, '1_000', 7]:
+        expected = pd.to_numeric(pd.Series([value]), errors='coerce').fillna(0).iloc[0]
+        assert to_number(value) == float(expected)
+
+
+def test_batch_transform_matches_single_rows():
+    plan = AlignmentPlan.from_preprocessor(PREPROCESSOR)
+    records = [
+        SAMPLE,
+        dict(SAMPLE, Gender='FEMALE', BMI=18.5, Age=70),
+        dict(SAMPLE, Gender=None, BMI='abc', Age=0),
+        {'Gender': 'Other'},
+    ] * 500
+    X = plan.transform(records)
+    assert X.dtype == np.float32 and X.shape == (len(records), plan.n_features)
+    single = np.vstack([plan.transform_one(r) for r in records[:4]])
+    np.testing.assert_array_equal(X[:4], single)
+    # drop='first': 'Female' and unknown categories encode as all zeros
+    gender_col = plan.encoder.lookups[0]['male']
+    assert X[:4, gender_col].tolist() == [1.0, 0.0, 0.0, 0.0]
@@ -0,0 +1,70 @@
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.incremental_training import (MODEL_FILE, PREPROCESSOR_FILE, REPORT_FILE, incremental_update,
+                                      prepare_chronic_batch, promote, write_version)
+from src.model_registry import BACKEND_MULTI_OUTPUT, ModelRegistry
+from src.prediction import predict_risk
+
+RAW = REPO_ROOT / 'Data' / 'dirty_v3_path.csv'
+
+
+@pytest.fixture
+def base_dir(tmp_path):
+    for name in (MODEL_FILE, PREPROCESSOR_FILE):
+        shutil.copy(REPO_ROOT / 'artifacts' / name, tmp_path / name)
+    return tmp_path
+
+
+def _shifted_batch(n=2000):
+    batch = pd.read_csv(RAW).sample(n, random_state=1)
+    return batch.assign(Glucose=batch['Glucose'] * 1.2, BMI=batch['BMI'] + 3)
+
+
+def test_rescaled_trees_keep_their_predictions(base_dir):
+    model, preprocessor, report = incremental_update(base_dir, _shifted_batch(), rounds=0, holdout=0)
+    assert report['preprocessor']['samples_seen'] == [30000, 32000]
+
+    old_model = joblib.load(base_dir / MODEL_FILE)
+    old_pre = joblib.load(base_dir / PREPROCESSOR_FILE)
+    assert not np.allclose(preprocessor.named_transformers_['num'].mean_[:3],
+                           old_pre.named_transformers_['num'].mean_[:3])
+    X, _ = prepare_chronic_batch(pd.read_csv(RAW).head(5000))
+    X = X[list(old_pre.feature_names_in_)]
+    for before, after in zip(old_model.predict_proba(old_pre.transform(X)),
+                             model.predict_proba(preprocessor.transform(X))):
+        np.testing.assert_allclose(after, before, atol=1e-6)
+
+
+def test_update_writes_loadable_version(base_dir):
+    base_digest = (base_dir / MODEL_FILE).read_bytes()
+    model, preprocessor, report = incremental_update(base_dir, _shifted_batch(), rounds=5,
+                                                     reference=pd.read_csv(RAW).head(1000))
+    version_dir = write_version(base_dir, model, preprocessor, report, version='v2')
+
+    assert (base_dir / MODEL_FILE).read_bytes() == base_digest
+    saved = json.loads((version_dir / REPORT_FILE).read_text())
+    assert saved['version'] == 'v2'
+    assert saved['trees_per_target'] == [205, 205, 205]
+    assert set(saved['evaluation']) == {'batch_holdout', 'reference'}
+    for metrics in saved['evaluation']['reference'].values():
+        assert set(metrics) == {'previous', 'updated'}
+
+    registry = ModelRegistry(search_dirs=[version_dir])
+    assert registry.get().backend == BACKEND_MULTI_OUTPUT
+    assert set(predict_risk({'Age': 60, 'Gender': 'Male', 'Glucose': 150}, registry=registry)) == \
+        {'diabetes', 'heart_disease', 'stroke'}
+
+    promote(version_dir, base_dir)
+    assert (base_dir / MODEL_FILE).read_bytes() == (version_dir / MODEL_FILE).read_bytes()
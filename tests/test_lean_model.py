@@ -0,0 +1,99 @@
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.lean_model import LeanModel, export_lean_model
+from src.model_registry import BACKEND_LEAN, BACKEND_MULTI_OUTPUT, ModelRegistry
+from src.prediction import _predict_matrix, predict_risk_batch
+
+RECORDS = [
+    {'Age': 55, 'Gender': 'male', 'Glucose': 135, 'HbA1c': 6.3, 'Systolic': 145, 'Diastolic': 92,
+     'BMI': 32, 'Cholesterol': 245, 'Triglycerides': 180, 'Smoking': 1, 'Alcohol': 0,
+     'Physical_Activity': 0, 'Diet_Score': 45, 'Family_History': 1, 'Sleep_Hours': 5,
+     'Stress_Level': 2, 'TC_HDL_Ratio': 5},
+    {'Age': 23, 'Gender': 'Female', 'Glucose': 88, 'HbA1c': 5.0, 'BMI': 17.9, 'Cholesterol': 160},
+    {'Age': 71, 'Gender': 'other', 'Glucose': '210', 'HbA1c': None, 'BMI': 41, 'Systolic': 170},
+    {},
+]
+
+
+@pytest.fixture
+def lean_dir(tmp_path):
+    for name in ('chronic_disease_model.pkl', 'preprocessor.pkl'):
+        shutil.copy(REPO_ROOT / 'artifacts' / name, tmp_path / name)
+    export_lean_model(tmp_path / 'chronic_disease_model.pkl', tmp_path / 'preprocessor.pkl', tmp_path / 'lean')
+    return tmp_path
+
+
+def test_lean_matches_sklearn(lean_dir):
+    lean = ModelRegistry(search_dirs=[lean_dir])
+    sklearn = ModelRegistry(search_dirs=[lean_dir], backend=BACKEND_MULTI_OUTPUT)
+    assert lean.get().backend == BACKEND_LEAN
+    assert sklearn.get().backend == BACKEND_MULTI_OUTPUT
+
+    rng = np.random.default_rng(0)
+    X = sklearn.get().plan.transform(RECORDS)
+    X = np.vstack([X, rng.normal(size=(500, X.shape[1])).astype(np.float32)])
+    X[::7, 3] = np.nan
+    expected = _predict_matrix(sklearn.get(), X)
+    got = _predict_matrix(lean.get(), X)
+    for name in expected:
+        np.testing.assert_allclose(got[name], expected[name], atol=1e-6)
+
+    lean_risks = predict_risk_batch(RECORDS, registry=lean)
+    sklearn_risks = predict_risk_batch(RECORDS, registry=sklearn)
+    for a, b in zip(lean_risks, sklearn_risks):
+        assert a['risks'].keys() == b['risks'].keys()
+        for name in a['risks']:
+            assert a['risks'][name] == pytest.approx(b['risks'][name], abs=0.1)
+
+
+def test_stale_export_falls_back_to_pickles(lean_dir):
+    meta_path = lean_dir / 'lean' / 'meta.json'
+    meta = json.loads(meta_path.read_text())
+    meta['source_digests']['chronic_model'] = '0' * 64
+    meta_path.write_text(json.dumps(meta))
+
+    assert ModelRegistry(search_dirs=[lean_dir]).get().backend == BACKEND_MULTI_OUTPUT
+    with pytest.raises(ValueError):
+        ModelRegistry(search_dirs=[lean_dir], backend=BACKEND_LEAN).get()
+
+
+def test_lean_request_path_skips_pandas_sklearn_xgboost(lean_dir):
+    script = (
+        'import sys; sys.path.insert(0, sys.argv[1])\n'
+        'from src.model_registry import ModelRegistry\n'
+        'from src.prediction import predict_risk\n'
+        'registry = ModelRegistry(search_dirs=[sys.argv[2]], backend="lean")\n'
+        'predict_risk({"Age": 40, "Gender": "Male", "BMI": 27}, registry=registry)\n'
+        'print(sorted(m for m in ("pandas", "sklearn", "xgboost") if m in sys.modules))\n'
+    )
+    out = subprocess.run([sys.executable, '-c', script, str(REPO_ROOT), str(lean_dir)],
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == '[]'
+
+
+def test_forest_arrays_are_memory_mapped(lean_dir):
+    mapped = LeanModel.load(lean_dir / 'lean').forest
+    assert not mapped.threshold.flags.writeable
+    assert isinstance(mapped.threshold.base, np.memmap)
+
+    # Exports without forest/ are compiled from the booster JSON instead
+    meta_path = lean_dir / 'lean' / 'meta.json'
+    meta = json.loads(meta_path.read_text())
+    del meta['forest']
+    meta_path.write_text(json.dumps(meta))
+    compiled = LeanModel.load(lean_dir / 'lean').forest
+    assert compiled.threshold.flags.writeable
+
+    X = np.random.default_rng(1).normal(size=(200, mapped.n_features)).astype(np.float32)
+    np.testing.assert_array_equal(mapped.margins(X), compiled.margins(X))
@@ -0,0 +1,34 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.memory_report import format_report, memory_report
+
+
+def test_forked_child_shares_parent_pages():
+    data = np.ones(8 * 1024 * 1024 // 8)  # 8 MiB touched in the parent
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # child: read the inherited array (no writes), then wait to be measured
+        os.close(write_fd)
+        float(data.sum())
+        os.read(read_fd, 1)
+        os._exit(0)
+    os.close(read_fd)
+    try:
+        report = memory_report(os.getpid())
+    finally:
+        os.write(write_fd, b'x')
+        os.waitpid(pid, 0)
+
+    child = next(w for w in report['workers'] if w['pid'] == pid)
+    assert child['shared_mb'] >= 8
+    assert child['private_mb'] < child['shared_mb']
+    assert child['pss_mb'] < child['rss_mb']
+    assert 'server total (PSS)' in format_report(report)
@@ -0,0 +1,66 @@
+import logging
+import sys
+from pathlib import Path
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src import metrics
+from src.metrics import Histogram
+
+FORM = {
+    'age': '55', 'gender': 'male', 'glucose': '135', 'hba1c': '6.3',
+    'systolic': '145', 'diastolic': '92', 'bmi': '32', 'cholesterol': '245',
+    'triglycerides': '180', 'smoking': 'yes', 'alcohol': 'no',
+    'activity': 'low', 'diet_score': '45', 'family_history': 'yes',
+    'sleep': '5', 'stress': 'high'
+}
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram('t_seconds', 'Test.', ('stage',), buckets=(0.001, 0.01))
+    for seconds in (0.0005, 0.005, 0.005, 2.0):
+        h.observe(seconds, 'a"b')
+    lines = h.render()
+    assert lines[:2] == ['# HELP t_seconds Test.', '# TYPE t_seconds histogram']
+    assert lines[2:] == [
+        't_seconds_bucket{stage="a\\"b",le="0.001"} 1',
+        't_seconds_bucket{stage="a\\"b",le="0.01"} 3',
+        't_seconds_bucket{stage="a\\"b",le="+Inf"} 4',
+        't_seconds_sum{stage="a\\"b"} 2.0105',
+        't_seconds_count{stage="a\\"b"} 4',
+    ]
+
+
+def test_metrics_route_exposes_stages_and_counters():
+    from app import app, registry
+
+    backend = registry.get().backend
+    metrics.reset()
+    with app.test_client() as client:
+        assert client.post('/predict', json=FORM).status_code == 200
+        assert client.post('/predict/batch', json=[FORM, FORM, 7]).status_code == 200
+        resp = client.get('/metrics')
+    assert resp.status_code == 200 and resp.mimetype == 'text/plain'
+
+    text = resp.get_data(as_text=True)
+    for stage in ('parse', 'align', 'predict', 'recommendations', 'serialize'):
+        assert metrics.STAGE_SECONDS.count(stage, backend) >= 1, stage
+        assert f'health_stage_duration_seconds_count{{stage="{stage}",backend="{backend}"}}' in text
+    assert metrics.REQUESTS.value('/predict', 'POST', '200') == 1
+    assert metrics.PREDICTIONS.value(backend, 'batch') == 2
+    assert metrics.PREDICTION_ERRORS.value(backend) == 0  # record 7 never reaches the model
+    assert 'health_http_request_duration_seconds_bucket{route="/predict/batch",le="+Inf"} 1' in text
+
+
+def test_trace_is_sampled_or_debug_gated(monkeypatch):
+    log = logging.getLogger('test_metrics')
+    log.setLevel(logging.INFO)
+    monkeypatch.setattr(metrics, 'TRACE_SAMPLE_RATE', 0.0)
+    assert not metrics.should_trace(log)
+    monkeypatch.setattr(metrics, 'TRACE_SAMPLE_RATE', 1.0)
+    assert metrics.should_trace(log)
+    monkeypatch.setattr(metrics, 'TRACE_SAMPLE_RATE', 0.0)
+    log.setLevel(logging.DEBUG)
+    assert metrics.should_trace(log)
@@ -0,0 +1,63 @@
+import os
+import shutil
+import sys
+from pathlib import Path
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.model_registry import BACKEND_MULTI_OUTPUT, ModelRegistry
+from src.prediction import predict_risk
+
+SAMPLE = {
+    'Age': 55, 'Gender': 'male', 'Glucose': 135, 'HbA1c': 6.3,
+    'Systolic': 145, 'Diastolic': 92, 'BMI': 32, 'Cholesterol': 245,
+    'Triglycerides': 180, 'Smoking': 1, 'Alcohol': 0,
+    'Physical_Activity': 0, 'Diet_Score': 45, 'Family_History': 1,
+    'Sleep_Hours': 5, 'Stress_Level': 2, 'TC_HDL_Ratio': 5
+}
+
+
+def _copy_artifacts(tmp_path):
+    for name in ('chronic_disease_model.pkl', 'preprocessor.pkl'):
+        shutil.copy(REPO_ROOT / 'artifacts' / name, tmp_path / name)
+    return tmp_path
+
+
+def test_artifacts_loaded_once(tmp_path):
+    registry = ModelRegistry(search_dirs=[_copy_artifacts(tmp_path)])
+    first = registry.get()
+    assert first.backend == BACKEND_MULTI_OUTPUT
+    assert registry.get() is first
+    risks = predict_risk(SAMPLE, registry=registry)
+    assert set(risks) == {'diabetes', 'heart_disease', 'stroke'}
+    assert registry.get() is first
+
+
+def test_hot_reload_only_on_content_change(tmp_path):
+    registry = ModelRegistry(search_dirs=[_copy_artifacts(tmp_path)], reload_interval=0.001)
+    first = registry.get()
+    model_path = tmp_path / 'chronic_disease_model.pkl'
+
+    # Same bytes, new mtime: no reload
+    st = os.stat(model_path)
+    os.utime(model_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert registry.maybe_reload() is False
+    assert registry.get() is first
+
+    # New content: the snapshot is swapped
+    with open(model_path, 'ab') as fh:
+        fh.write(b'\0')
+    os.utime(model_path, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10**9))
+    assert registry.maybe_reload() is True
+    assert registry.get() is not first
+    assert registry.get().version == first.version + 1
+
+
+def test_failed_reload_keeps_previous_snapshot(tmp_path):
+    registry = ModelRegistry(search_dirs=[_copy_artifacts(tmp_path)])
+    first = registry.get()
+    (tmp_path / 'preprocessor.pkl').write_bytes(b'not a pickle')
+    assert registry.maybe_reload() is False
+    assert registry.get() is first
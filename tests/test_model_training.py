@@ -0,0 +1,49 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.model_registry import BACKEND_PER_DISEASE, ModelRegistry
+from src.model_training import REPORT_FILE, load_training_frame, train_models
+from src import prediction
+from src.prediction import predict_risk_batch
+
+
+def test_trained_models_load_as_per_disease_backend(tmp_path):
+    df = load_training_frame(str(REPO_ROOT / 'Data' / 'dirty_v3_path.csv'), str(tmp_path / 'clean.arrow'))
+    models_dir = tmp_path / 'models'
+    report = train_models(df.head(2000), str(models_dir), threads_per_model=1,
+                          num_boost_round=60, early_stopping_rounds=5)
+
+    assert report['rows'] == {'train': 1200, 'valid': 400, 'test': 400}
+    assert json.loads((models_dir / REPORT_FILE).read_text())['targets'].keys() == report['targets'].keys()
+    for info in report['targets'].values():
+        assert 0 <= info['best_iteration'] < info['rounds_trained'] <= 60
+        assert info['test']['auc'] > 0.9
+
+    registry = ModelRegistry(search_dirs=[models_dir])
+    artifacts = registry.get()
+    assert artifacts.backend == BACKEND_PER_DISEASE
+    for name, model in artifacts.models.items():
+        # early-stopped boosters are saved trimmed to their best iteration
+        assert model.get_booster().num_boosted_rounds() == report['targets'][name]['best_iteration'] + 1
+
+    high, low = predict_risk_batch([
+        {'Age': 72, 'Gender': 'male', 'Glucose': 180, 'HbA1c': 8.1, 'Systolic': 170, 'Cholesterol': 260,
+         'Smoking': 1},
+        {'Age': 30, 'Gender': 'Female', 'Glucose': 85, 'HbA1c': 5.0, 'Systolic': 110, 'Cholesterol': 170},
+    ], registry=registry)
+    for name in report['targets']:
+        assert high['risks'][name] > low['risks'][name]
+
+    # Numeric Gender codes (as in the cleaned extract) align like the text answers
+    rows = prediction._align(artifacts, [{'Age': 60, 'Gender': g, 'Glucose': 150}
+                                         for g in (1, '1', 'Male', 0, 'female')])
+    gender = rows[:, list(artifacts.scaler.feature_names_in_).index('Gender')]
+    assert not np.isnan(gender).any()
+    assert gender[0] == gender[1] == gender[2] != gender[3] == gender[4]
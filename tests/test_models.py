@@ -7,7 +7,7 @@ REPO_ROOT = Path(__file__).resolve().parents[1]
 SRC_PATH = REPO_ROOT / 'src'
 sys.path.insert(0, str(SRC_PATH))
 
-from prediction import predict_risk
+from prediction import predict_risk, predict_risk_batch
 
 def test_prediction():
     sample = {
@@ -19,4 +19,19 @@ def test_prediction():
     }
     risks = predict_risk(sample)
     assert all(k in risks for k in ['diabetes', 'heart_disease', 'stroke'])
-    print("Test passed!")
\ No newline at end of file
+    print("Test passed!")
+
+
+def test_prediction_batch():
+    sample = {
+        'Age': 55, 'Gender': 'male', 'Glucose': 135, 'HbA1c': 6.3,
+        'Systolic': 145, 'Diastolic': 92, 'BMI': 32, 'Cholesterol': 245,
+        'Triglycerides': 180, 'Smoking': 1, 'Alcohol': 0,
+        'Physical_Activity': 0, 'Diet_Score': 45, 'Family_History': 1,
+        'Sleep_Hours': 5, 'Stress_Level': 2, 'TC_HDL_Ratio': 5
+    }
+    low = dict(sample, Age=30, Glucose=90, HbA1c=5.4, Systolic=115, Diastolic=75, BMI=22, Cholesterol=170)
+    results = predict_risk_batch([sample, 'not a record', low])
+    assert results[0] == {'risks': predict_risk(sample)}
+    assert 'error' in results[1]
+    assert results[2] == {'risks': predict_risk(low)}
@@ -0,0 +1,71 @@
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src import prediction
+from src.model_registry import ModelRegistry
+from src.prediction_cache import PredictionCache
+
+SAMPLE = {'Age': 55, 'Gender': 'Male', 'Glucose': 135, 'HbA1c': 6.3, 'Systolic': 145,
+          'Diastolic': 92, 'BMI': 32, 'Cholesterol': 245, 'Triglycerides': 180}
+
+
+def test_normalized_inputs_share_an_entry():
+    cache = prediction.configure_prediction_cache(maxsize=16)
+    try:
+        first = prediction.predict_risk(SAMPLE)
+        again = prediction.predict_risk(dict(SAMPLE, Gender='male', Age='55', Glucose='135.0'))
+        assert again == first
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    finally:
+        prediction.configure_prediction_cache(maxsize=0)
+
+
+def test_lru_eviction_and_ttl():
+    cache = PredictionCache(maxsize=2, ttl=0.05)
+    cache.put(b'a', 1)
+    cache.put(b'b', 2)
+    assert cache.get(b'a') == 1
+    cache.put(b'c', 3)  # evicts b, the least recently used
+    assert cache.get(b'b') is None and cache.stats()['evictions'] == 1
+    time.sleep(0.06)
+    assert cache.get(b'a') is None and cache.stats()['expirations'] == 1
+
+
+def test_reloaded_model_invalidates_entries(tmp_path):
+    for name in ('chronic_disease_model.pkl', 'preprocessor.pkl'):
+        shutil.copy(REPO_ROOT / 'artifacts' / name, tmp_path / name)
+    registry = ModelRegistry(search_dirs=[tmp_path])
+    cache = prediction.configure_prediction_cache(maxsize=16)
+    registry.add_reload_listener(cache.clear)
+    try:
+        prediction.predict_risk(SAMPLE, registry=registry)
+        prediction.predict_risk(SAMPLE, registry=registry)
+        assert cache.stats()['hits'] == 1
+        with open(tmp_path / 'chronic_disease_model.pkl', 'ab') as fh:
+            fh.write(b'\0')
+        assert registry.maybe_reload() is True
+        assert cache.stats()['size'] == 0
+        prediction.predict_risk(SAMPLE, registry=registry)
+        assert cache.stats()['misses'] == 2
+    finally:
+        prediction.configure_prediction_cache(maxsize=0)
+
+
+def test_reconfiguring_keeps_one_reload_listener():
+    registry = prediction.get_registry()
+    try:
+        for _ in range(3):
+            cache = prediction.configure_prediction_cache(maxsize=4)
+        assert registry._listeners.count(prediction._clear_prediction_cache) == 1
+        cache.put(b'a', 1)
+        for callback in registry._listeners:
+            callback(None)
+        assert cache.stats()['size'] == 0
+    finally:
+        prediction.configure_prediction_cache(maxsize=0)
@@ -0,0 +1,81 @@
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.preprocessing import build_clean_cache, create_features, load_and_clean_data, load_clean_cache
+
+SAMPLE = REPO_ROOT / 'Data' / 'dirty_v3_path.csv'
+
+
+def _reference_load_and_clean(filepath):
+    # The original whole-file implementation, for the text-coded extract it was written for
+    df = pd.read_csv(filepath)
+    df = df.drop(['random_notes', 'noise_col', 'LengthOfStay'], axis=1, errors='ignore')
+    bp = df['Blood_Pressure'].str.split('/', expand=True).astype(float)
+    df['Systolic'] = bp[0]
+    df['Diastolic'] = bp[1]
+    df = df.drop('Blood_Pressure', axis=1)
+    df['Gender'] = df['Gender'].map({'Male': 1, 'Female': 0})
+    df['Smoking'] = df['Smoking'].map({'Yes': 1, 'No': 0, 'Former': 1}).fillna(0)
+    df['Alcohol'] = df['Alcohol'].map({'Yes': 1, 'No': 0, 'Occasional': 1, 'Regular': 1}).fillna(0)
+    df['Family_History'] = df['Family_History'].map({'Yes': 1, 'No': 0})
+    levels = {'Low': 0, 'Moderate': 1, 'High': 2}
+    df['Physical_Activity'] = df['Physical_Activity'].map(levels)
+    df['Stress_Level'] = df['Stress_Level'].map(levels)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for col in df.select_dtypes(include=['float64', 'int64']):
+            df[col].fillna(df[col].median(), inplace=True)
+        for col in df.select_dtypes(include=['object']):
+            df[col].fillna(df[col].mode()[0], inplace=True)
+    return df
+
+
+def _text_coded_extract(path, n=3000):
+    df = pd.read_csv(SAMPLE, nrows=n).rename(columns=lambda c: c.replace(' ', '_'))
+    rng = np.random.default_rng(0)
+    df['Blood_Pressure'] = [None if b != b else f'{b:.0f}/{b * 0.65:.0f}' for b in df['Blood_Pressure']]
+    df['Smoking'] = rng.choice(['Yes', 'No', 'Former', None], n)
+    df['Alcohol'] = rng.choice(['Yes', 'No', 'Occasional', 'Regular', 'Never'], n)
+    df['Family_History'] = rng.choice(['Yes', 'No', None], n)
+    df['Physical_Activity'] = rng.choice(['Low', 'Moderate', 'High', None], n)
+    df['Stress_Level'] = rng.choice(['Low', 'Moderate', 'High'], n)
+    df.to_csv(path, index=False)
+    return path
+
+
+def test_chunked_cleaning_matches_whole_file(tmp_path):
+    path = _text_coded_extract(tmp_path / 'extract.csv')
+    expected = _reference_load_and_clean(path)
+    for chunksize in (256, 10**6):
+        pd.testing.assert_frame_equal(load_and_clean_data(path, chunksize=chunksize), expected)
+
+
+def test_clean_cache_round_trip(tmp_path):
+    path = _text_coded_extract(tmp_path / 'extract.csv')
+    cache = tmp_path / 'clean.arrow'
+    assert build_clean_cache(path, cache, chunksize=500) == 3000
+
+    cached = load_clean_cache(cache)
+    assert isinstance(cached['Medical_Condition'].dtype, pd.CategoricalDtype)
+    expected = create_features(_reference_load_and_clean(path))
+    pd.testing.assert_frame_equal(cached.astype({'Medical_Condition': object}), expected,
+                                  check_categorical=False)
+    assert list(load_clean_cache(cache, columns=['Age', 'BMI']).columns) == ['Age', 'BMI']
+
+
+def test_sample_extract_headers_and_numeric_codes():
+    small = load_and_clean_data(SAMPLE, chunksize=7000)
+    assert small.equals(load_and_clean_data(SAMPLE, chunksize=10**6))
+    # 'Physical Activity' etc. are normalized; already-numeric codes are kept, not mapped to NaN
+    assert {'Physical_Activity', 'Family_History', 'Systolic', 'Diastolic'} <= set(small.columns)
+    assert small['Physical_Activity'].notna().all() and small['Smoking'].isin([0, 1]).all()
+    assert small['Smoking'].sum() > 0
+    assert small.drop(columns='Diastolic').notna().all().all()
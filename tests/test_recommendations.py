@@ -0,0 +1,48 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.recommendations import RuleSet, get_recommendations, get_recommendations_batch
+
+HIGH = {'diabetes': 90.0, 'heart_disease': 90.0, 'stroke': 90.0}
+
+
+def test_rules_rank_by_priority_and_read_text_answers():
+    recs = get_recommendations(HIGH, {'BMI': 32, 'Smoking': 'yes'})
+    assert recs == ['Quit smoking immediately', 'Control blood pressure daily', 'Aim to lose 5-7% body weight',
+                    'Reduce sugar & refined carbs', 'Limit salt <2g/day', 'Walk 30 min daily',
+                    'Eat oats, nuts, and olive oil', 'Manage stress with meditation']
+    assert get_recommendations(HIGH, {'BMI': '32', 'Smoking': 1}) == recs
+    assert 'Quit smoking immediately' not in get_recommendations(HIGH, {'BMI': 32, 'Smoking': 'No'})
+    assert get_recommendations({'diabetes': 60.0, 'heart_disease': 10.0, 'stroke': 0.0}, {}) == []
+
+
+def test_vectorized_rules_match_the_single_record_path():
+    rng = np.random.default_rng(0)
+    n = 2000
+    risks = [{name: float(rng.choice([10.0, 60.0, 60.1, 95.0])) for name in HIGH} for _ in range(n)]
+    inputs = [{'BMI': float(rng.choice([25, 30, 30.5, 41])), 'Smoking': rng.choice(['yes', 'No', 0, 1, 'former'])}
+              for _ in range(n)]
+    assert get_recommendations_batch(risks, inputs) == [get_recommendations(r, i) for r, i in zip(risks, inputs)]
+    assert get_recommendations_batch([], []) == []
+
+
+def test_rules_from_json(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps([
+        {'priority': 1, 'target': 'stroke', 'min_risk': 20, 'message': 'See a doctor'},
+        {'priority': 5, 'target': 'stroke', 'min_risk': 20, 'when': [['Age', '>=', 65]], 'message': 'Check BP weekly'},
+    ]))
+    rules = RuleSet.from_json(path)
+    assert rules.recommend({'stroke': 30}, {'Age': 70}) == ['Check BP weekly', 'See a doctor']
+    assert rules.recommend_many({'stroke': np.array([30.0, 30.0, 10.0])}, {'Age': np.array([70, 40, 70])}, 3) == [
+        ['Check BP weekly', 'See a doctor'], ['See a doctor'], []]
+    with pytest.raises(ValueError, match='unknown operator'):
+        RuleSet([(1, 'stroke', 0, (('Age', '=>', 1),), 'typo')])
@@ -0,0 +1,130 @@
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src import prediction
+from src.model_registry import ModelRegistry
+from src.prediction import TARGET_NAMES, _predict_matrix
+from src.risk_grid import EMPTY, RiskGrid, accuracy_report, build_grid, load_population, main
+from src.validation import get_schema
+
+FORM = {
+    'age': '55', 'gender': 'male', 'glucose': '135', 'hba1c': '6.3',
+    'systolic': '145', 'diastolic': '92', 'bmi': '32', 'cholesterol': '245',
+    'triglycerides': '180', 'smoking': 'yes', 'alcohol': 'no',
+    'activity': 'low', 'diet_score': '45', 'family_history': 'yes',
+    'sleep': '5', 'stress': 'high'
+}
+
+
+def _population(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [dict(FORM, glucose=str(int(rng.integers(70, 300))), hba1c=f'{rng.uniform(4, 12):.1f}',
+                 systolic=str(int(rng.integers(90, 200))), cholesterol=str(int(rng.integers(120, 350))),
+                 age=str(int(rng.integers(20, 90))), bmi=f'{rng.uniform(18, 45):.1f}')
+            for _ in range(n)]
+
+
+@pytest.fixture(scope='module')
+def model_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('model')
+    for name in ('chronic_disease_model.pkl', 'preprocessor.pkl'):
+        shutil.copy(REPO_ROOT / 'artifacts' / name, directory / name)
+    return directory
+
+
+def test_grid_hits_match_the_model_and_misses_fall_back(model_dir, tmp_path):
+    registry = ModelRegistry(search_dirs=[model_dir], backend='multi_output')
+    artifacts = registry.get()
+    batch, _, _ = get_schema(artifacts).validate_many(_population(2000))
+    grid = build_grid(artifacts, batch.matrix, tmp_path / 'grid', max_error=1)
+    assert [spec['name'] for spec in grid.meta['targets']] == TARGET_NAMES
+
+    # Every filled cell stays within max_error of the model
+    hit, risks = grid.lookup_many(batch.matrix)
+    assert hit.any() and not hit.all()
+    scores = _predict_matrix(artifacts, batch.matrix[hit])
+    expected = np.column_stack([[round(float(p) * 100, 1) for p in scores[name]] for name in TARGET_NAMES])
+    assert np.abs(risks - expected).max() <= 1 + 1e-9
+    report = accuracy_report(grid, artifacts, batch.matrix, timing_rows=5)
+    assert report['hits'] == hit.sum() and all(err['max'] <= 1 for err in report['abs_error'].values())
+
+    prediction.configure_risk_grid(tmp_path / 'grid')
+    try:
+        hit_record, miss_record = batch[int(np.argmax(hit))], batch[int(np.argmin(hit))]
+        served = prediction.predict_risk(hit_record, registry=registry)
+        assert served == grid.lookup(artifacts, batch.matrix[int(np.argmax(hit))][None])
+        missed = prediction.predict_risk(miss_record, registry=registry)
+        prediction.configure_risk_grid(None)
+        exact = prediction.predict_risk(hit_record, registry=registry)
+        assert all(abs(served[name] - exact[name]) <= 1 + 1e-9 for name in TARGET_NAMES)
+        assert missed == prediction.predict_risk(miss_record, registry=registry)
+        prediction.configure_risk_grid(tmp_path / 'grid')
+        # A record nothing like the population lands in an empty cell
+        far = get_schema(artifacts).validate(dict(FORM, glucose='400', hba1c='3'))
+        assert grid.lookup(artifacts, far.row) is None
+    finally:
+        prediction.configure_risk_grid(None)
+
+
+def test_error_bound_holds_whatever_the_other_inputs_are(model_dir, tmp_path):
+    registry = ModelRegistry(search_dirs=[model_dir], backend='multi_output')
+    artifacts = registry.get()
+    schema = get_schema(artifacts)
+    # Built from a population that answers every non-axis question the same way
+    population = _population(2000, seed=2)
+    grid = build_grid(artifacts, schema.validate_many(population)[0].matrix, tmp_path / 'grid', max_error=1)
+    assert grid.meta['format_version'] == 2
+
+    rng = np.random.default_rng(3)
+    others = [dict(record, smoking='no', family_history='no', gender=str(rng.choice(['male', 'female'])),
+                   stress=str(rng.choice(['low', 'high'])), activity='high', sleep=str(int(rng.integers(3, 12))),
+                   diet_score=str(int(rng.integers(0, 100))), triglycerides=str(int(rng.integers(50, 500))),
+                   diastolic=str(int(rng.integers(50, 120))), age=str(int(rng.integers(18, 99))))
+              for record in population]
+    X = schema.validate_many(others)[0].matrix
+    hit, risks = grid.lookup_many(X)
+    assert hit.any()
+    scores = _predict_matrix(artifacts, X[hit])
+    expected = np.column_stack([[round(float(p) * 100, 1) for p in scores[name]] for name in TARGET_NAMES])
+    assert np.abs(risks - expected).max() <= 1 + 1e-9
+
+    # Grids of the old format were only checked against their population
+    meta = json.loads((tmp_path / 'grid' / 'meta.json').read_text())
+    (tmp_path / 'grid' / 'meta.json').write_text(json.dumps(dict(meta, format_version=1)))
+    with pytest.raises(ValueError, match='unsupported risk grid format'):
+        RiskGrid.load(tmp_path / 'grid')
+
+
+def test_grid_is_ignored_for_other_model_files(model_dir, tmp_path):
+    directory = tmp_path / 'model'
+    shutil.copytree(model_dir, directory)
+    registry = ModelRegistry(search_dirs=[directory], backend='multi_output')
+    artifacts = registry.get()
+    population = tmp_path / 'population.ndjson'
+    population.write_text('\n'.join(json.dumps(r) for r in _population(500, seed=1)) + '\n')
+    X = load_population(population, artifacts)
+    assert X.shape == (500, artifacts.plan.n_features)
+    grid = build_grid(artifacts, X, tmp_path / 'grid', max_error=5,
+                      axes={'heart_disease': ['Systolic_BP']}, tolerance={'Glucose': 10})
+    assert grid.meta['targets'][1]['axes'] == ['Systolic_BP']
+    hit, _ = grid.lookup_many(X)
+    assert grid.lookup(artifacts, X[hit][:1]) is not None
+
+    with open(directory / 'chronic_disease_model.pkl', 'ab') as fh:
+        fh.write(b'\0')
+    assert registry.maybe_reload() is True
+    assert grid.lookup(registry.get(), X[hit][:1]) is None
+    # Loading maps the cell arrays read-only
+    loaded = RiskGrid.load(tmp_path / 'grid')
+    assert not loaded.targets[0].values.flags.writeable
+    assert (loaded.targets[0].values == EMPTY).any()
+    assert main(['report', str(tmp_path / 'grid'), str(population)]) == 0
@@ -0,0 +1,37 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.model_registry import ModelRegistry
+from src.startup import StartupReport, warm_up
+
+
+def test_importing_app_defers_heavy_modules():
+    script = (
+        'import sys; sys.path.insert(0, sys.argv[1])\n'
+        'import app\n'
+        'heavy = ("joblib", "pandas", "sklearn", "xgboost", "shap", "matplotlib")\n'
+        'print(sorted(m for m in heavy if m in sys.modules))\n'
+        'print(app.registry._current is None)\n'
+    )
+    out = subprocess.run([sys.executable, '-c', script, str(REPO_ROOT)],
+                         capture_output=True, text=True, check=True, cwd=REPO_ROOT)
+    assert out.stdout.split() == ['[]', 'True']
+
+
+def test_warm_up_loads_and_reports(tmp_path):
+    for name in ('chronic_disease_model.pkl', 'preprocessor.pkl'):
+        shutil.copy(REPO_ROOT / 'artifacts' / name, tmp_path / name)
+    registry = ModelRegistry(search_dirs=[tmp_path])
+    report = warm_up(registry, StartupReport())
+
+    assert registry._current is not None
+    summary = report.as_dict()
+    assert set(summary['phases_ms']) == {'model_load', 'warmup_score'}
+    assert summary['backend'] == registry.get().backend
+    assert summary['total_ms'] >= summary['phases_ms']['model_load']
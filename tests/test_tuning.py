@@ -0,0 +1,70 @@
+import json
+import sys
+from pathlib import Path
+
+import joblib
+import pandas as pd
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.incremental_training import MODEL_FILE, PREPROCESSOR_FILE
+from src.model_registry import BACKEND_MULTI_OUTPUT, ModelRegistry
+from src.prediction import predict_risk
+from src.tuning import (BOOSTERS_DIR, FOLDS_FILE, REPORT_FILE, RESULTS_FILE, build_folds, candidate_grid, main,
+                        read_results, rung_rounds, search)
+
+RAW = REPO_ROOT / 'Data' / 'dirty_v3_path.csv'
+
+
+def _sample(tmp_path, n=1500):
+    path = tmp_path / 'sample.csv'
+    pd.read_csv(RAW).sample(n, random_state=0).to_csv(path, index=False)
+    return path
+
+
+def test_halving_prunes_and_resumes_from_the_log(tmp_path):
+    fold_dir = build_folds(_sample(tmp_path), tmp_path / 'cache', folds=2)
+    assert build_folds(tmp_path / 'sample.csv', tmp_path / 'cache', folds=2) == fold_dir
+    assert json.loads((fold_dir / FOLDS_FILE).read_text())['rows'] == 1500
+    assert rung_rounds(5, 20, 2) == [5, 10, 20]
+
+    candidates = candidate_grid({'max_depth': [2, 3], 'learning_rate': [0.1, 0.3]})
+    report = search(fold_dir, candidates, min_rounds=5, max_rounds=20, eta=2, workers=2)
+    assert [(r['rounds'], r['candidates']) for r in report['rungs']] == [(5, 4), (10, 2), (20, 1)]
+    assert report['jobs_trained'] == (4 + 2 + 1) * 2 * 3 and report['jobs_reused'] == 0
+    assert report['best']['candidate'] == report['rungs'][1]['ranking'][0]['candidate']
+    results = read_results(fold_dir / RESULTS_FILE).values()
+    assert len(results) == report['jobs_trained']
+    # Survivors continue their previous rung's boosters; only the last rung's are kept
+    assert {(r['rounds'], r['continued_from']) for r in results} == {(5, 0), (10, 5), (20, 10)}
+    assert sorted(p.name for p in (fold_dir / BOOSTERS_DIR).glob('*/*.ubj')) == \
+        sorted(f'fold{f}_target{t}_20.ubj' for f in range(2) for t in range(3))
+
+    # A half-written last line (an interrupted run) is skipped; its job is trained again
+    lines = (fold_dir / RESULTS_FILE).read_text().splitlines()
+    (fold_dir / RESULTS_FILE).write_text('\n'.join(lines[:-1]) + '\n' + lines[-1][:20])
+    resumed = search(fold_dir, candidates, min_rounds=5, max_rounds=20, eta=2)
+    assert resumed['jobs_trained'] == 1 and resumed['jobs_reused'] == report['jobs_trained'] - 1
+    assert resumed['best'] == report['best']
+    assert len(read_results(fold_dir / RESULTS_FILE)) == report['jobs_trained']
+
+
+def test_cli_exports_a_servable_winner(tmp_path):
+    export = tmp_path / 'artifacts'
+    assert main(['--data', str(_sample(tmp_path)), '--cache-dir', str(tmp_path / 'cache'), '--folds', '2',
+                 '--param', 'max_depth=2,3', '--min-rounds', '5', '--max-rounds', '10', '--eta', '2',
+                 '--export', str(export)]) == 0
+    (fold_dir,) = (tmp_path / 'cache').iterdir()
+    report = json.loads((fold_dir / REPORT_FILE).read_text())
+    assert report['exported_to'] == str(export)
+
+    model = joblib.load(export / MODEL_FILE)
+    assert [e.get_params()['max_depth'] for e in model.estimators_] == [report['best']['params']['max_depth']] * 3
+    assert list(joblib.load(export / PREPROCESSOR_FILE).feature_names_in_) == \
+        list(joblib.load(REPO_ROOT / 'artifacts' / PREPROCESSOR_FILE).feature_names_in_)
+    registry = ModelRegistry(search_dirs=[export])
+    assert registry.get().backend == BACKEND_MULTI_OUTPUT
+    assert set(predict_risk({'Age': 60, 'Gender': 'Male', 'Glucose': 150}, registry=registry)) == \
+        {'diabetes', 'heart_disease', 'stroke'}
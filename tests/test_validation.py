@@ -0,0 +1,96 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure repo root is on sys.path regardless of current working directory
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from app import app
+from src.model_registry import ModelRegistry
+from src.prediction import predict_risk, predict_risk_batch
+from src.validation import InputSchema, ValidationError, get_schema
+
+FORM = {
+    'age': '55', 'gender': 'male', 'glucose': '135', 'hba1c': '6.3',
+    'systolic': '145', 'diastolic': '92', 'bmi': '32', 'cholesterol': '245',
+    'triglycerides': '180', 'smoking': 'yes', 'alcohol': 'no',
+    'activity': 'low', 'diet_score': '45', 'family_history': 'yes',
+    'sleep': '5', 'stress': 'high'
+}
+
+
+@pytest.fixture(scope='module')
+def registry():
+    return ModelRegistry(search_dirs=[REPO_ROOT / 'artifacts'], backend='multi_output')
+
+
+def test_validate_coerces_and_prealigns(registry):
+    artifacts = registry.get()
+    record = get_schema(artifacts).validate(FORM)
+    assert get_schema(artifacts) is get_schema(artifacts)
+    assert record['Gender'] == 'Male' and record['Age'] == 55 and record['Sleep_Hours'] == 5.0
+    assert (record['Smoking'], record['Alcohol'], record['Physical_Activity'], record['Stress_Level']) == (1, 0, 0, 2)
+    np.testing.assert_array_equal(record.row, artifacts.plan.transform_one(dict(record)))
+    assert predict_risk(record, registry=registry) == predict_risk(dict(record), registry=registry)
+
+    # Numeric codes and JSON numbers are accepted too
+    same = get_schema(artifacts).validate(dict(FORM, age=55.0, smoking=1, stress='2', gender=' MALE '))
+    assert dict(same) == dict(record)
+
+
+
+def test_raw_text_answers_align_like_validated_records(registry):
+    artifacts = registry.get()
+    record = get_schema(artifacts).validate(FORM)
+    raw = dict(record, Smoking='Yes', Alcohol=' no', Physical_Activity='Low', Stress_Level='HIGH', Family_History='yes')
+    np.testing.assert_array_equal(artifacts.plan.transform_one(raw), record.row)
+    np.testing.assert_array_equal(artifacts.plan.transform([raw, dict(record)]), np.vstack([record.row] * 2))
+    assert predict_risk(raw, registry=registry) == predict_risk(record, registry=registry)
+
+
+def test_validate_reports_every_bad_field(registry):
+    bad = dict(FORM, age='150', gender='other', glucose='abc', diet_score='4.5', smoking='maybe', sleep='')
+    with pytest.raises(ValidationError) as info:
+        get_schema(registry.get()).validate(bad)
+    body = info.value.to_dict()
+    assert body['fields'] == {
+        'age': 'must be between 18 and 100',
+        'gender': 'must be one of: Female, Male',
+        'glucose': 'must be a number',
+        'diet_score': 'must be a whole number',
+        'smoking': 'must be one of: 0, 1, Former, No, Yes',
+        'sleep': 'is required',
+    }
+    assert body['missing'] == ['sleep']
+    assert body['error'].startswith('Invalid input: age must be between 18 and 100;')
+
+    # Non-ASCII digits ('²' passes str.isdigit) are rejected as answers, not crashes
+    with pytest.raises(ValidationError) as info:
+        get_schema(registry.get()).validate(dict(FORM, smoking='²', stress='١'))
+    assert set(info.value.to_dict()['fields']) == {'smoking', 'stress'}
+    resp = app.test_client().post('/predict', json=dict(FORM, smoking='²'))
+    assert resp.status_code == 400 and 'smoking' in resp.get_json()['fields']
+
+
+def test_validate_many_builds_one_matrix(registry):
+    artifacts = registry.get()
+    records = [FORM, {'age': '40'}, dict(FORM, gender='female', bmi='22.5'), 'x']
+    batch, positions, errors = get_schema(artifacts).validate_many(records)
+    assert positions == [0, 2] and sorted(errors) == [1, 3]
+    np.testing.assert_array_equal(batch.matrix, artifacts.plan.transform([dict(r) for r in batch]))
+    assert predict_risk_batch(batch, registry=registry) == predict_risk_batch([dict(r) for r in batch],
+                                                                             registry=registry)
+    # Without a preprocessor plan the schema falls back to the training category codes
+    assert InputSchema().validate(FORM).row is None
+
+
+def test_predict_returns_structured_400():
+    with app.test_client() as client:
+        resp = client.post('/predict', json=dict(FORM, age='old', stress='extreme'))
+    assert resp.status_code == 400
+    body = resp.get_json()
+    assert set(body['fields']) == {'age', 'stress'}
+    assert 'traceback' not in body